@@ -17,6 +17,10 @@ def create_app(config_class=Config):
     db.init_app(app)
     ma.init_app(app)
 
+    # Avisar a facedetection-mcsv de los cambios de horarios (caché schedule_id -> course_id)
+    from app.services.schedule_sync_service import register_schedule_sync
+    register_schedule_sync()
+
     CORS(app, 
          resources={r"/*": {"origins": "*"}}, 
          supports_credentials=True,
@@ -39,6 +43,7 @@ def create_app(config_class=Config):
     from app.routes.attendance_routes import attendance_bp
     from app.routes.auth_routes import auth_bp
     from app.routes.unknown_face_routes import unknown_face_bp, captures_bp
+    from app.routes.system_routes import system_bp
 
     app.register_blueprint(students_bp)
     app.register_blueprint(courses_bp)
@@ -48,6 +53,7 @@ def create_app(config_class=Config):
     app.register_blueprint(auth_bp)
     app.register_blueprint(unknown_face_bp)
     app.register_blueprint(captures_bp)
+    app.register_blueprint(system_bp)
 
     # Registrar comandos CLI personalizados
     register_commands(app)
@@ -56,6 +62,8 @@ def create_app(config_class=Config):
 
 def register_commands(app):
     """Registra comandos CLI como 'flask init-db'."""
+    import click
+
     @app.cli.command("init-db")
     def init_db():
         from app.models import user, student, course, schedule, enrollment, attendance, teacher
@@ -67,6 +75,16 @@ def register_commands(app):
         db.drop_all()
         print("All tables dropped successfully.")
         
+    @app.cli.command("captures-maintenance")
+    def captures_maintenance():
+        """Aplica la retención de capturas/unknown faces, empaqueta JPEGs antiguos y genera miniaturas."""
+        from app.services.capture_service import run_captures_maintenance
+
+        report = run_captures_maintenance()
+        print("Captures maintenance finished:")
+        for key, value in report.items():
+            print(f"  {key}: {value}")
+
     @app.cli.command("insert-db")
     def insert_db():
         """Inserta datos de ejemplo en la base de datos."""
@@ -315,13 +333,14 @@ def register_commands(app):
         Benchmark Caso Real: Computación Paralela.
         CORREGIDO: Compara por UUID y muestra nombres de los Faltantes (FN).
         """
-        import requests
         import os
         from app.models.course import Course
         from app.models.enrollment import Enrollment
         from app.models.student import Student
+        from app.services.http_client import get_client
 
-        API_URL = "http://localhost:4000/benchmark/process"
+        facedetection = get_client('facedetection')
+        API_PATH = "/benchmark/process"
         
         COURSE_CODE = "1705299" 
         
@@ -365,7 +384,7 @@ def register_commands(app):
             data = {'course_id': str(course.id)}
 
             try:
-                resp = requests.post(API_URL, files=files, data=data)
+                resp = facedetection.post(API_PATH, files=files, data=data, timeout=None)
                 if resp.status_code != 200:
                     print(f"{img_name:<12} | Error API: {resp.status_code}")
                     continue
@@ -627,11 +646,12 @@ def register_commands(app):
     @app.cli.command("bench-fps")
     def bench_fps():
         """Experimento B: Mide tiempos desglosados (Pipeline vs Matching)."""
-        import requests
         import os
         import time
-        
-        API_URL = "http://localhost:4000/benchmark/process" 
+        from app.services.http_client import get_client
+
+        facedetection = get_client('facedetection')
+        API_PATH = "/benchmark/process"
         COURSE_ID_PARA_TEST = "3f33a617-1f76-408c-a9fc-7436a39991a9" 
         
         scenarios = [1, 1, 5, 10, 20, 30, 40, 50, 100, 150, 200]
@@ -655,7 +675,7 @@ def register_commands(app):
             data = {'course_id': COURSE_ID_PARA_TEST}
             
             try:
-                resp = requests.post(API_URL, files=files, data=data)
+                resp = facedetection.post(API_PATH, files=files, data=data, timeout=None)
                 
                 if resp.status_code == 200:
                     json_data = resp.json()
@@ -681,17 +701,21 @@ def register_commands(app):
         print("="*105 + "\n")
         
     @app.cli.command("bench-exp-c")
-    def bench_exp_c():
+    @click.option('--detection-mode', type=click.Choice(['single', 'tiled']), default=None,
+                  help="Modo de detección de facedetection (por defecto, su DETECTION_MODE).")
+    def bench_exp_c(detection_mode):
         """
         Experimento C: Robustez, Consistencia y Desconocidos.
         CORREGIDO: Los duplicados AHORA SE CUENTAN como Falsos Positivos.
+        Con --detection-mode tiled se mide la detección teselada (filas del fondo).
         """
-        import requests
         import os
         from collections import Counter
         from app.models.course import Course
+        from app.services.http_client import get_client
 
-        API_URL = "http://localhost:4000/benchmark/process"
+        facedetection = get_client('facedetection')
+        API_PATH = "/benchmark/process"
         
         # 1. Configuración de la imagen de prueba (200 rostros)
         project_root = os.path.dirname(os.path.abspath(__file__))
@@ -720,11 +744,11 @@ def register_commands(app):
 
         if not COURSES: return
         
-        print("\n" + "="*145)
-        print(f"IMAGEN: 200 Rostros | CORRECCIÓN: Duplicados cuentan como Falsos Positivos")
-        print("-" * 145)
-        print(f"{'ESCENARIO':<10} | {'DETECTADOS':<10} | {'MATRICULADOS':<12} | {'ENCONTRADOS':<11} | {'UNKNOWN':<10} | {'FALTAN (FN)':<11} | {'FALSOS POS.':<12} | {'DUPLICADOS'}")
-        print("="*145)
+        print("\n" + "="*160)
+        print(f"IMAGEN: 200 Rostros | DETECCIÓN: {detection_mode or 'por defecto'} | CORRECCIÓN: Duplicados cuentan como Falsos Positivos")
+        print("-" * 160)
+        print(f"{'ESCENARIO':<10} | {'DETECTADOS':<10} | {'MATRICULADOS':<12} | {'ENCONTRADOS':<11} | {'UNKNOWN':<10} | {'FALTAN (FN)':<11} | {'FALSOS POS.':<12} | {'PIPELINE (s)':<12} | {'DUPLICADOS'}")
+        print("="*160)
 
         for scenario in COURSES:
             c_label = scenario["label"]
@@ -733,9 +757,11 @@ def register_commands(app):
             
             files_payload = {'image': (os.path.basename(TEST_IMAGE_PATH), open(TEST_IMAGE_PATH, 'rb'), 'image/jpeg')}
             data_payload = {'course_id': c_id}
+            if detection_mode:
+                data_payload['detection_mode'] = detection_mode
 
             try:
-                resp = requests.post(API_URL, files=files_payload, data=data_payload)
+                resp = facedetection.post(API_PATH, files=files_payload, data=data_payload, timeout=None)
                 if resp.status_code != 200: continue
 
                 result = resp.json()
@@ -773,9 +799,10 @@ def register_commands(app):
                 if duplicates_count > 0:
                     dup_text = f"{duplicates_count} Casos"
 
-                print(f"{c_label:<10} | {total_detected_in_image:<10} | {expected:<12} | {count_unique_found:<11} | {unknown_count:<10} | {miss_text:<11} | {fp_text:<12} | {dup_text}")
+                pipeline_time = result.get("pipeline_time", 0)
+                print(f"{c_label:<10} | {total_detected_in_image:<10} | {expected:<12} | {count_unique_found:<11} | {unknown_count:<10} | {miss_text:<11} | {fp_text:<12} | {pipeline_time:<12.3f} | {dup_text}")
 
             except Exception as e:
                 print(f"{c_label:<10} | EXCEPCIÓN: {e}")
                 
-        print("="*145 + "\n")
\ No newline at end of file
+        print("="*160 + "\n")
\ No newline at end of file
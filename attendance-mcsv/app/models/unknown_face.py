@@ -7,7 +7,7 @@ class UnknownFace(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     schedule_id = db.Column(db.String(36), db.ForeignKey('schedules.id'), nullable=False)
 
-    # Embedding serializado como string "v1;v2;...;v512"
+    # Embedding serializado: "b64f32:<base64 float32>" (filas antiguas: "v1;v2;...;v512")
     embedding = db.Column(db.Text, nullable=False)
 
     # Ruta absoluta o relativa en el microservicio de facedetection
@@ -7,6 +7,7 @@ from app.models.course import Course
 from app.models.student import Student
 from app.models.user import UserRole
 from app.routes.auth_routes import token_required
+from app.services.http_client import get_client
 from datetime import datetime
 
 schedules_bp = Blueprint('schedules_bp', __name__, url_prefix='/schedules')
@@ -69,10 +70,11 @@ def start_manual_attendance(current_user, schedule_id):
     payload = {
         "scheduler_id": schedule_item.id
     }
-    target_url = "http://localhost:4000/start_attendance_capture"
+    facedetection = get_client('facedetection')
+    target_url = facedetection.url('/start_attendance_capture')
 
     try:
-        response = requests.post(target_url, json=payload, timeout=10)
+        response = facedetection.post('/start_attendance_capture', json=payload, timeout=10)
         response.raise_for_status() # Lanza error si el status no es 2xx
 
         print(f"Notificación manual enviada para schedule {schedule_item.id}. Respuesta: {response.json()}")
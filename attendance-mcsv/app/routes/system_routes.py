@@ -0,0 +1,13 @@
+# app/routes/system_routes.py
+from flask import Blueprint, jsonify
+from app.services.http_client import get_all_stats
+
+system_bp = Blueprint('system_bp', __name__)
+
+@system_bp.route('/http-stats', methods=['GET'])
+def http_stats():
+    """
+    Devuelve, por servicio destino, el número de peticiones, errores y latencias
+    acumuladas de los clientes HTTP compartidos de este proceso.
+    """
+    return jsonify(get_all_stats()), 200
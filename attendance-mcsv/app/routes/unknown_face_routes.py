@@ -1,18 +1,19 @@
-from flask import Blueprint, request, jsonify, send_from_directory, current_app
+from flask import Blueprint, request, jsonify, send_file, current_app
 from app import db
 from app.models.unknown_face import UnknownFace
 from app.models.schedule import Schedule
 from app.schemas.unknown_face_schema import unknown_face_schema
-from datetime import datetime
-import requests
-import os
+from datetime import datetime, timezone
+import io
 import numpy as np
 import json
 
 from app.services.unknown_face_service import resolve_unknown_faces_for_student
+from app.services.capture_service import locate_capture, read_capture_bytes, ensure_variant
+from app.services.http_client import get_client
+from app.services.embedding_codec import decode_embedding, decode_response_embedding, to_storage, WIRE_FORMAT
 
 unknown_face_bp = Blueprint('unknown_face_bp', __name__, url_prefix='/unknown-faces')
-FACEDETECTION_SERVICE_URL = "http://localhost:4000/processing/extract-embedding"
 
 @unknown_face_bp.route('', methods=['POST'])
 def create_unknown_face():
@@ -20,6 +21,7 @@ def create_unknown_face():
 
     schedule_id = data.get('schedule_id')
     embedding = data.get('embedding')
+    embedding_format = data.get('embedding_format')  # opcional: json | b64f32 | b64f16
     image_path = data.get('image_path')
     detected_at_str = data.get('detected_at')
 
@@ -27,6 +29,12 @@ def create_unknown_face():
     if not schedule_id or not embedding or not image_path:
         return jsonify({"error": "Fields 'schedule_id', 'embedding' and 'image_path' are required."}), 400
 
+    # Acepta lista JSON, string "v1;v2;..." o base64 (embedding_format)
+    try:
+        embedding_vector = decode_embedding(embedding, embedding_format)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid 'embedding': {e}"}), 400
+
     # Verificar que el schedule existe
     schedule = Schedule.query.get(schedule_id)
     if not schedule:
@@ -43,7 +51,7 @@ def create_unknown_face():
 
     unknown_face = UnknownFace(
         schedule_id=schedule_id,
-        embedding=embedding,
+        embedding=to_storage(embedding_vector),
         image_path=image_path,
         detected_at=detected_at
     )
@@ -73,13 +81,14 @@ def match_unknown_faces():
         image_file.seek(0)
         files = {'image': (image_file.filename, image_file.read(), image_file.content_type)}
         
-        response = requests.post(FACEDETECTION_SERVICE_URL, files=files, timeout=5)
+        response = get_client('facedetection').post(
+            '/extract-embedding', files=files, params={'embedding_format': WIRE_FORMAT}, timeout=5
+        )
         
         if response.status_code != 200:
             return jsonify({"message": "No se pudo procesar el rostro (IA Error)"}), 400
             
-        data = response.json()
-        target_embedding = np.array(data['embedding'], dtype='float32')
+        target_embedding = decode_response_embedding(response)
         
         # Normalizar vector de entrada
         norm = np.linalg.norm(target_embedding)
@@ -96,8 +105,8 @@ def match_unknown_faces():
 
     for face in unknowns:
         try:
-            # Convertir string guardado "0.1;0.2;..." a numpy array
-            db_emb = np.fromstring(face.embedding, sep=';', dtype='float32')
+            # Convertir el embedding guardado ("b64f32:..." o "0.1;0.2;...") a numpy array
+            db_emb = decode_embedding(face.embedding)
             
             # Normalizar vector de BD
             db_norm = np.linalg.norm(db_emb)
@@ -302,25 +311,83 @@ def finalize_unknown_face(unknown_id):
 
 
 captures_bp = Blueprint('captures_bp', __name__, url_prefix='/captures')
+
+
+def _snap_variant_width(requested):
+    """Ajusta el ancho pedido al menor ancho permitido que lo cubra (o al mayor disponible)."""
+    widths = sorted(current_app.config['CAPTURES_VARIANT_WIDTHS'])
+    for width in widths:
+        if width >= requested:
+            return width
+    return widths[-1]
+
+
+def _send_capture_file(path):
+    max_age = current_app.config['CAPTURES_CACHE_MAX_AGE']
+    # send_file calcula ETag/Last-Modified a partir del stat y responde 304 si corresponde
+    response = send_file(path, mimetype='image/jpeg', max_age=max_age, conditional=True, etag=True)
+    response.cache_control.immutable = True
+    return response
+
+
+def _send_packed_capture(capture):
+    max_age = current_app.config['CAPTURES_CACHE_MAX_AGE']
+    etag = f"{capture.member}-{int(capture.mtime)}-{capture.size}"
+    # Werkzeug interpreta un datetime sin zona como UTC: convertir el epoch directamente a UTC
+    last_modified = datetime.fromtimestamp(capture.mtime, tz=timezone.utc)
+
+    # Validar antes de abrir el zip: un 304 no debe pagar la lectura del pack
+    if request.if_none_match.contains(etag) or (
+        request.if_modified_since and not request.if_none_match
+        and request.if_modified_since.timestamp() >= int(capture.mtime)
+    ):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response.cache_control.immutable = True
+        return response
+
+    response = send_file(
+        io.BytesIO(read_capture_bytes(capture)), mimetype='image/jpeg',
+        etag=etag, last_modified=last_modified, max_age=max_age, conditional=True
+    )
+    response.cache_control.immutable = True
+    return response
+
+
 @captures_bp.route('/<path:filename>', methods=['GET'])
 def get_capture_image(filename):
     """
-    Sirve imágenes desde la carpeta 'captures' ubicada en el proyecto hermano 'facedetection-mcsv'.
+    Sirve imágenes desde CAPTURES_DIR (por defecto la carpeta 'captures' del proyecto
+    hermano 'facedetection-mcsv'). Las capturas antiguas pueden estar dentro del zip
+    diario de su horario.
+
+    Query params opcionales:
+      - w=<px>: variante redimensionada, generada una vez y cacheada en disco.
+      - thumbnail=1: equivalente a w=CAPTURES_THUMBNAIL_WIDTH.
+
+    Las respuestas llevan ETag, Last-Modified y Cache-Control de larga duración,
+    y las peticiones condicionales reciben 304.
     """
     try:
-        # 1. current_app.root_path apunta a: .../attendance-mcsv/app
-        # 2. Subimos 2 niveles ('..', '..') para salir de 'app' y de 'attendance-mcsv'
-        # 3. Entramos a 'facedetection-mcsv' y luego a 'captures'
-        captures_dir = os.path.join(
-            current_app.root_path, 
-            '..', '..', 
-            'facedetection-mcsv', 
-            'captures'
-        )
-        captures_dir = os.path.abspath(captures_dir)
-        print(f"Serving from: {captures_dir}")
-
-        return send_from_directory(captures_dir, filename)
+        width = request.args.get('w', type=int)
+        if width is None and request.args.get('thumbnail'):
+            width = current_app.config['CAPTURES_THUMBNAIL_WIDTH']
+
+        if width is not None and width > 0:
+            variant = ensure_variant(filename, _snap_variant_width(width))
+            if variant:
+                return _send_capture_file(variant)
+
+        capture = locate_capture(filename)
+        if capture is None:
+            return jsonify({"error": "Image not found"}), 404
+
+        if capture.member is None:
+            return _send_capture_file(capture.path)
+        return _send_packed_capture(capture)
     except Exception as e:
         print(f"Error serving image: {e}")
-        return jsonify({"error": "Image not found"}), 404
\ No newline at end of file
+        return jsonify({"error": "Image not found"}), 404
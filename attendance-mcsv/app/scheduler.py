@@ -6,6 +6,8 @@ import requests
 from flask import current_app
 from sqlalchemy import extract
 
+from app.services.http_client import get_client
+
 def check_schedules_and_notify():
     """
     Se ejecuta cada minuto para buscar clases que COMIENZAN en ese preciso instante
@@ -38,11 +40,12 @@ def check_schedules_and_notify():
                 "scheduler_id": schedule_item.id
             }
             
-            # La URL del endpoint de destino.
-            target_url = "http://127.0.0.1:4000/start_attendance_capture"
+            # El endpoint de destino (URL base en Config.FACEDETECTION_SERVICE_URL).
+            facedetection = get_client('facedetection')
+            target_url = facedetection.url('/start_attendance_capture')
 
             try:
-                response = requests.post(target_url, json=payload, timeout=10)
+                response = facedetection.post('/start_attendance_capture', json=payload, timeout=10)
                 
                 if response.status_code == 200:
                     print(f"--> Successfully notified for schedule {schedule_item.id}. Response: {response.json()}")
@@ -52,13 +55,36 @@ def check_schedules_and_notify():
             except requests.exceptions.RequestException as e:
                 print(f"--> CRITICAL: Could not connect to attendance service at {target_url}. Error: {e}")
 
+def run_captures_maintenance_job():
+    """
+    Se ejecuta una vez al día: aplica la retención de capturas y unknown faces,
+    empaqueta JPEGs antiguos y genera miniaturas.
+    """
+    with current_app.app_context():
+        from app.services.capture_service import run_captures_maintenance
+
+        try:
+            report = run_captures_maintenance()
+        except Exception as e:
+            print(f"--> CRITICAL: Captures maintenance failed: {e}")
+            return
+
+        print(
+            f"[MAINTENANCE] Removed {report['unknown_faces_removed']} unknown faces, "
+            f"{report['files_removed']} files, {report['packs_removed']} packs; "
+            f"packed {report['files_packed']} files; created {report['thumbnails_created']} thumbnails; "
+            f"reclaimed {report['bytes_reclaimed'] / (1024 * 1024):.2f} MB."
+        )
+
 def run_scheduler(app):
     """
-    Configura y ejecuta el bucle del planificador (sin cambios).
+    Configura y ejecuta el bucle del planificador.
     """
     with app.app_context():
         # Programar la tarea para que se ejecute cada minuto.
         schedule.every(1).minutes.do(check_schedules_and_notify)
+        # Mantenimiento diario de capturas
+        schedule.every().day.at(app.config['CAPTURES_MAINTENANCE_AT']).do(run_captures_maintenance_job)
 
         print("Scheduler started. Waiting for scheduled jobs...")
         while True:
@@ -0,0 +1,471 @@
+# app/services/capture_service.py
+import io
+import json
+import os
+import re
+import threading
+import zipfile
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set
+
+from flask import current_app
+from PIL import Image
+from werkzeug.security import safe_join
+
+from app import db
+from app.models.unknown_face import UnknownFace
+
+VARIANTS_DIRNAME = '.variants'
+ARCHIVE_DIRNAME = '.archive'
+PACK_DATE_FORMAT = '%Y%m%d'
+
+# Nombre generado por facedetection: <identidad>_<YYYYmmdd>_<HHMMSS>_<microseg>.jpg
+_CAPTURE_DATE_RE = re.compile(r'_(\d{8})_\d{6}_\d+\.jpg$')
+
+# path: JPEG suelto o zip diario; member: nombre dentro del zip (None si está suelto)
+CaptureRef = namedtuple('CaptureRef', ['path', 'member', 'size', 'mtime'])
+
+
+def get_captures_dir() -> str:
+    return current_app.config['CAPTURES_DIR']
+
+
+def capture_relative_path(image_path: str) -> str:
+    """
+    Convierte la ruta que guarda facedetection ('.../captures/<schedule_id>/<archivo>.jpg')
+    en '<schedule_id>/<archivo>.jpg', relativa a CAPTURES_DIR.
+    """
+    parts = image_path.replace('\\', '/').rstrip('/').split('/')
+    return '/'.join(parts[-2:])
+
+
+def _pack_date_from_name(filename: str) -> Optional[str]:
+    match = _CAPTURE_DATE_RE.search(filename)
+    return match.group(1) if match else None
+
+
+# ==========================================================
+# Lectura de capturas (sueltas o empaquetadas)
+# ==========================================================
+def locate_capture(rel_path: str) -> Optional[CaptureRef]:
+    """
+    Busca la captura primero como archivo suelto y luego dentro del zip diario
+    de su horario (<schedule_id>/<YYYYmmdd>.zip). Devuelve None si no existe.
+    """
+    captures_dir = get_captures_dir()
+    loose_path = safe_join(captures_dir, rel_path)
+    if loose_path is None:
+        return None
+
+    if os.path.isfile(loose_path):
+        stat = os.stat(loose_path)
+        return CaptureRef(loose_path, None, stat.st_size, stat.st_mtime)
+
+    schedule_dir, _, filename = rel_path.partition('/')
+    schedule_path = safe_join(captures_dir, schedule_dir)
+    if not filename or schedule_path is None or not os.path.isdir(schedule_path):
+        return None
+
+    pack_date = _pack_date_from_name(filename)
+    if pack_date:
+        candidates = [os.path.join(schedule_path, f"{pack_date}.zip")]
+    else:
+        candidates = sorted(
+            os.path.join(schedule_path, name) for name in os.listdir(schedule_path) if name.endswith('.zip')
+        )
+
+    for pack_path in candidates:
+        if not os.path.isfile(pack_path):
+            continue
+        try:
+            with zipfile.ZipFile(pack_path) as pack:
+                info = pack.getinfo(filename)
+        except KeyError:
+            continue
+        except zipfile.BadZipFile as e:
+            print(f"[ERROR] Corrupt capture pack {pack_path}: {e}")
+            continue
+        # zipfile guarda date_time en hora local del servidor (sin zona, resolución de 2 s);
+        # un datetime sin zona se interpreta también como hora local, así que el epoch coincide
+        mtime = datetime(*info.date_time).timestamp()
+        return CaptureRef(pack_path, filename, info.file_size, mtime)
+
+    return None
+
+
+def read_capture_bytes(capture: CaptureRef) -> bytes:
+    if capture.member is None:
+        with open(capture.path, 'rb') as f:
+            return f.read()
+    with zipfile.ZipFile(capture.path) as pack:
+        return pack.read(capture.member)
+
+
+# ==========================================================
+# Miniaturas / variantes redimensionadas
+# ==========================================================
+def variant_path(rel_path: str, width: int) -> Optional[str]:
+    variants_dir = os.path.join(get_captures_dir(), VARIANTS_DIRNAME, f"w{int(width)}")
+    return safe_join(variants_dir, rel_path)
+
+
+def render_variant(data: bytes, width: int) -> bytes:
+    """Reduce la imagen a `width` px de ancho (sin ampliar) y la recodifica como JPEG."""
+    with Image.open(io.BytesIO(data)) as img:
+        img = img.convert('RGB')
+        if img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG', quality=85, optimize=True)
+        return buffer.getvalue()
+
+
+def ensure_variant(rel_path: str, width: int) -> Optional[str]:
+    """
+    Devuelve la ruta de la variante de `width` px, generándola en disco si aún no existe.
+    La escritura es atómica (tmp + replace) con un temporal por hilo, para tolerar peticiones
+    concurrentes y el job diario de miniaturas generando la misma variante.
+    """
+    target = variant_path(rel_path, width)
+    if target is None:
+        return None
+    if os.path.isfile(target):
+        return target
+
+    capture = locate_capture(rel_path)
+    if capture is None:
+        return None
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(render_variant(read_capture_bytes(capture), width))
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return target
+
+
+def _remove_variants(captures_dir: str, rel_path: str) -> int:
+    freed = 0
+    variants_root = os.path.join(captures_dir, VARIANTS_DIRNAME)
+    if not os.path.isdir(variants_root):
+        return freed
+    for width_dir in os.listdir(variants_root):
+        path = safe_join(os.path.join(variants_root, width_dir), rel_path)
+        if path and os.path.isfile(path):
+            freed += os.path.getsize(path)
+            os.remove(path)
+    return freed
+
+
+# ==========================================================
+# Mantenimiento: retención, empaquetado y miniaturas
+# ==========================================================
+def _tree_size(root: str, skip_dirname: str) -> int:
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d != skip_dirname]
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def _archive_month_dir(captures_dir: str, when: datetime) -> str:
+    path = os.path.join(captures_dir, ARCHIVE_DIRNAME, when.strftime('%Y%m'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _archive_file(captures_dir: str, path: str, arcname: str, when: datetime) -> None:
+    archive_zip = os.path.join(_archive_month_dir(captures_dir, when), 'captures.zip')
+    with zipfile.ZipFile(archive_zip, 'a', compression=zipfile.ZIP_STORED) as archive:
+        archive.write(path, arcname=arcname)
+
+
+def _write_pack(pack_path: str, files) -> None:
+    """
+    Añade los JPEG sueltos `files` al zip diario. Se reescribe en un temporal y se
+    reemplaza atómicamente para que las lecturas concurrentes nunca vean un zip a medias.
+    Los JPEG ya están comprimidos, así que se guardan sin compresión (ZIP_STORED).
+    """
+    tmp_path = f"{pack_path}.tmp"
+    with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_STORED) as out:
+        written = set()
+        if os.path.isfile(pack_path):
+            with zipfile.ZipFile(pack_path) as existing:
+                for info in existing.infolist():
+                    out.writestr(info, existing.read(info))
+                    written.add(info.filename)
+        for path in files:
+            name = os.path.basename(path)
+            if name not in written:
+                out.write(path, arcname=name)
+                written.add(name)
+    os.replace(tmp_path, pack_path)
+
+
+def _expire_unknown_faces(captures_dir, now, cfg, archive, report) -> None:
+    resolved_cutoff = now - timedelta(days=cfg['RESOLVED_UNKNOWN_FACE_TTL_DAYS'])
+    unresolved_cutoff = now - timedelta(days=cfg['UNKNOWN_FACE_TTL_DAYS'])
+
+    expired = UnknownFace.query.filter(
+        db.or_(
+            db.and_(UnknownFace.resolved.is_(True), UnknownFace.detected_at < resolved_cutoff),
+            UnknownFace.detected_at < unresolved_cutoff,
+        )
+    ).all()
+
+    rows_by_month = defaultdict(list)
+    for uf in expired:
+        rel_path = capture_relative_path(uf.image_path)
+        loose_path = safe_join(captures_dir, rel_path)
+
+        if archive:
+            rows_by_month[uf.detected_at.strftime('%Y%m')].append({
+                "id": uf.id,
+                "schedule_id": uf.schedule_id,
+                "student_id": uf.student_id,
+                "resolved": uf.resolved,
+                "detected_at": uf.detected_at.isoformat(),
+                "image_path": uf.image_path,
+                "embedding": uf.embedding,
+            })
+
+        # Las capturas ya empaquetadas se quitan de su zip diario al dejar de estar referenciadas (ver _prune_packs)
+        if loose_path and os.path.isfile(loose_path):
+            if archive:
+                _archive_file(captures_dir, loose_path, rel_path, uf.detected_at)
+            report['bytes_freed_files'] += os.path.getsize(loose_path)
+            os.remove(loose_path)
+            report['files_removed'] += 1
+        report['bytes_freed_variants'] += _remove_variants(captures_dir, rel_path)
+
+        db.session.delete(uf)
+        report['unknown_faces_removed'] += 1
+
+    for month, rows in rows_by_month.items():
+        month_dir = os.path.join(captures_dir, ARCHIVE_DIRNAME, month)
+        os.makedirs(month_dir, exist_ok=True)
+        with open(os.path.join(month_dir, 'unknown_faces.jsonl'), 'a', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+
+    db.session.commit()
+
+
+def _process_loose_captures(captures_dir, now, cfg, archive, referenced: Set[str], report) -> None:
+    expire_before = (now - timedelta(days=cfg['CAPTURES_TTL_DAYS'])).timestamp()
+    pack_before = (now - timedelta(days=cfg['CAPTURES_PACK_AFTER_DAYS'])).timestamp()
+
+    for schedule_dir in os.listdir(captures_dir):
+        schedule_path = os.path.join(captures_dir, schedule_dir)
+        if schedule_dir.startswith('.') or not os.path.isdir(schedule_path):
+            continue
+
+        to_pack: Dict[str, list] = defaultdict(list)
+        with os.scandir(schedule_path) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.lower().endswith('.jpg'):
+                    continue
+                mtime = entry.stat().st_mtime
+                rel_path = f"{schedule_dir}/{entry.name}"
+
+                if mtime < expire_before and rel_path not in referenced:
+                    if archive:
+                        _archive_file(captures_dir, entry.path, rel_path, datetime.fromtimestamp(mtime))
+                    report['bytes_freed_files'] += entry.stat().st_size
+                    os.remove(entry.path)
+                    report['files_removed'] += 1
+                elif mtime < pack_before:
+                    pack_date = _pack_date_from_name(entry.name) or \
+                        datetime.fromtimestamp(mtime).strftime(PACK_DATE_FORMAT)
+                    to_pack[pack_date].append(entry.path)
+
+        for pack_date, files in to_pack.items():
+            _write_pack(os.path.join(schedule_path, f"{pack_date}.zip"), files)
+            for path in files:
+                os.remove(path)
+            report['files_packed'] += len(files)
+
+
+def _prune_packs(captures_dir, now, cfg, archive, referenced: Set[str], report) -> None:
+    """
+    Aplica CAPTURES_TTL_DAYS a las capturas ya empaquetadas: los miembros sin UnknownFace
+    más antiguos que el TTL se quitan del zip diario (reescrito de forma atómica, como en
+    _write_pack), que se borra si queda vacío. Así un zip con alguna captura referenciada
+    no retiene las demás hasta el TTL máximo de _expire_packs.
+    """
+    expire_before = (now - timedelta(days=cfg['CAPTURES_TTL_DAYS'])).timestamp()
+
+    for schedule_dir in os.listdir(captures_dir):
+        schedule_path = os.path.join(captures_dir, schedule_dir)
+        if schedule_dir.startswith('.') or not os.path.isdir(schedule_path):
+            continue
+        for name in os.listdir(schedule_path):
+            if not name.endswith('.zip'):
+                continue
+            pack_path = os.path.join(schedule_path, name)
+            try:
+                with zipfile.ZipFile(pack_path) as pack:
+                    infos = pack.infolist()
+                    # date_time está en hora local, igual que datetime(...).timestamp() (ver locate_capture)
+                    expired = [
+                        info for info in infos
+                        if f"{schedule_dir}/{info.filename}" not in referenced
+                        and datetime(*info.date_time).timestamp() < expire_before
+                    ]
+                    if not expired:
+                        continue
+                    if archive:
+                        for info in expired:
+                            _archive_member(captures_dir, pack, info, f"{schedule_dir}/{info.filename}")
+            except zipfile.BadZipFile as e:
+                print(f"[ERROR] Corrupt capture pack {pack_path}: {e}")
+                continue
+
+            size_before = os.path.getsize(pack_path)
+            expired_names = {info.filename for info in expired}
+            if len(expired) == len(infos):
+                os.remove(pack_path)
+                report['packs_removed'] += 1
+                report['bytes_freed_files'] += size_before
+            else:
+                _rewrite_pack(pack_path, expired_names)
+                report['bytes_freed_files'] += size_before - os.path.getsize(pack_path)
+            report['files_removed'] += len(expired)
+
+
+def _archive_member(captures_dir: str, pack: zipfile.ZipFile, info: zipfile.ZipInfo, arcname: str) -> None:
+    when = datetime(*info.date_time)
+    archive_zip = os.path.join(_archive_month_dir(captures_dir, when), 'captures.zip')
+    with zipfile.ZipFile(archive_zip, 'a', compression=zipfile.ZIP_STORED) as archive:
+        archive.writestr(zipfile.ZipInfo(arcname, info.date_time), pack.read(info))
+
+
+def _rewrite_pack(pack_path: str, drop_names: Set[str]) -> None:
+    """Reescribe el zip diario sin los miembros `drop_names` (temporal + replace)."""
+    tmp_path = f"{pack_path}.tmp"
+    with zipfile.ZipFile(pack_path) as existing, \
+            zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_STORED) as out:
+        for info in existing.infolist():
+            if info.filename not in drop_names:
+                out.writestr(info, existing.read(info))
+    os.replace(tmp_path, pack_path)
+
+
+def _expire_packs(captures_dir, now, cfg, archive, report) -> None:
+    # Red de seguridad: un zip diario se conserva como mucho mientras alguna de sus capturas
+    # pueda seguir referenciada; los miembros sin referencia ya los quita _prune_packs
+    keep_days = max(cfg['CAPTURES_TTL_DAYS'], cfg['UNKNOWN_FACE_TTL_DAYS'], cfg['RESOLVED_UNKNOWN_FACE_TTL_DAYS'])
+    cutoff = (now - timedelta(days=keep_days)).strftime(PACK_DATE_FORMAT)
+
+    for schedule_dir in os.listdir(captures_dir):
+        schedule_path = os.path.join(captures_dir, schedule_dir)
+        if schedule_dir.startswith('.') or not os.path.isdir(schedule_path):
+            continue
+        for name in os.listdir(schedule_path):
+            pack_date, ext = os.path.splitext(name)
+            if ext != '.zip' or not pack_date.isdigit() or pack_date >= cutoff:
+                continue
+            pack_path = os.path.join(schedule_path, name)
+            if archive:
+                when = datetime.strptime(pack_date, PACK_DATE_FORMAT)
+                target = os.path.join(_archive_month_dir(captures_dir, when), f"{schedule_dir}_{name}")
+                report['bytes_freed_files'] += os.path.getsize(pack_path)
+                os.replace(pack_path, target)
+            else:
+                report['bytes_freed_files'] += os.path.getsize(pack_path)
+                os.remove(pack_path)
+            report['packs_removed'] += 1
+
+        if not os.listdir(schedule_path):
+            os.rmdir(schedule_path)
+
+
+def _prune_orphan_variants(captures_dir, referenced: Set[str], report) -> None:
+    variants_root = os.path.join(captures_dir, VARIANTS_DIRNAME)
+    if not os.path.isdir(variants_root):
+        return
+    for width_dir in os.listdir(variants_root):
+        width_path = os.path.join(variants_root, width_dir)
+        for dirpath, _, filenames in os.walk(width_path):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                rel_path = os.path.relpath(path, width_path).replace(os.sep, '/')
+                if rel_path not in referenced:
+                    report['bytes_freed_variants'] += os.path.getsize(path)
+                    os.remove(path)
+
+
+def _generate_thumbnails(cfg, report) -> None:
+    width = cfg['CAPTURES_THUMBNAIL_WIDTH']
+    pending = UnknownFace.query.with_entities(UnknownFace.image_path).filter_by(resolved=False).all()
+    for (image_path,) in pending:
+        rel_path = capture_relative_path(image_path)
+        target = variant_path(rel_path, width)
+        if target is None or os.path.isfile(target):
+            continue
+        try:
+            if ensure_variant(rel_path, width):
+                report['thumbnails_created'] += 1
+        except Exception as e:
+            print(f"[ERROR] Could not create thumbnail for {rel_path}: {e}")
+
+
+def run_captures_maintenance(now: Optional[datetime] = None) -> dict:
+    """
+    Job de mantenimiento de capturas y unknown faces:
+      1. Elimina (o archiva) UnknownFace resueltos/expirados y sus capturas sueltas.
+      2. Elimina capturas sin UnknownFace más antiguas que CAPTURES_TTL_DAYS.
+      3. Empaqueta los JPEG sueltos antiguos en un zip diario por horario.
+      4. Quita de los zips diarios las capturas sin UnknownFace más antiguas que
+         CAPTURES_TTL_DAYS y elimina los zips que ya no pueden estar referenciados.
+      5. Genera miniaturas para los UnknownFace pendientes y borra las huérfanas.
+    Devuelve un reporte con contadores y bytes recuperados.
+    """
+    cfg = current_app.config
+    captures_dir = get_captures_dir()
+    now = now or datetime.now()  # facedetection registra detected_at en hora local
+    archive = cfg['CAPTURES_RETENTION_MODE'] == 'archive'
+
+    report = {
+        "unknown_faces_removed": 0,
+        "files_removed": 0,
+        "files_packed": 0,
+        "packs_removed": 0,
+        "thumbnails_created": 0,
+        "bytes_freed_files": 0,
+        "bytes_freed_variants": 0,
+    }
+    if not os.path.isdir(captures_dir):
+        print(f"[WARN] Captures directory not found: {captures_dir}")
+        return report
+
+    bytes_before = _tree_size(captures_dir, ARCHIVE_DIRNAME)
+
+    _expire_unknown_faces(captures_dir, now, cfg, archive, report)
+
+    referenced = {
+        capture_relative_path(image_path)
+        for (image_path,) in UnknownFace.query.with_entities(UnknownFace.image_path).all()
+    }
+    _process_loose_captures(captures_dir, now, cfg, archive, referenced, report)
+    _prune_packs(captures_dir, now, cfg, archive, referenced, report)
+    _expire_packs(captures_dir, now, cfg, archive, report)
+    _prune_orphan_variants(captures_dir, referenced, report)
+    _generate_thumbnails(cfg, report)
+
+    bytes_after = _tree_size(captures_dir, ARCHIVE_DIRNAME)
+    report["bytes_before"] = bytes_before
+    report["bytes_after"] = bytes_after
+    report["bytes_reclaimed"] = bytes_before - bytes_after
+    report["mode"] = cfg['CAPTURES_RETENTION_MODE']
+    return report
@@ -0,0 +1,81 @@
+# app/services/embedding_codec.py
+import base64
+from typing import Optional
+
+import numpy as np
+
+# ==========================================================
+# Formato de intercambio de embeddings con facedetection-mcsv
+# ==========================================================
+#   json   -> lista de floats (formato original)
+#   b64f32 -> base64 de float32 little-endian (~3.5x menor que texto)
+#   b64f16 -> base64 de float16 little-endian
+#   raw    -> cuerpo binario application/octet-stream con float32 little-endian
+# Se siguen aceptando los strings "v1;v2;...;vN" que enviaba facedetection.
+#
+# En la tabla unknown_faces el embedding se guarda como "b64f32:<base64>";
+# las filas antiguas en texto ';' se siguen leyendo sin migración.
+
+EMBEDDING_FORMATS = ('json', 'b64f32', 'b64f16', 'raw')
+WIRE_FORMAT = 'b64f32'  # formato que pedimos a facedetection
+
+_BASE64_DTYPES = {
+    'b64f32': '<f4',
+    'b64f16': '<f2',
+}
+
+
+def encode_embedding(embedding, fmt: str = 'json'):
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    if fmt == 'json':
+        return vector.tolist()
+    if fmt in _BASE64_DTYPES:
+        return base64.b64encode(vector.astype(_BASE64_DTYPES[fmt]).tobytes()).decode('ascii')
+    if fmt == 'raw':
+        return vector.astype('<f4').tobytes()
+    raise ValueError(f"Unsupported embedding format: {fmt}")
+
+
+def decode_embedding(value, fmt: Optional[str] = None) -> np.ndarray:
+    """
+    Convierte cualquiera de los formatos aceptados (incluido el almacenado
+    "b64f32:<base64>") en un np.ndarray float32. Lanza ValueError si no se puede.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype='<f4').astype(np.float32)
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return np.asarray(value, dtype=np.float32).ravel()
+    if isinstance(value, str):
+        if fmt is None:
+            tag, sep, data = value.partition(':')
+            if sep and tag in _BASE64_DTYPES:
+                fmt, value = tag, data
+        if fmt in _BASE64_DTYPES:
+            raw = base64.b64decode(value, validate=True)
+            return np.frombuffer(raw, dtype=_BASE64_DTYPES[fmt]).astype(np.float32)
+        if fmt in (None, 'json', 'legacy'):
+            vector = np.array([float(v) for v in value.split(';') if v.strip()], dtype=np.float32)
+            if vector.size == 0:
+                raise ValueError("Empty embedding string.")
+            return vector
+    raise ValueError(f"Cannot decode embedding with format {fmt!r}")
+
+
+def to_storage(embedding) -> str:
+    """Representación compacta para la columna UnknownFace.embedding."""
+    return f"b64f32:{encode_embedding(embedding, 'b64f32')}"
+
+
+def decode_response_embedding(response) -> Optional[np.ndarray]:
+    """
+    Extrae el embedding de una respuesta de facedetection, sea binaria
+    (application/octet-stream) o JSON con/sin 'embedding_format'.
+    """
+    if response.headers.get('Content-Type', '').startswith('application/octet-stream'):
+        return decode_embedding(response.content)
+
+    data = response.json()
+    value = data.get('embedding')
+    if value is None or (isinstance(value, (list, str)) and len(value) == 0):
+        return None
+    return decode_embedding(value, data.get('embedding_format'))
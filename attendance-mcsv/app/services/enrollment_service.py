@@ -1,17 +1,17 @@
 import requests
+from app.services.http_client import get_client
 
 # ==========================================================
 # Función interna: envía los datos al microservicio remoto
 # ==========================================================
 def _send_to_course_service(student_id, course_id):
-    course_service_url = "http://localhost:4000/assign-to-course"
     payload = {
         "student_id": student_id,
         "course_id": course_id
     }
 
     try:
-        response = requests.post(course_service_url, json=payload)
+        response = get_client('facedetection').post('/assign-to-course', json=payload)
         if response.status_code == 200:
             return True
         else:
@@ -0,0 +1,91 @@
+import threading
+
+import requests
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.services.http_client import get_client
+from config import Config
+
+# ==========================================================
+# Sincronización de horarios con facedetection-mcsv
+# ==========================================================
+# facedetection guarda en memoria el mapa schedule_id -> course_id. Aquí se escuchan
+# los eventos de la sesión de SQLAlchemy, así que cualquier ruta o comando que cree,
+# modifique o borre horarios (incluido el borrado en cascada de un curso) avisa tras
+# el commit a POST /schedules/sync. Los borrados masivos (query(Schedule).delete() de
+# los comandos de seed) no pasan por objetos: se pide recargar la tabla completa.
+# El envío va en un hilo aparte para no retrasar el commit; si falla, facedetection
+# lo recoge en su siguiente recarga (SCHEDULE_CACHE_TTL / SCHEDULE_CACHE_MISS_REFRESH).
+# La ruta exige el token compartido SCHEDULE_SYNC_TOKEN; sin él no se registran los eventos.
+
+_PENDING_KEY = 'facedetection_schedule_sync'
+
+
+def _pending(session):
+    return session.info.setdefault(_PENDING_KEY, {"schedules": {}, "deleted": set(), "invalidate": False})
+
+
+def _collect_changes(session, flush_context):
+    from app.models.schedule import Schedule
+
+    changes = None
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Schedule):
+            changes = changes or _pending(session)
+            changes["schedules"][obj.id] = obj.course_id
+            changes["deleted"].discard(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, Schedule):
+            changes = changes or _pending(session)
+            changes["schedules"].pop(obj.id, None)
+            changes["deleted"].add(obj.id)
+
+
+def _collect_bulk_delete(orm_execute_state):
+    from app.models.schedule import Schedule
+
+    if orm_execute_state.is_delete and any(m.class_ is Schedule for m in orm_execute_state.all_mappers):
+        _pending(orm_execute_state.session)["invalidate"] = True
+
+
+def _discard_changes(session, *args):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _send_changes(session):
+    changes = session.info.pop(_PENDING_KEY, None)
+    if not changes:
+        return
+    payload = {
+        "schedules": [{"id": schedule_id, "course_id": course_id} for schedule_id, course_id in changes["schedules"].items()],
+        "deleted": sorted(changes["deleted"]),
+        "invalidate": changes["invalidate"],
+    }
+    # No daemon: un comando CLI (seed) espera a que salga el aviso antes de terminar
+    threading.Thread(target=push_schedules, args=(payload,), name='schedule-sync').start()
+
+
+def push_schedules(payload):
+    """Envía a facedetection los horarios nuevos/modificados, los borrados o la orden de recarga."""
+    try:
+        response = get_client('facedetection').post(
+            '/schedules/sync', json=payload, headers={'X-Sync-Token': Config.SCHEDULE_SYNC_TOKEN}, timeout=2
+        )
+        if response.status_code != 200:
+            print(f"[WARN] facedetection no aceptó la sincronización de horarios: {response.status_code} - {response.text}")
+    except requests.exceptions.RequestException as e:
+        print(f"[WARN] No se pudieron sincronizar los horarios con facedetection: {e}")
+
+
+def register_schedule_sync():
+    """Registra los listeners (una sola vez por proceso) si hay SCHEDULE_SYNC_TOKEN."""
+    if not Config.SCHEDULE_SYNC_TOKEN:
+        print("[INFO] SCHEDULE_SYNC_TOKEN no definido: facedetection recargará los horarios por TTL.")
+        return
+    if event.contains(Session, 'after_flush', _collect_changes):
+        return
+    event.listen(Session, 'after_flush', _collect_changes)
+    event.listen(Session, 'do_orm_execute', _collect_bulk_delete)
+    event.listen(Session, 'after_commit', _send_changes)
+    event.listen(Session, 'after_rollback', _discard_changes)
@@ -2,6 +2,10 @@ import os
 import requests
 from app import db  # Importación necesaria para actualizar la DB
 from app.models.student import Student # Importación del modelo
+from app.services.http_client import get_client
+
+# Generar embeddings de varias imágenes puede tardar bastante más que el timeout por defecto
+EMBEDDING_SERVICE_TIMEOUT = 120
 
 # ==========================================================
 # Función: Actualiza el estado de embeddings a True
@@ -24,12 +28,13 @@ def update_student_embedding_status(student_id):
 # Función interna: envía N imágenes al endpoint de embeddings
 # ==========================================================
 def _send_to_embedding_service(files_payload, student_id):
-    recognition_service_url = "http://localhost:4000/generate-embedding"
     data = {'student_id': student_id}
 
     try:
         # Enviar todas las imágenes en un solo request
-        response = requests.post(recognition_service_url, files=files_payload, data=data)
+        response = get_client('facedetection').post(
+            '/generate-embedding', files=files_payload, data=data, timeout=EMBEDDING_SERVICE_TIMEOUT
+        )
         if response.status_code == 200:
             res = update_student_embedding_status(student_id)
             if res: return True
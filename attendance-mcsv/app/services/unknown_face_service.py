@@ -7,8 +7,9 @@ from app.models.unknown_face import UnknownFace
 from app.models.student import Student
 from app.models.schedule import Schedule
 from app.models.course import Course
+from app.services.http_client import get_client
+from app.services.embedding_codec import decode_embedding, decode_response_embedding, WIRE_FORMAT
 
-FACEDETECTION_BASE_URL = "http://127.0.0.1:4000"
 DEFAULT_THRESHOLD = 0.3
 
 
@@ -16,7 +17,7 @@ def _parse_unknown_embedding(embedding_str: str) -> Optional[np.ndarray]:
     if not embedding_str:
         return None
     try:
-        arr = np.fromstring(embedding_str, sep=';').astype('float32')
+        arr = decode_embedding(embedding_str)
         if arr.size == 0:
             return None
         return arr
@@ -26,25 +27,21 @@ def _parse_unknown_embedding(embedding_str: str) -> Optional[np.ndarray]:
 
 
 def _get_student_embedding(student_id: str) -> Optional[np.ndarray]:
-    url = f"{FACEDETECTION_BASE_URL}/student-embedding/{student_id}"
+    facedetection = get_client('facedetection')
+    path = f"/student-embedding/{student_id}"
     try:
-        resp = requests.get(url, timeout=5)
+        resp = facedetection.get(path, params={'embedding_format': WIRE_FORMAT}, timeout=5)
     except requests.RequestException as e:
-        print(f"[ERROR] Failed to reach facedetection at {url}: {e}")
+        print(f"[ERROR] Failed to reach facedetection at {facedetection.url(path)}: {e}")
         return None
 
     if resp.status_code != 200:
         print(f"[WARN] student-embedding returned {resp.status_code}: {resp.text}")
         return None
 
-    data = resp.json()
-    emb_list = data.get("embedding")
-    if not emb_list:
-        return None
-
     try:
-        emb = np.array(emb_list, dtype='float32')
-        if emb.size == 0:
+        emb = decode_response_embedding(resp)
+        if emb is None or emb.size == 0:
             return None
         return emb
     except Exception as e:
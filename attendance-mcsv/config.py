@@ -11,3 +11,28 @@ class Config:
     CORS_HEADERS = 'Content-Type'
     CORS_RESOURCES = {r"/*": {"origins": "*"}}  # Configuración de CORS para todas las rutas
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'attendance-system-with-face-recognition'
+
+    # --- Servicios remotos (URL base configurable por entorno) ---
+    FACEDETECTION_SERVICE_URL = os.environ.get('FACEDETECTION_SERVICE_URL', 'http://127.0.0.1:4000')
+    HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', 10))  # segundos
+    HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 2))
+    HTTP_BACKOFF = float(os.environ.get('HTTP_BACKOFF', 0.3))  # 0.3s, 0.6s, ...
+    HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+    # Token compartido con facedetection para POST /schedules/sync; sin definir no se avisa
+    SCHEDULE_SYNC_TOKEN = os.environ.get('SCHEDULE_SYNC_TOKEN')
+
+    # --- Capturas de rostros (escritas por facedetection-mcsv) ---
+    CAPTURES_DIR = os.environ.get('CAPTURES_DIR') or os.path.abspath(
+        os.path.join(base_dir, '..', 'facedetection-mcsv', 'captures')
+    )
+    # Retención: 'delete' borra definitivamente, 'archive' mueve a CAPTURES_DIR/.archive
+    CAPTURES_RETENTION_MODE = os.environ.get('CAPTURES_RETENTION_MODE', 'delete')
+    CAPTURES_TTL_DAYS = int(os.environ.get('CAPTURES_TTL_DAYS', 14))  # capturas sin UnknownFace asociado
+    UNKNOWN_FACE_TTL_DAYS = int(os.environ.get('UNKNOWN_FACE_TTL_DAYS', 90))  # unknown faces sin resolver
+    RESOLVED_UNKNOWN_FACE_TTL_DAYS = int(os.environ.get('RESOLVED_UNKNOWN_FACE_TTL_DAYS', 7))
+    CAPTURES_PACK_AFTER_DAYS = int(os.environ.get('CAPTURES_PACK_AFTER_DAYS', 2))  # empaquetar JPEGs sueltos en zip diario
+    CAPTURES_THUMBNAIL_WIDTH = int(os.environ.get('CAPTURES_THUMBNAIL_WIDTH', 128))
+    CAPTURES_MAINTENANCE_AT = os.environ.get('CAPTURES_MAINTENANCE_AT', '03:00')  # hora diaria del job
+    # Servido de /captures: las capturas son inmutables (nombre con timestamp), se cachean largo
+    CAPTURES_CACHE_MAX_AGE = int(os.environ.get('CAPTURES_CACHE_MAX_AGE', 7 * 24 * 3600))  # segundos
+    CAPTURES_VARIANT_WIDTHS = (64, 128, 256, 512)  # anchos permitidos para ?w= (limita la caché en disco)
@@ -1,31 +1,58 @@
 # facedetection-mcsv/app/__init__.py
 from flask import Flask
 import config
-from .models import custom_face_model as face_analyzer
-# from .models import face_model as face_analyzer
-from .services import database_service
 
 def create_app():
+    # Importaciones pesadas (torch, RetinaFace) dentro de la fábrica, para que módulos
+    # ligeros como app.services.http_client se puedan usar sin cargar el modelo.
+    from .models import custom_face_model as face_analyzer
+    from .services.readiness import readiness
+    # from .models import face_model as face_analyzer
+
     app = Flask(__name__)
     app.config.from_object(config)
 
     print("Initializing application resources...")
     # known_db = database_service.load_known_faces_from_csv("students")
-    face_model = face_analyzer.load_model()
 
     # 🔹 Nueva parte: convertir a matriz NumPy
     # known_matrix, known_labels = database_service.prepare_vectorized_db(known_db)
 
-    app.face_model = face_model
     # app.known_db = known_db
     # app.known_matrix = known_matrix
     # app.known_labels = known_labels
-    print("Application resources loaded successfully.")
+    app.face_model = None
+
+    def set_model(model):
+        app.face_model = model
+        return model
+
+    def arcface_detail(model):
+        return {"weights": model.weights_source, "device": str(model.device)}
+
+    if config.PRELOAD_MODEL:
+        # Master de gunicorn: sin paralelismo ni warm-up antes del fork (ver gunicorn.conf.py).
+        # El detector se calienta en cada worker, en segundo plano, tras el fork.
+        face_analyzer.configure_inference_threads(1, tensorflow=False)
+        readiness.run('arcface', lambda: set_model(face_analyzer.load_model(warmup=False)), arcface_detail)
+    elif config.MODEL_BACKGROUND_LOAD:
+        # El servidor arranca de inmediato; /ready y las rutas del modelo responden 503 hasta terminar
+        readiness.run_in_background([
+            ('arcface', lambda: set_model(face_analyzer.load_model(warmup=False)), arcface_detail),
+            ('retinaface', lambda: app.face_model.warmup()),
+        ])
+        print("Loading model in the background (see /ready).")
+    else:
+        readiness.run('arcface', lambda: set_model(face_analyzer.load_model(warmup=False)), arcface_detail)
+        readiness.run('retinaface', lambda: app.face_model.warmup())
+        print("Application resources loaded successfully.")
 
     from .routes.processing_routes import processing_bp
     from .routes.recognition_routes import recognition_bp
+    from .routes.system_routes import system_bp
 
     app.register_blueprint(processing_bp)
     app.register_blueprint(recognition_bp)
+    app.register_blueprint(system_bp)
 
     return app
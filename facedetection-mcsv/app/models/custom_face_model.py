@@ -1,8 +1,13 @@
 import cv2
+import hashlib
 import numpy as np
 import torch
 import os
-import time # Solo para el print de carga
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import time
+from .. import config
 
 # Dependencias de Detección y Reconocimiento
 try:
@@ -19,112 +24,565 @@ except ImportError:
     print("Asegúrate de que 'arcface.py' e 'iresnet.py' estén en el mismo directorio.")
     exit()
 
+from .embedding_batcher import EmbeddingBatcher
+from . import face_quality
+from ..services.metrics import STAGE_SECONDS, REJECTED_FACES
+from ..services.profiling import is_profiling
+
+EMBEDDING_SIZE = 512
+DETECTION_MODES = ('single', 'tiled')
+TILE_EDGE_MARGIN = 2  # px: cajas que tocan un borde interior de la tesela están cortadas
+
 
 # --- 1. CLASE DE DATOS PARA LA CARA ---
 
 class CustomFace:
-    def __init__(self, det_score, embedding, bbox, landmarks):
+    def __init__(self, det_score, embedding, bbox, landmarks, quality=None):
         self.det_score = det_score   # Puntuación de confianza de la detección
         self.embedding = embedding   # Vector de embedding (NumPy array)
         self.bbox = bbox             # Bounding box [x1, y1, x2, y2]
         self.landmarks = landmarks   # Puntos clave faciales (dict)
+        self.quality = quality or {} # Medidas del filtro de calidad (ver face_quality.py)
 
 # --- 2. FUNCIONES DE ALINEAMIENTO Y PREPROCESAMIENTO ---
+TARGET_FACE_SIZE = (112, 112)
+# Posiciones de referencia de ArcFace para los 5 landmarks en la cara de 112x112
+ARCFACE_REF_POINTS = np.array([
+    [38.2946, 51.6963], [73.5318, 51.5014], [56.0252, 71.7366],
+    [41.5493, 92.3655], [70.7299, 92.2041]
+], dtype=np.float64)
+LANDMARK_ORDER = ('left_eye', 'right_eye', 'nose', 'mouth_left', 'mouth_right')
+
+_align_buffers = threading.local()
+
+
+def similarity_transforms(src, dst=ARCFACE_REF_POINTS):
+    """
+    Transformaciones de similitud (escala, rotación, traslación) por mínimos cuadrados
+    de cada conjunto de puntos src (N, K, 2) a dst (K, 2), en forma cerrada (Umeyama
+    sin reflexión) y para todas las caras a la vez. Devuelve (matrices (N, 2, 3), válidas (N,)).
+    Con puntos centrados x (src) e y (dst), la matriz es [[a, -b], [b, a]] con
+      a = Σ x·y / Σ|x|²,   b = Σ (x1·y2 - x2·y1) / Σ|x|².
+    """
+    src = np.asarray(src, dtype=np.float64)
+    src_mean = src.mean(axis=1, keepdims=True)
+    dst_mean = dst.mean(axis=0)
+    x = src - src_mean
+    y = dst - dst_mean
+    norm = np.einsum('nkd,nkd->n', x, x)
+    valid = np.isfinite(norm) & (norm > 1e-6)
+    norm = np.where(valid, norm, 1.0)
+    a = np.einsum('nkd,kd->n', x, y) / norm
+    b = (x[:, :, 0] @ y[:, 1] - x[:, :, 1] @ y[:, 0]) / norm
+
+    matrices = np.empty((len(src), 2, 3), dtype=np.float64)
+    matrices[:, 0, 0] = a
+    matrices[:, 0, 1] = -b
+    matrices[:, 1, 0] = b
+    matrices[:, 1, 1] = a
+    # t = media(dst) - M · media(src)
+    matrices[:, :, 2] = dst_mean - np.einsum('nij,nj->ni', matrices[:, :, :2], src_mean[:, 0, :])
+    return matrices, valid
+
+
+def _align_buffer(count):
+    """Buffer (count, 112, 112, 3) uint8 reutilizado por hilo; crece cuando hace falta."""
+    buffer = getattr(_align_buffers, 'faces', None)
+    if buffer is None or len(buffer) < count:
+        capacity = max(count, 2 * len(buffer) if buffer is not None else 32)
+        buffer = np.empty((capacity, TARGET_FACE_SIZE[1], TARGET_FACE_SIZE[0], 3), dtype=np.uint8)
+        _align_buffers.faces = buffer
+    return buffer[:count]
+
+
+def warp_faces(image, matrices, out):
+    """Aplica cada transformación y escribe la cara alineada directamente en out[i]."""
+    for i, matrix in enumerate(matrices):
+        cv2.warpAffine(image, matrix, TARGET_FACE_SIZE, dst=out[i], borderMode=cv2.BORDER_REPLICATE)
+    return out
+
+
 def align_and_transform_face(image, landmarks):
-    TARGET_FACE_SIZE = (112, 112)
-    ref_points = np.array([
-        [38.2946, 51.6963], [73.5318, 51.5014], [56.0252, 71.7366],
-        [41.5493, 92.3655], [70.7299, 92.2041]
-    ], dtype=np.float32)
-    
-    detected_points = np.array([
-        landmarks['left_eye'], landmarks['right_eye'], landmarks['nose'],
-        landmarks['mouth_left'], landmarks['mouth_right']
-    ], dtype=np.float32)
-    
-    transform_matrix = cv2.estimateAffine2D(detected_points, ref_points)[0]
-    aligned_face = cv2.warpAffine(image, transform_matrix, TARGET_FACE_SIZE, borderMode=cv2.BORDER_REPLICATE)
-    return aligned_face
-
-def preprocess_face_image(face_image_array, device):
-    # 1. Normalización: Escala los valores de píxeles de [0, 255] a [-1, 1]
-    img_normalized = (face_image_array.astype(np.float32) - 127.5) / 128.0
-    # 2. Transposición: Cambia el formato de (H, W, C) a (C, H, W) como espera PyTorch
-    img_transposed = np.transpose(img_normalized, (2, 0, 1))
-    # 3. Conversión a Tensor: Convierte el array de NumPy a un tensor de PyTorch
-    input_tensor = torch.from_numpy(img_transposed).to(device).unsqueeze(0)
-    return input_tensor
+    """Alinea una sola cara a 112x112 (dict de landmarks de RetinaFace)."""
+    points = np.array([[landmarks[name] for name in LANDMARK_ORDER]], dtype=np.float64)
+    matrices, valid = similarity_transforms(points)
+    if not valid[0]:
+        raise ValueError("Landmarks degenerados: no se puede calcular la alineación.")
+    out = np.empty((1, TARGET_FACE_SIZE[1], TARGET_FACE_SIZE[0], 3), dtype=np.uint8)
+    return warp_faces(image, matrices, out)[0]
+
+def preprocess_face_batch(face_images, out):
+    """
+    Normaliza caras alineadas (N, H, W, C) uint8 y las escribe como (N, C, H, W) float32
+    en `out` (vista de un tensor reservado), sin copias intermedias: from_numpy no copia,
+    permute es una vista y copy_ convierte tipo y disposición en una sola pasada.
+    """
+    out.copy_(torch.from_numpy(face_images).permute(0, 3, 1, 2))
+    # Escala los valores de píxeles de [0, 255] a [-1, 1]
+    return out.sub_(127.5).div_(128.0)
+
+
+def detection_scale(frame_shape, max_side=None, min_face_px=None):
+    """
+    Factor (<= 1) al que se reduce el frame antes de detectar, o None si no hay política
+    de escala (RetinaFace decide). min_face_px tiene prioridad sobre max_side; None en
+    cualquiera de los dos toma el valor de config.
+    """
+    max_side = config.DETECTION_MAX_SIDE if max_side is None else max_side
+    min_face_px = config.DETECTION_MIN_FACE_PX if min_face_px is None else min_face_px
+    if min_face_px and min_face_px > 0:
+        return min(1.0, config.DETECTOR_MIN_FACE_PX / float(min_face_px))
+    if max_side and max_side > 0:
+        return min(1.0, max_side / float(max(frame_shape[:2])))
+    return None
+
+
+def _rescale_detection(face_info, factor):
+    """Lleva una detección de RetinaFace de la imagen reducida al frame original."""
+    return {
+        **face_info,
+        'facial_area': [int(round(v * factor)) for v in face_info['facial_area']],
+        'landmarks': {name: [float(x) * factor, float(y) * factor] for name, (x, y) in face_info['landmarks'].items()},
+    }
+
+
+def tile_grid(height, width, tile_size, overlap):
+    """
+    Orígenes (x, y, ancho, alto) de teselas de tile_size px con al menos `overlap` px de
+    solape; la última de cada fila/columna se alinea con el borde del frame.
+    """
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        stride = max(1, tile_size - overlap)
+        positions = list(range(0, length - tile_size, stride))
+        return positions + [length - tile_size]
+
+    return [
+        (x, y, min(tile_size, width), min(tile_size, height))
+        for y in starts(height) for x in starts(width)
+    ]
+
+
+def nms(boxes, scores, iou_threshold):
+    """Supresión de no-máximos voraz; devuelve los índices conservados por score descendente."""
+    boxes = np.asarray(boxes, dtype=np.float32)
+    if len(boxes) == 0:
+        return []
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = np.argsort(scores)[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(int(i))
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        inter = np.maximum(0.0, xx2 - xx1 + 1) * np.maximum(0.0, yy2 - yy1 + 1)
+        iou = inter / (areas[i] + areas[order[1:]] - inter)
+        order = order[1:][iou <= iou_threshold]
+    return keep
+
+
+def _offset_detection(face_info, dx, dy):
+    """Traslada una detección de coordenadas de la tesela a coordenadas del frame."""
+    x1, y1, x2, y2 = face_info['facial_area']
+    return {
+        **face_info,
+        'facial_area': [int(x1) + dx, int(y1) + dy, int(x2) + dx, int(y2) + dy],
+        'landmarks': {name: [float(x) + dx, float(y) + dy] for name, (x, y) in face_info['landmarks'].items()},
+    }
+
+
+def _cut_by_tile(face_info, tile, frame_shape):
+    """True si la caja toca un borde de la tesela que no es borde del frame (cara cortada)."""
+    x, y, w, h = tile
+    x1, y1, x2, y2 = face_info['facial_area']
+    return (
+        (x > 0 and x1 <= TILE_EDGE_MARGIN)
+        or (y > 0 and y1 <= TILE_EDGE_MARGIN)
+        or (x + w < frame_shape[1] and x2 >= w - 1 - TILE_EDGE_MARGIN)
+        or (y + h < frame_shape[0] and y2 >= h - 1 - TILE_EDGE_MARGIN)
+    )
+
+
+@contextmanager
+def _stage(name, timings=None):
+    # Mide una etapa del pipeline: histograma de /metrics y, opcionalmente, el dict del llamador
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        if timings is not None:
+            timings[name] = elapsed
 
 
 # --- 3. CLASE PRINCIPAL DEL MODELO ---
 
 class CustomFaceAnalysis:
-    def __init__(self, arcface_model_path):
+    def __init__(self, arcface_model_path, warmup=True):
         print("Cargando modelo ArcFace personalizado...")
-        if not os.path.exists(arcface_model_path):
+        artifact_path = inference_artifact_path(arcface_model_path)
+        if not os.path.exists(arcface_model_path) and not os.path.exists(artifact_path):
             print(f"Error: Archivo del modelo no encontrado en '{arcface_model_path}'")
             raise FileNotFoundError(f"No se encontró el modelo en {arcface_model_path}")
-            
+
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.max_batch = config.EMBEDDING_MAX_BATCH
+        self._tile_pool = None  # ThreadPoolExecutor de la detección teselada (se crea al primer uso)
+        # Tensor de entrada de ArcFace (max_batch, 3, 112, 112) reutilizado en cada embed();
+        # el lock lo protege cuando embed() se llama desde varios hilos (sin micro-batching).
+        self._input_buffer = None
+        self._embed_lock = threading.Lock()
+        self._tile_pool_lock = threading.Lock()
+
+        # Micro-batching entre peticiones concurrentes (0 ms = desactivado)
+        self._active_requests = 0
+        self._active_lock = threading.Lock()
+        self.batcher = None
+        if config.EMBEDDING_BATCH_WINDOW_MS > 0:
+            self.batcher = EmbeddingBatcher(
+                self.embed,
+                window_ms=config.EMBEDDING_BATCH_WINDOW_MS,
+                max_batch=self.max_batch,
+                active_requests=lambda: self._active_requests,
+            )
         
         try:
             # Cargar el modelo de reconocimiento (Arcface)
-            self.recognition_model = Arcface(backbone='iresnet50', mode='predict')
-            self.recognition_model.load_state_dict(torch.load(arcface_model_path, map_location=self.device), strict=False)
-            self.recognition_model.to(self.device)
-            self.recognition_model.eval()
-            print(f"Modelo ArcFace cargado exitosamente en {self.device}")
-            print("Preparando el detector RetinaFace...")
-            _ = RetinaFace.detect_faces(np.zeros((640, 640, 3), dtype=np.uint8))
-            print("Detector (RetinaFace) listo.")
+            self.recognition_model, self.weights_source = build_recognition_model(arcface_model_path, self.device)
+            self.fingerprint = model_fingerprint(arcface_model_path)
+            print(f"Modelo ArcFace cargado exitosamente en {self.device} (pesos: {self.weights_source})")
+            if warmup:
+                self.warmup()
             
         except Exception as e:
             print(f"Error al cargar los modelos: {e}")
             raise
 
-    @torch.no_grad()  # Desactiva el cálculo de gradientes para inferencia
-    def get(self, frame):
-        results = []
-        # 1. Detección de caras con RetinaFace
+    def warmup(self):
+        """
+        Construye el detector RetinaFace (TensorFlow) y ejecuta una pasada de ArcFace.
+        Con gunicorn --preload se llama en cada worker tras el fork: TensorFlow y el
+        pool de hilos de torch no son seguros si se inicializan antes del fork.
+        """
+        self.warmup_detector()
+        self.warmup_recognizer()
+
+    def warmup_detector(self):
+        print("Preparando el detector RetinaFace...")
+        _ = RetinaFace.detect_faces(np.zeros((640, 640, 3), dtype=np.uint8))
+        print("Detector (RetinaFace) listo.")
+
+    def warmup_recognizer(self):
+        self.embed(np.zeros((1, 112, 112, 3), dtype=np.uint8))
+
+    # --- Etapas del pipeline: detección -> alineamiento -> embedding ---
+
+    def detect(self, frame, scale=None):
+        """
+        Devuelve la lista de detecciones de RetinaFace (dicts con score, facial_area,
+        landmarks) en coordenadas de `frame`. Con `scale` (ver detection_scale) se detecta
+        sobre una copia reducida y sin el reescalado interno de RetinaFace, que llevaría
+        el lado menor a 1024 px.
+        """
         try:
-            faces_data = RetinaFace.detect_faces(frame)
+            if scale is None:
+                faces_data = RetinaFace.detect_faces(frame)
+            else:
+                image = frame
+                if scale < 1.0:
+                    size = (max(1, round(frame.shape[1] * scale)), max(1, round(frame.shape[0] * scale)))
+                    image = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                faces_data = RetinaFace.detect_faces(image, allow_upscaling=False)
             if not isinstance(faces_data, dict):
                 return []
         except Exception as e:
             print(f"Error durante la detección con RetinaFace: {e}")
             return []
+        if scale is None or scale >= 1.0:
+            return list(faces_data.values())
+        return [_rescale_detection(face_info, 1.0 / scale) for face_info in faces_data.values()]
 
-        # 2. Procesar cada cara detectada
-        for face_id, face_info in faces_data.items():
-            try:
-                score = face_info['score']
-                landmarks = face_info['landmarks']
-                bbox = face_info['facial_area'] # [x1, y1, x2, y2]
-                aligned_face = align_and_transform_face(frame, landmarks)
-                input_tensor = preprocess_face_image(aligned_face, self.device)
-                embedding_tensor = self.recognition_model(input_tensor)
-                embedding_vector = embedding_tensor.cpu().numpy().flatten()
-                face_obj = CustomFace(
-                    det_score=score,
-                    embedding=embedding_vector,
-                    bbox=bbox,
-                    landmarks=landmarks
+    def _tile_executor(self):
+        with self._tile_pool_lock:
+            if self._tile_pool is None:
+                self._tile_pool = ThreadPoolExecutor(
+                    max_workers=max(1, config.DETECTION_TILE_WORKERS), thread_name_prefix='tile-detect'
                 )
-                results.append(face_obj)
-            except Exception as e:
+            return self._tile_pool
+
+    def detect_tiled(self, frame, tile_size=None, overlap=None):
+        """
+        Detección por teselas solapadas (en paralelo, cada una con el reescalado de RetinaFace,
+        que amplía las caras pequeñas) más una pasada global reducida a tile_size de la que solo
+        se toman las caras mayores que el solape. Las cajas cortadas por un borde interior de
+        tesela se descartan (la tesela vecina la contiene entera) y el resto se une con NMS.
+        """
+        tile_size = tile_size or config.DETECTION_TILE_SIZE
+        overlap = config.DETECTION_TILE_OVERLAP if overlap is None else overlap
+        height, width = frame.shape[:2]
+        tiles = tile_grid(height, width, tile_size, overlap)
+        if len(tiles) == 1:
+            return self.detect(frame)
+
+        def detect_tile(tile):
+            x, y, w, h = tile
+            return [
+                _offset_detection(face_info, x, y)
+                for face_info in self.detect(frame[y:y + h, x:x + w])
+                if not _cut_by_tile(face_info, tile, frame.shape)
+            ]
+
+        def is_large(face_info):
+            # Las caras menores que el solape caben enteras en alguna tesela, a más resolución
+            x1, y1, x2, y2 = face_info['facial_area']
+            return max(x2 - x1, y2 - y1) >= overlap
+
+        executor = self._tile_executor()
+        global_pass = executor.submit(self.detect, frame, detection_scale(frame.shape, max_side=tile_size, min_face_px=0))
+        detections = [face_info for found in executor.map(detect_tile, tiles) for face_info in found]
+        detections.extend(face_info for face_info in global_pass.result() if is_large(face_info))
+        if not detections:
+            return []
+        keep = nms([d['facial_area'] for d in detections], [float(d['score']) for d in detections], config.DETECTION_NMS_IOU)
+        return [detections[i] for i in keep]
+
+    def align(self, frame, detections):
+        """
+        Alinea todas las detecciones a 112x112 con una transformación de similitud calculada
+        en bloque. Devuelve (caras (N, 112, 112, 3) uint8, detecciones válidas); las de
+        landmarks ausentes o degenerados se descartan. Las caras se escriben en un buffer
+        reutilizado por hilo: son válidas hasta la siguiente llamada a align() del mismo hilo.
+        """
+        points = []
+        candidates = []
+        for face_id, face_info in enumerate(detections):
+            try:
+                points.append([face_info['landmarks'][name] for name in LANDMARK_ORDER])
+                candidates.append(face_info)
+            except (KeyError, TypeError) as e:
                 print(f"Error procesando la cara {face_id}: {e}")
-                continue 
-                
-        return results
+        if not candidates:
+            return np.empty((0, 112, 112, 3), dtype=np.uint8), []
+
+        matrices, valid = similarity_transforms(np.array(points, dtype=np.float64).reshape(-1, 5, 2))
+        if not valid.all():
+            print(f"[WARN] {int((~valid).sum())} caras con landmarks degenerados descartadas.")
+            matrices = matrices[valid]
+            candidates = [face_info for face_info, ok in zip(candidates, valid) if ok]
+        aligned_faces = warp_faces(frame, matrices, _align_buffer(len(candidates)))
+        return aligned_faces, candidates
+
+    @torch.no_grad()  # Desactiva el cálculo de gradientes para inferencia
+    def embed(self, aligned_faces):
+        """Embeddings (N, 512) de caras alineadas, en batches de hasta EMBEDDING_MAX_BATCH."""
+        if len(aligned_faces) == 0:
+            return np.empty((0, EMBEDDING_SIZE), dtype=np.float32)
+        aligned_faces = np.ascontiguousarray(aligned_faces)
+        embeddings = np.empty((len(aligned_faces), EMBEDDING_SIZE), dtype=np.float32)
+        with self._embed_lock:
+            if self._input_buffer is None:
+                self._input_buffer = torch.empty((self.max_batch, 3, 112, 112), dtype=torch.float32, device=self.device)
+            for start in range(0, len(aligned_faces), self.max_batch):
+                chunk = aligned_faces[start:start + self.max_batch]
+                input_tensor = preprocess_face_batch(chunk, self._input_buffer[:len(chunk)])
+                embeddings[start:start + len(chunk)] = self.recognition_model(input_tensor).cpu().numpy()
+        return embeddings
+
+    def detect_faces(self, frame, timings=None, max_side=None, min_face_px=None, detection_mode=None):
+        """
+        Etapa de detección de prepare(): `detection_mode` ('single' | 'tiled') sustituye a
+        DETECTION_MODE y, en modo 'single', `max_side` / `min_face_px` a la política de
+        escala de detección de config.
+        """
+        detection_mode = detection_mode or config.DETECTION_MODE
+        with _stage('detection', timings):
+            if detection_mode == 'tiled':
+                return self.detect_tiled(frame)
+            return self.detect(frame, detection_scale(frame.shape, max_side, min_face_px))
+
+    def prepare_detections(self, frame, detections, timings=None):
+        """Alineamiento y filtro de calidad de detecciones ya hechas (ver prepare())."""
+        empty = (np.empty((0, 112, 112, 3), dtype=np.uint8), [], [])
+        if not detections:
+            return empty
+        with _stage('alignment', timings):
+            aligned_faces, detections = self.align(frame, detections)
+        if not detections:
+            return empty
+
+        # Filtro de calidad: las caras pequeñas, de perfil o borrosas no pasan por ArcFace
+        with _stage('quality', timings):
+            accepted, qualities, reasons = face_quality.assess(detections, aligned_faces)
+            for reason in reasons:
+                if reason is not None:
+                    REJECTED_FACES.inc(reason=reason)
+            if not accepted.all():
+                aligned_faces = aligned_faces[accepted]
+                detections = [d for d, ok in zip(detections, accepted) if ok]
+                qualities = [q for q, ok in zip(qualities, accepted) if ok]
+        return aligned_faces, detections, qualities
+
+    def prepare(self, frame, timings=None, **detection_options):
+        """
+        Detección, alineamiento y filtro de calidad (todo menos ArcFace). Devuelve
+        (caras alineadas (N, 112, 112, 3), detecciones, calidades) de las caras aceptadas;
+        las caras alineadas viven en el buffer del hilo (ver align()).
+        `detection_options`: max_side, min_face_px, detection_mode (ver detect_faces()).
+        """
+        detections = self.detect_faces(frame, timings, **detection_options)
+        return self.prepare_detections(frame, detections, timings)
+
+    @contextmanager
+    def tracking_request(self):
+        """Cuenta una petición en curso: el micro-batching espera a las que aún no enviaron caras."""
+        with self._active_lock:
+            self._active_requests += 1
+        try:
+            yield
+        finally:
+            with self._active_lock:
+                self._active_requests -= 1
+
+    def embed_request(self, aligned_faces, timings=None):
+        """embed() de las caras de una petición, por el micro-batching si está activo."""
+        with _stage('embedding', timings):
+            # Bajo perfilado se embebe en este hilo para que ArcFace aparezca en el perfil
+            if self.batcher is not None and not is_profiling():
+                return self.batcher.submit(aligned_faces)
+            return self.embed(aligned_faces)
+
+    def get(self, frame, timings=None, **detection_options):
+        """
+        Detecta, alinea, filtra por calidad y extrae el embedding de cada cara del frame.
+        Si se pasa `timings` (dict), se rellena con los segundos de cada etapa
+        (detection, alignment, quality, embedding); siempre se registran en /metrics.
+        `detection_options`: max_side, min_face_px, detection_mode (ver detect_faces()).
+        """
+        with self.tracking_request():
+            aligned_faces, detections, qualities = self.prepare(frame, timings, **detection_options)
+            if not detections:
+                return []
+            embeddings = self.embed_request(aligned_faces, timings)
+
+        return build_faces(detections, embeddings, qualities)
+
+
+def build_faces(detections, embeddings, qualities):
+    return [
+        CustomFace(
+            det_score=face_info['score'],
+            embedding=embedding,
+            bbox=face_info['facial_area'],  # [x1, y1, x2, y2]
+            landmarks=face_info['landmarks'],
+            quality=quality,
+        )
+        for face_info, embedding, quality in zip(detections, embeddings, qualities)
+    ]
+
+# --- 4. FUNCIONES DE CARGA PÚBLICAS ---
+
+# Artefacto de inferencia: el state_dict ya resuelto de Arcface guardado con torch.save
+# (formato zip, tensores contiguos). Se carga con mmap=True: los pesos se leen del page
+# cache bajo demanda en lugar de deserializarse, y los workers de gunicorn comparten
+# las mismas páginas. Se regenera si el .pth es más reciente.
+ARTIFACT_SUFFIX = '.inference.pt'
+
+
+def inference_artifact_path(model_path):
+    return os.path.splitext(model_path)[0] + ARTIFACT_SUFFIX
+
+
+def export_inference_artifact(recognition_model, artifact_path):
+    state_dict = {k: v.detach().to('cpu').contiguous() for k, v in recognition_model.state_dict().items()}
+    tmp_path = f"{artifact_path}.tmp"
+    torch.save(state_dict, tmp_path)
+    os.replace(tmp_path, artifact_path)
+    print(f"[INFO] Artefacto de inferencia guardado en {artifact_path}")
+
+
+def _artifact_is_fresh(model_path, artifact_path):
+    if not os.path.exists(artifact_path):
+        return False
+    return not os.path.exists(model_path) or os.path.getmtime(artifact_path) >= os.path.getmtime(model_path)
+
+
+def build_recognition_model(model_path, device):
+    """
+    Devuelve (Arcface en modo eval, origen de los pesos). Usa el artefacto mapeado en
+    memoria si está al día; si no, carga el checkpoint .pth y escribe el artefacto.
+    """
+    artifact_path = inference_artifact_path(model_path)
+    if _artifact_is_fresh(model_path, artifact_path):
+        try:
+            # En el dispositivo 'meta' no se reserva ni inicializa memoria: assign=True
+            # adopta directamente los tensores mapeados del artefacto.
+            with torch.device('meta'):
+                model = Arcface(backbone='iresnet50', mode='predict')
+            state_dict = torch.load(artifact_path, map_location='cpu', mmap=True, weights_only=True)
+            model.load_state_dict(state_dict, strict=True, assign=True)
+            return model.to(device).eval(), 'artifact'
+        except Exception as e:
+            print(f"[WARN] No se pudo usar el artefacto {artifact_path} ({e}); se carga el checkpoint.")
+
+    model = Arcface(backbone='iresnet50', mode='predict')
+    model.load_state_dict(torch.load(model_path, map_location='cpu'), strict=False)
+    if config.MODEL_WRITE_ARTIFACT:
+        try:
+            export_inference_artifact(model, artifact_path)
+        except (OSError, RuntimeError) as e:
+            print(f"[WARN] No se pudo escribir el artefacto de inferencia: {e}")
+    return model.to(device).eval(), 'checkpoint'
+
+
+def model_fingerprint(model_path):
+    """
+    Huella de los pesos (nombre, tamaño y fecha del .pth o, si falta, del artefacto) y de los
+    ajustes que cambian las caras devueltas por get() para una imagen subida. Forma parte de la clave de la caché
+    de embeddings: cambiar el modelo o estos ajustes invalida lo guardado.
+    """
+    source = model_path if os.path.exists(model_path) else inference_artifact_path(model_path)
+    stat = os.stat(source)
+    settings = (
+        os.path.basename(source), stat.st_size, stat.st_mtime_ns,
+        config.DETECTION_MODE, config.DETECTION_MAX_SIDE, config.DETECTION_MIN_FACE_PX,
+        config.DETECTOR_MIN_FACE_PX, config.DETECTION_TILE_SIZE, config.DETECTION_TILE_OVERLAP,
+        config.QUALITY_MIN_EYE_DISTANCE, config.QUALITY_MIN_FACE_SIZE, config.QUALITY_MAX_YAW,
+        config.QUALITY_MAX_PITCH, config.QUALITY_MIN_BLUR, config.DECODE_UPLOAD_MIN_SIDE,
+    )
+    return hashlib.sha256(repr(settings).encode()).hexdigest()[:16]
+
+
+def configure_inference_threads(num_threads, tensorflow=True):
+    """
+    Fija los hilos de inferencia de torch y TensorFlow del proceso actual.
+    Con varios workers, cada uno debe usar ~cores/workers para no sobresuscribir la CPU.
+    """
+    num_threads = max(1, int(num_threads))
+    torch.set_num_threads(num_threads)
+    if not tensorflow:
+        return
+    try:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    except (ImportError, RuntimeError) as e:
+        # RuntimeError: TensorFlow ya inicializado en este proceso
+        print(f"[WARN] No se pudieron fijar los hilos de TensorFlow: {e}")
+    print(f"[INFO] Hilos de inferencia por proceso: {num_threads}")
 
-# --- 4. FUNCIÓN DE CARGA PÚBLICA ---
 
-def load_model(model_path="ArcFace_iResNet50_CASIA_FaceV5.pth"):
+def load_model(model_path="ArcFace_iResNet50_CASIA_FaceV5.pth", warmup=True):
     print("Cargando pipeline de análisis facial personalizado (RetinaFace + ArcFace)...")
     start_time = time.perf_counter()
     base_dir = os.path.abspath(os.path.dirname(__file__))
     full_model_path = os.path.join(base_dir, model_path)
-    model = CustomFaceAnalysis(arcface_model_path=full_model_path)
+    model = CustomFaceAnalysis(arcface_model_path=full_model_path, warmup=warmup)
     end_time = time.perf_counter()
     print(f"Pipeline personalizado cargado exitosamente en {end_time - start_time:.2f} segundos.")
     return model
\ No newline at end of file
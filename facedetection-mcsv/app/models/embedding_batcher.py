@@ -0,0 +1,96 @@
+# Archivo: embedding_batcher.py
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class _PendingFaces:
+    def __init__(self, faces):
+        self.faces = faces          # (N, 112, 112, 3) uint8, caras alineadas de una petición
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class EmbeddingBatcher:
+    """
+    Planificador de inferencia: agrupa las caras alineadas de peticiones concurrentes
+    durante una ventana corta y las pasa por ArcFace en un único batch.
+
+    - Un hilo dedicado toma la primera petición de la cola y sigue recogiendo
+      hasta que vence la ventana, se alcanza `max_batch` caras, o ya enviaron
+      todas las peticiones que están en curso (`active_requests()`), de modo que
+      una petición aislada no espera la ventana completa.
+    - `embed_fn` recibe todas las caras concatenadas y devuelve (N, 512); el
+      resultado se reparte a cada petición, que espera bloqueada en `submit`.
+    """
+
+    def __init__(self, embed_fn, window_ms=10, max_batch=64, active_requests=None):
+        self.embed_fn = embed_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.active_requests = active_requests or (lambda: 0)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Los hilos no sobreviven a un fork (gunicorn --preload): se arranca en el proceso que lo usa
+        if self._thread is not None and self._thread_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or self._thread_pid != os.getpid():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def submit(self, faces):
+        """Encola las caras de una petición y bloquea hasta tener sus embeddings."""
+        self._ensure_started()
+        pending = _PendingFaces(faces)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        total = len(batch[0].faces)
+        deadline = time.perf_counter() + self.window
+        while total < self.max_batch and len(batch) < self.active_requests():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            total += len(pending.faces)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                if len(batch) == 1:
+                    embeddings = self.embed_fn(batch[0].faces)
+                else:
+                    embeddings = self.embed_fn(np.concatenate([p.faces for p in batch]))
+                offset = 0
+                for pending in batch:
+                    count = len(pending.faces)
+                    pending.result = embeddings[offset:offset + count]
+                    offset += count
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            finally:
+                for pending in batch:
+                    pending.done.set()
@@ -0,0 +1,92 @@
+# Archivo: face_quality.py
+import math
+
+import cv2
+import numpy as np
+
+from .. import config
+
+# ==========================================================
+# Filtro de calidad antes del embedding
+# ==========================================================
+# Medidas baratas a partir de la detección y de la cara alineada, para no pasar
+# por iresnet50 caras que nunca van a coincidir con la galería:
+#   eye_distance  distancia entre ojos en píxeles del frame original
+#   face_size     lado menor de la caja de detección
+#   yaw / pitch   giro estimado (grados) a partir de la posición de la nariz
+#                 respecto a los ojos y la boca, corrigiendo la inclinación (roll)
+#   blur          varianza del Laplaciano de la cara alineada 112x112 en gris
+# Cada umbral a 0 desactiva su comprobación.
+
+# En la plantilla de ArcFace la nariz está al 49.5 % del camino entre la línea de
+# los ojos y la de la boca; se usa como referencia frontal del pitch.
+FRONTAL_PITCH_RATIO = 0.495
+# Profundidad aproximada de la punta de la nariz respecto a la distancia entre ojos
+# (yaw) y a la distancia ojos-boca (pitch), para pasar desplazamientos a ángulos.
+NOSE_DEPTH_YAW = 0.5
+NOSE_DEPTH_PITCH = 0.43
+
+REJECTION_REASONS = ('small_face', 'pose', 'blur')
+
+
+def geometry(face_info):
+    """Distancia entre ojos, tamaño y yaw/pitch aproximados (grados) de una detección."""
+    landmarks = face_info['landmarks']
+    left_eye = np.asarray(landmarks['left_eye'], dtype=np.float64)
+    right_eye = np.asarray(landmarks['right_eye'], dtype=np.float64)
+    nose = np.asarray(landmarks['nose'], dtype=np.float64)
+    mouth = (np.asarray(landmarks['mouth_left'], dtype=np.float64) + np.asarray(landmarks['mouth_right'], dtype=np.float64)) / 2
+
+    x1, y1, x2, y2 = face_info['facial_area']
+    quality = {"eye_distance": float(np.linalg.norm(right_eye - left_eye)), "face_size": float(min(x2 - x1, y2 - y1))}
+    if quality["eye_distance"] < 1e-6:
+        return {**quality, "yaw": 90.0, "pitch": 90.0}
+
+    # Ejes de la cara: u a lo largo de los ojos, v perpendicular (hacia la boca)
+    u = (right_eye - left_eye) / quality["eye_distance"]
+    v = np.array([-u[1], u[0]])
+    eyes_center = (left_eye + right_eye) / 2
+    nose_offset = nose - eyes_center
+
+    yaw_ratio = float(np.dot(nose_offset, u)) / quality["eye_distance"]
+    mouth_depth = float(np.dot(mouth - eyes_center, v))
+    pitch_ratio = float(np.dot(nose_offset, v)) / mouth_depth if abs(mouth_depth) > 1e-6 else math.inf
+    quality["yaw"] = math.degrees(math.atan(abs(yaw_ratio) / NOSE_DEPTH_YAW))
+    quality["pitch"] = math.degrees(math.atan(abs(pitch_ratio - FRONTAL_PITCH_RATIO) / NOSE_DEPTH_PITCH))
+    return quality
+
+
+def blur_score(aligned_face):
+    """Varianza del Laplaciano (más alta = más nítida) de una cara alineada BGR."""
+    gray = cv2.cvtColor(aligned_face, cv2.COLOR_BGR2GRAY)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def geometric_rejection(quality):
+    """Motivo de rechazo por tamaño o pose, o None si la cara pasa."""
+    if quality["eye_distance"] < config.QUALITY_MIN_EYE_DISTANCE or quality["face_size"] < config.QUALITY_MIN_FACE_SIZE:
+        return 'small_face'
+    if (config.QUALITY_MAX_YAW > 0 and quality["yaw"] > config.QUALITY_MAX_YAW) or \
+            (config.QUALITY_MAX_PITCH > 0 and quality["pitch"] > config.QUALITY_MAX_PITCH):
+        return 'pose'
+    return None
+
+
+def assess(detections, aligned_faces):
+    """
+    Evalúa cada cara alineada. Devuelve (máscara de aceptadas (N,) bool, lista de dicts de
+    calidad, motivos de rechazo en el mismo orden, None si se aceptó).
+    """
+    qualities = []
+    reasons = []
+    for face_info, aligned_face in zip(detections, aligned_faces):
+        quality = geometry(face_info)
+        reason = geometric_rejection(quality)
+        if reason is None and config.QUALITY_MIN_BLUR > 0:
+            quality["blur"] = blur_score(aligned_face)
+            if quality["blur"] < config.QUALITY_MIN_BLUR:
+                reason = 'blur'
+        qualities.append(quality)
+        reasons.append(reason)
+    accepted = np.array([reason is None for reason in reasons], dtype=bool)
+    return accepted, qualities, reasons
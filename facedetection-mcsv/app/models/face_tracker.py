@@ -0,0 +1,171 @@
+# Archivo: face_tracker.py
+import threading
+import time
+
+import numpy as np
+
+from .. import config
+
+# ==========================================================
+# Seguimiento de caras entre frames de una misma cámara
+# ==========================================================
+# En una sesión de captura los estudiantes sentados aparecen casi en la misma posición
+# en cada frame. Cada detección se asocia a una pista (track) del frame anterior por IoU
+# de las cajas y, si no solapa lo suficiente, por distancia entre centros relativa al
+# tamaño de la cara. Una pista confirmada (TRACK_CONFIRM_HITS verificaciones seguidas
+# con la misma identidad) reutiliza su identidad sin alinear ni embeber la cara, salvo
+# cada TRACK_REVERIFY_FRAMES frames, en que se vuelve a verificar. Las pistas que no se
+# ven durante TRACK_MAX_MISSED frames se eliminan.
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU (A, B) entre cajas [x1, y1, x2, y2]."""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    xx1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    yy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    xx2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    yy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.maximum(0.0, xx2 - xx1) * np.maximum(0.0, yy2 - yy1)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+def center_shift_matrix(boxes_a, boxes_b):
+    """Distancia (A, B) entre centros dividida por el lado medio de la caja de A."""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    centers_a = (a[:, :2] + a[:, 2:]) / 2
+    centers_b = (b[:, :2] + b[:, 2:]) / 2
+    size_a = np.maximum(((a[:, 2] - a[:, 0]) + (a[:, 3] - a[:, 1])) / 2, 1.0)
+    return np.linalg.norm(centers_a[:, None, :] - centers_b[None, :, :], axis=2) / size_a[:, None]
+
+
+class Track:
+    def __init__(self, track_id, bbox, frame_index):
+        self.track_id = track_id
+        self.bbox = list(bbox)
+        self.identity = None       # None hasta la primera verificación con embedding
+        self.confidence = 0.0
+        self.hits = 0              # verificaciones seguidas con la misma identidad
+        self.last_seen = frame_index
+        self.last_verified = None
+        self.reported = False      # recorte guardado / desconocido enviado para esta identidad
+
+    @property
+    def confirmed(self):
+        return self.hits >= config.TRACK_CONFIRM_HITS
+
+    def due(self, frame_index):
+        """True si la cara de esta pista debe embeberse en este frame."""
+        return (
+            not self.confirmed
+            or self.last_verified is None
+            or frame_index - self.last_verified >= config.TRACK_REVERIFY_FRAMES
+        )
+
+    def verify(self, identity, confidence, frame_index):
+        """Registra el resultado de un embedding; devuelve True si la identidad cambió."""
+        changed = identity != self.identity
+        if changed:
+            self.identity = identity
+            self.hits = 1
+            self.reported = False
+        else:
+            self.hits += 1
+        self.confidence = confidence
+        self.last_verified = frame_index
+        return changed
+
+
+class FaceTracker:
+    """Pistas de una sesión de cámara. No es seguro entre hilos: se usa bajo `lock`."""
+
+    def __init__(self):
+        self.tracks = []
+        self.frame_index = 0
+        self.frame_shape = None
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        self._next_id = 1
+
+    def associate(self, detections, frame_shape):
+        """
+        Avanza un frame y asocia cada detección a una pista existente o nueva. Devuelve la
+        lista de pistas en el orden de `detections`. Asociación voraz: primero los pares
+        de mayor IoU por encima de TRACK_IOU_THRESHOLD y después, para lo que queda, los
+        de menor desplazamiento del centro por debajo de TRACK_MAX_CENTER_SHIFT.
+        """
+        self.frame_index += 1
+        self.last_used = time.monotonic()
+        if frame_shape[:2] != self.frame_shape:
+            # Otra resolución: las cajas anteriores no son comparables
+            self.tracks = []
+            self.frame_shape = frame_shape[:2]
+
+        assigned = [None] * len(detections)
+        if self.tracks and detections:
+            track_boxes = [track.bbox for track in self.tracks]
+            boxes = [d['facial_area'] for d in detections]
+            free_tracks = set(range(len(self.tracks)))
+            free_detections = set(range(len(detections)))
+
+            ious = iou_matrix(track_boxes, boxes)
+            for t, d in zip(*np.unravel_index(np.argsort(-ious, axis=None), ious.shape)):
+                if ious[t, d] < config.TRACK_IOU_THRESHOLD:
+                    break
+                if t in free_tracks and d in free_detections:
+                    assigned[d] = self.tracks[t]
+                    free_tracks.discard(t)
+                    free_detections.discard(d)
+
+            if free_tracks and free_detections:
+                shifts = center_shift_matrix(track_boxes, boxes)
+                for t, d in zip(*np.unravel_index(np.argsort(shifts, axis=None), shifts.shape)):
+                    if shifts[t, d] > config.TRACK_MAX_CENTER_SHIFT:
+                        break
+                    if t in free_tracks and d in free_detections:
+                        assigned[d] = self.tracks[t]
+                        free_tracks.discard(t)
+                        free_detections.discard(d)
+
+        for index, face_info in enumerate(detections):
+            if assigned[index] is None:
+                assigned[index] = Track(self._next_id, face_info['facial_area'], self.frame_index)
+                self._next_id += 1
+                self.tracks.append(assigned[index])
+            else:
+                assigned[index].bbox = list(face_info['facial_area'])
+                assigned[index].last_seen = self.frame_index
+
+        self.tracks = [
+            track for track in self.tracks
+            if self.frame_index - track.last_seen <= config.TRACK_MAX_MISSED
+        ]
+        return assigned
+
+
+class TrackingSessions:
+    """Un FaceTracker por cámara (camera_id), descartado tras TRACK_SESSION_TTL segundos sin frames."""
+
+    def __init__(self):
+        self._trackers = {}
+        self._lock = threading.Lock()
+
+    def get(self, camera_id, schedule_id):
+        now = time.monotonic()
+        with self._lock:
+            for key in [k for k, t in self._trackers.items() if now - t.last_used > config.TRACK_SESSION_TTL]:
+                del self._trackers[key]
+            key = (camera_id, schedule_id)  # otro horario es otra galería: pistas nuevas
+            tracker = self._trackers.get(key)
+            if tracker is None:
+                tracker = self._trackers[key] = FaceTracker()
+            tracker.last_used = now
+            return tracker
+
+    def __len__(self):
+        with self._lock:
+            return len(self._trackers)
@@ -1,15 +1,36 @@
-from flask import Blueprint, request, jsonify, current_app
-from ..services.embedding_service import generate_student_embedding, assign_student_to_course, get_student_embedding_from_csv
-import cv2
-import numpy as np
+from flask import Blueprint, request, jsonify, current_app, Response
+from ..services.embedding_service import generate_student_embedding, assign_student_to_course, get_student_embedding_from_csv, detect_faces_cached
+from ..services.embedding_codec import encode_embedding, requested_embedding_format, RAW_MIMETYPE, EMBEDDING_FORMATS
 from .. import config
+from ..services.readiness import model_required
 
 processing_bp = Blueprint('processing_bp', __name__)
 
+
+def _embedding_response(embedding, fmt, **fields):
+    """
+    Respuesta con el embedding en el formato negociado: JSON (lista o base64)
+    o cuerpo binario float32 si se pidió 'raw'.
+    """
+    if fmt == 'raw':
+        body = encode_embedding(embedding, 'raw')
+        response = Response(body, status=200, mimetype=RAW_MIMETYPE)
+        response.headers['X-Embedding-Dtype'] = 'float32'
+        response.headers['X-Embedding-Dim'] = str(len(body) // 4)
+        return response
+
+    return jsonify({
+        "status": "success",
+        **fields,
+        "embedding_format": fmt,
+        "embedding": encode_embedding(embedding, fmt)
+    }), 200
+
 # ==========================================================
 # Endpoint 1: Generar embedding promedio del estudiante
 # ==========================================================
 @processing_bp.route('/generate-embedding', methods=['POST'])
+@model_required
 def generate_embedding_endpoint():
     face_model = current_app.face_model
 
@@ -22,17 +43,19 @@ def generate_embedding_endpoint():
     if not images:
         return jsonify({"error": "No images provided in the 'images' field."}), 400
 
-    success = generate_student_embedding(images, student_id, face_model)
+    success, report = generate_student_embedding(images, student_id, face_model)
 
     if success:
         return jsonify({
             "status": "success",
-            "message": f"Embedding for student '{student_id}' saved/updated successfully."
+            "message": f"Embedding for student '{student_id}' saved/updated successfully.",
+            **report
         }), 200
     else:
         return jsonify({
             "status": "error",
-            "message": "Could not extract any high-quality embeddings from the provided images."
+            "message": "Could not extract any high-quality embeddings from the provided images.",
+            **report
         }), 400
 
 # ==========================================================
@@ -70,25 +93,25 @@ def assign_to_course_endpoint():
 # Endpoint 3: Extraer embedding (Helper para otros servicios)
 # ==========================================================
 @processing_bp.route('/extract-embedding', methods=['POST'])
+@model_required
 def extract_embedding_endpoint():
     """
-    Recibe una imagen y devuelve su embedding (vector) en formato JSON.
-    No guarda nada en disco ni base de datos.
+    Recibe una imagen y devuelve su embedding (vector).
+    Formato negociable con 'embedding_format' (json | b64f32 | b64f16 | raw)
+    o 'Accept: application/octet-stream'. No guarda nada en disco ni base de datos.
     """
     face_model = current_app.face_model
+    fmt = requested_embedding_format()
+    if fmt is None:
+        return jsonify({"error": f"'embedding_format' must be one of {list(EMBEDDING_FORMATS)}."}), 400
 
     if 'image' not in request.files:
         return jsonify({"error": "No image provided."}), 400
 
-    file = request.files['image']
-    np_img = np.frombuffer(file.read(), np.uint8)
-    frame = cv2.imdecode(np_img, cv2.IMREAD_COLOR)
-
-    if frame is None:
+    faces = detect_faces_cached(request.files['image'].read(), face_model)
+    if faces is None:
         return jsonify({"error": "Could not decode image."}), 400
 
-    faces = face_model.get(frame)
-    
     # Buscar la cara con mejor score y tamaño
     if not faces:
         return jsonify({"error": "No face detected."}), 400
@@ -98,13 +121,7 @@ def extract_embedding_endpoint():
     if best_face.det_score < config.DETECTION_THRESHOLD:
         return jsonify({"error": "Face detection score too low."}), 400
 
-    # Convertir ndarray a lista para JSON
-    embedding_list = best_face.embedding.tolist()
-
-    return jsonify({
-        "status": "success",
-        "embedding": embedding_list
-    }), 200
+    return _embedding_response(best_face.embedding, fmt)
 
 # ==========================================================
 # Endpoint 4: Obtener embedding guardado de un estudiante
@@ -112,9 +129,13 @@ def extract_embedding_endpoint():
 @processing_bp.route('/student-embedding/<student_id>', methods=['GET'])
 def get_student_embedding_endpoint(student_id):
     """
-    Devuelve el embedding guardado en students.csv para el student_id dado.
-    Si no existe, responde 404.
+    Devuelve el embedding guardado en students.csv para el student_id dado,
+    en el formato negociado (ver /extract-embedding). Si no existe, responde 404.
     """
+    fmt = requested_embedding_format()
+    if fmt is None:
+        return jsonify({"error": f"'embedding_format' must be one of {list(EMBEDDING_FORMATS)}."}), 400
+
     embedding = get_student_embedding_from_csv(student_id)
     if embedding is None:
         return jsonify({
@@ -122,8 +143,4 @@ def get_student_embedding_endpoint(student_id):
             "message": f"Embedding not found for student_id '{student_id}'."
         }), 404
 
-    return jsonify({
-        "status": "success",
-        "student_id": student_id,
-        "embedding": embedding.tolist()  # JSON serializable
-    }), 200
+    return _embedding_response(embedding, fmt, student_id=student_id)
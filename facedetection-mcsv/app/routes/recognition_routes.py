@@ -1,60 +1,251 @@
 from flask import Blueprint, request, jsonify, current_app
-from ..services.recognition_service import recognize_faces_in_frame_2, capture_and_recognize_faces, benchmark_recognition_engine
-import cv2
+from ..services.recognition_service import recognize_faces_in_frame_2, recognize_faces_in_frames, recognize_faces_tracked, tracking_sessions, capture_and_recognize_faces, benchmark_recognition_engine
+import re
 import sqlite3
 import numpy as np
 import threading
 from .. import config
 from app.services import database_service
+from ..services.admission import admission_controlled, deadline_exceeded
+from ..services.image_decode import decode_frame
+from ..services.schedule_cache import schedule_cache
+from ..services.stream_ingest import StreamBusy, stream_manager
+from ..services.profiling import profiled, annotate
+from ..services.readiness import model_required
+from ..services.tokens import token_required
+from ..models.custom_face_model import DETECTION_MODES
 recognition_bp = Blueprint('recognition_bp', __name__)
 
+
+def _stale_frame_response():
+    print("[WARN] Frame descartado: venció el plazo del cliente antes de la inferencia.")
+    response = jsonify({"error": "Request deadline exceeded before inference."})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+def _detection_options(values=None):
+    """
+    Opciones de detección enviadas por el cliente ('detection_mode', 'min_face_px' por
+    cámara, 'max_side') en el formulario o en `values` (JSON); lo que no se envía toma
+    el valor de config. Lanza ValueError si algún valor no es válido.
+    """
+    values = request.form if values is None else values
+    options = {}
+    if values.get('detection_mode'):
+        if values['detection_mode'] not in DETECTION_MODES:
+            raise ValueError
+        options['detection_mode'] = values['detection_mode']
+    if values.get('min_face_px'):
+        options['min_face_px'] = float(values['min_face_px'])
+    if values.get('max_side'):
+        options['max_side'] = int(values['max_side'])
+    return options
+
+
+def _invalid_detection_options_response():
+    return jsonify({
+        "error": f"'detection_mode' must be one of {list(DETECTION_MODES)}; 'min_face_px' and 'max_side' must be numeric."
+    }), 400
+
+
+def _schedule_gallery(schedule_id):
+    """
+    (known_matrix, known_labels, respuesta de error o None) del curso del horario; sin
+    schedule_id, la galería global de la app (si no hay, todas las caras serán 'Unknown').
+    """
+    if not schedule_id:
+        return getattr(current_app, 'known_matrix', None), getattr(current_app, 'known_labels', None), None
+    try:
+        course_id = schedule_cache.course_for(schedule_id)
+    except sqlite3.Error as e:
+        print(f"[ERROR] Error de base de datos: {e}")
+        return None, None, (jsonify({"error": "Fallo al consultar la base de datos."}), 500)
+    if course_id is None:
+        print(f"[ERROR] schedule_id '{schedule_id}' no encontrado en la base de datos.")
+        return None, None, (jsonify({"error": f"Invalid schedule_id: {schedule_id}"}), 404)
+    known_matrix, known_labels = database_service.get_course_gallery(course_id)
+    if not known_labels:
+        return None, None, (jsonify({"error": f"No known faces found for course_id: {course_id}"}), 404)
+    return known_matrix, known_labels, None
+
+
 @recognition_bp.route('/process_frame', methods=['POST'])
+@model_required
+@admission_controlled()
+@profiled
 def process_frame():
     schedule_id = request.form.get('schedule_id')
     if 'image' not in request.files:
         return jsonify({"error": "Image file not found in the request."}), 400
     file = request.files['image']
     face_model = current_app.face_model
-    known_matrix = None
-    known_labels = None
-    if schedule_id:
-        conn = None
-        course_id = None
-        try:
-            conn = sqlite3.connect(config.DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("SELECT course_id FROM schedules WHERE id = ?", (schedule_id,))
-            result = cursor.fetchone()
-            if result is None:
-                print(f"[ERROR] schedule_id '{schedule_id}' no encontrado en la base de datos.")
-                return jsonify({"error": f"Invalid schedule_id: {schedule_id}"}), 404
-            course_id = result[0]
-            print(f"[INFO] schedule_id '{schedule_id}' corresponde al course_id '{course_id}'.")
-        except sqlite3.Error as e:
-            print(f"[ERROR] Error de base de datos: {e}")
-            return jsonify({"error": "Fallo al consultar la base de datos."}), 500
-        finally:
-            if conn:
-                conn.close()
-        course_db = database_service.load_known_faces_from_csv(course_id)
-        if not course_db:
-            return jsonify({"error": f"No known faces found for course_id: {course_id}"}), 404
-        course_matrix, course_labels = database_service.prepare_vectorized_db(course_db)
-        known_labels = course_labels
-        known_matrix = course_matrix
-    else:
-        known_matrix = current_app.known_matrix
-        known_labels = current_app.known_labels
-
-    np_img = np.frombuffer(file.read(), np.uint8)
-    frame = cv2.imdecode(np_img, cv2.IMREAD_COLOR)
+    try:
+        detection_options = _detection_options()
+    except ValueError:
+        return _invalid_detection_options_response()
+    known_matrix, known_labels, error = _schedule_gallery(schedule_id)
+    if error is not None:
+        return error
+
+    image_bytes = file.read()
+    frame = decode_frame(image_bytes)
 
     if frame is None:
         return jsonify({"error": "Could not decode image."}), 400
-    results = recognize_faces_in_frame_2(frame, face_model, known_matrix, known_labels, schedule_id)
+    if deadline_exceeded():
+        return _stale_frame_response()
+    annotate(frame_shape=list(frame.shape), image_bytes=len(image_bytes), gallery_size=len(known_labels or []), detection=detection_options)
+    # Con 'camera_id' los frames de la misma cámara comparten pistas entre peticiones
+    camera_id = request.form.get('camera_id')
+    if camera_id and config.TRACKING_ENABLED:
+        tracker = tracking_sessions.get(camera_id, schedule_id)
+        results, tracking = recognize_faces_tracked(frame, face_model, known_matrix, known_labels, tracker, schedule_id, detection_options)
+        annotate(recognized_faces=len(results), tracking=tracking)
+        return jsonify({"recognized_faces": results, "tracking": tracking})
+    results = recognize_faces_in_frame_2(frame, face_model, known_matrix, known_labels, schedule_id, detection_options)
+    annotate(recognized_faces=len(results))
     return jsonify({"recognized_faces": results})
 
 
+@recognition_bp.route('/process_frames', methods=['POST'])
+@model_required
+@admission_controlled(cost=lambda: len(request.files.getlist('images')))
+@profiled
+def process_frames():
+    """
+    Varios frames de una ráfaga (campo 'images' repetido, hasta FRAME_BATCH_MAX_FRAMES) del
+    mismo 'schedule_id'. Devuelve el resultado de cada frame y, por identidad, la mejor
+    confianza, el número de avistamientos y los frames en que aparece.
+    """
+    schedule_id = request.form.get('schedule_id')
+    files = request.files.getlist('images')
+    if not files:
+        return jsonify({"error": "At least one file in field 'images' is required."}), 400
+    if len(files) > config.FRAME_BATCH_MAX_FRAMES:
+        return jsonify({"error": f"At most {config.FRAME_BATCH_MAX_FRAMES} frames per request."}), 400
+    try:
+        detection_options = _detection_options()
+    except ValueError:
+        return _invalid_detection_options_response()
+    known_matrix, known_labels, error = _schedule_gallery(schedule_id)
+    if error is not None:
+        return error
+
+    images = [file.read() for file in files]
+    if deadline_exceeded():
+        return _stale_frame_response()
+    annotate(frames=len(images), image_bytes=sum(len(b) for b in images), gallery_size=len(known_labels or []), detection=detection_options)
+    frames, identities, unknown = recognize_faces_in_frames(
+        images, current_app.face_model, known_matrix, known_labels, schedule_id, detection_options
+    )
+    annotate(recognized_identities=len(identities), unknown_groups=len(unknown))
+    return jsonify({"frames": frames, "identities": identities, "unknown_faces": unknown})
+
+
+# ==========================================================
+# Endpoints: Ingesta de streams de cámara (STREAM_INGEST_ENABLED=1)
+# ==========================================================
+CAMERA_ID_RE = re.compile(r'[A-Za-z0-9_.-]{1,64}')
+
+
+def _streams_disabled_response():
+    return jsonify({"error": "Stream ingestion is disabled (set STREAM_INGEST_ENABLED=1)."}), 404
+
+
+@recognition_bp.route('/streams', methods=['POST'])
+@model_required
+def start_stream():
+    """
+    Arranca un worker que lee una cámara y reconoce los frames muestreados:
+    {"camera_id", "source", "schedule_id", "sample_fps"?, "duration"? (segundos),
+     "loop"? (solo vídeos), "detection_mode"?, "min_face_px"?, "max_side"?}.
+    """
+    if not config.STREAM_INGEST_ENABLED:
+        return _streams_disabled_response()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "JSON body is required."}), 400
+    camera_id = str(data.get('camera_id') or '')
+    schedule_id = data.get('schedule_id')
+    if not CAMERA_ID_RE.fullmatch(camera_id) or not schedule_id:
+        return jsonify({"error": "Fields 'camera_id' (letters, digits, '_', '-', '.') and 'schedule_id' are required."}), 400
+    try:
+        detection_options = _detection_options(data)
+        sample_fps = float(data['sample_fps']) if data.get('sample_fps') else None
+        duration = float(data['duration']) if data.get('duration') else None
+        if (sample_fps is not None and sample_fps <= 0) or (duration is not None and duration <= 0):
+            raise ValueError
+    except (ValueError, TypeError):
+        return jsonify({"error": "'sample_fps' and 'duration' must be positive numbers; "
+                                 f"'detection_mode' one of {list(DETECTION_MODES)}."}), 400
+    _, _, error = _schedule_gallery(schedule_id)
+    if error is not None:
+        return error
+
+    try:
+        worker = stream_manager.start(
+            camera_id,
+            source=data.get('source'),
+            schedule_id=schedule_id,
+            face_model=current_app.face_model,
+            sample_fps=sample_fps,
+            duration=duration,
+            detection_options=detection_options,
+            loop=bool(data.get('loop')),
+        )
+    except StreamBusy as e:
+        return jsonify({"error": str(e)}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(worker.snapshot()), 201
+
+
+@recognition_bp.route('/streams', methods=['GET'])
+def list_streams():
+    """Workers de stream de este proceso con su estado y contadores de frames."""
+    if not config.STREAM_INGEST_ENABLED:
+        return _streams_disabled_response()
+    return jsonify({"streams": stream_manager.list()}), 200
+
+
+@recognition_bp.route('/streams/<camera_id>', methods=['DELETE'])
+def stop_stream(camera_id):
+    """Detiene el worker de la cámara y devuelve su estado final."""
+    if not config.STREAM_INGEST_ENABLED:
+        return _streams_disabled_response()
+    worker = stream_manager.stop(camera_id)
+    if worker is None:
+        return jsonify({"error": f"Camera '{camera_id}' is not streaming."}), 404
+    return jsonify(worker.snapshot()), 200
+
+
+@recognition_bp.route('/schedules/sync', methods=['POST'])
+@token_required('X-Sync-Token', 'SCHEDULE_SYNC_TOKEN')
+def sync_schedules():
+    """
+    Cambios de horarios empujados por attendance-mcsv para la caché schedule_id -> course_id:
+    {"schedules": [{"id": ..., "course_id": ...}], "deleted": [ids], "invalidate": false}.
+    Con "invalidate" la tabla se recarga completa en el siguiente frame. Requiere la
+    cabecera X-Sync-Token (SCHEDULE_SYNC_TOKEN). No pasa por el control de preparación:
+    los avisos no se reintentan y deben aceptarse también durante el calentamiento.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "JSON body is required."}), 400
+    try:
+        schedules = [(str(item['id']), str(item['course_id'])) for item in data.get('schedules') or []]
+        deleted = [str(schedule_id) for schedule_id in data.get('deleted') or []]
+    except (KeyError, TypeError):
+        return jsonify({"error": "'schedules' must be a list of {id, course_id}; 'deleted' a list of ids."}), 400
+
+    schedule_cache.update(schedules, deleted)
+    if data.get('invalidate'):
+        schedule_cache.invalidate()
+    return jsonify({"status": "ok", "updated": len(schedules), "deleted": len(deleted), **schedule_cache.stats()}), 200
+
+
 @recognition_bp.route('/start_attendance_capture', methods=['POST'])
 def start_attendance_capture():
     data = request.get_json()
@@ -80,6 +271,9 @@ def start_attendance_capture():
     }), 200
     
 @recognition_bp.route('/benchmark/process', methods=['POST'])
+@model_required
+@admission_controlled()
+@profiled
 def benchmark_process():
     course_id = request.form.get('course_id')
     if not course_id:
@@ -90,19 +284,25 @@ def benchmark_process():
     file = request.files['image']
     face_model = current_app.face_model
     try:
-        course_db = database_service.load_known_faces_from_csv(course_id)
-        if not course_db:
+        detection_options = _detection_options()
+    except ValueError:
+        return _invalid_detection_options_response()
+    try:
+        known_matrix, known_labels = database_service.get_course_gallery(course_id)
+        if not known_labels:
              known_matrix = np.empty((0, 512))
              known_labels = []
-        else:
-            known_matrix, known_labels = database_service.prepare_vectorized_db(course_db)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    np_img = np.frombuffer(file.read(), np.uint8)
-    frame = cv2.imdecode(np_img, cv2.IMREAD_COLOR)
+    image_bytes = file.read()
+    frame = decode_frame(image_bytes)
     if frame is None:
         return jsonify({"error": "Invalid image"}), 400
-    results, pipeline_time, matching_time = benchmark_recognition_engine(frame, face_model, known_matrix, known_labels)
+    if deadline_exceeded():
+        return _stale_frame_response()
+    annotate(frame_shape=list(frame.shape), image_bytes=len(image_bytes), gallery_size=len(known_labels), detection=detection_options)
+    results, pipeline_time, matching_time = benchmark_recognition_engine(frame, face_model, known_matrix, known_labels, detection_options)
+    annotate(face_count=len(results), pipeline_time=pipeline_time, matching_time=matching_time)
     total_time = pipeline_time + matching_time
     return jsonify({
         "total_inference_time": total_time,
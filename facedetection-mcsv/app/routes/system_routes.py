@@ -0,0 +1,90 @@
+from flask import Blueprint, jsonify, Response, request, send_file
+from ..services.http_client import get_all_stats
+from ..services.admission import recognition_admission
+from ..services.metrics import render_metrics
+from ..services import profiling
+from ..services.tokens import token_required
+from ..services.readiness import readiness
+
+system_bp = Blueprint('system_bp', __name__)
+
+# ==========================================================
+# Endpoint: Preparación del servicio (para balanceadores y rolling restarts)
+# ==========================================================
+@system_bp.route('/ready', methods=['GET'])
+def ready_endpoint():
+    """
+    Estado de cada componente (arcface, retinaface): pending/loading/ready/failed,
+    segundos de carga y origen de los pesos. 200 si todo está listo, 503 si no.
+    """
+    snapshot = readiness.snapshot()
+    return jsonify(snapshot), 200 if snapshot["ready"] else 503
+
+
+# ==========================================================
+# Endpoint: Latencias de las llamadas a otros servicios
+# ==========================================================
+@system_bp.route('/http-stats', methods=['GET'])
+def http_stats_endpoint():
+    """
+    Devuelve, por servicio destino, el número de peticiones, errores y latencias
+    acumuladas de los clientes HTTP compartidos de este proceso.
+    """
+    return jsonify(get_all_stats()), 200
+
+
+# ==========================================================
+# Endpoint: Estado del control de admisión
+# ==========================================================
+@system_bp.route('/admission-stats', methods=['GET'])
+def admission_stats_endpoint():
+    """
+    Profundidad de cola, frames en curso, rechazos (cola llena, espera agotada,
+    plazo vencido) y tiempos de espera en cola de este proceso.
+    """
+    return jsonify({recognition_admission.name: recognition_admission.stats()}), 200
+
+
+# ==========================================================
+# Endpoint: Métricas en formato Prometheus
+# ==========================================================
+@system_bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Histogramas de latencia por etapa (decode, detection, alignment, embedding,
+    matching, crop_write, unknown_notify), caras por frame, caras rechazadas,
+    aciertos de las cachés de galerías y horarios, control de admisión y clientes HTTP.
+    """
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+# ==========================================================
+# Endpoints: Perfiles de peticiones (cabecera X-Profile o muestreo)
+# ==========================================================
+@system_bp.route('/profiles', methods=['GET'])
+@token_required(profiling.PROFILE_HEADER, 'PROFILE_TOKEN')
+def list_profiles_endpoint():
+    """Perfiles guardados más recientes (metadatos sin el resumen de funciones)."""
+    limit = request.args.get('limit', default=50, type=int)
+    return jsonify({"profiles": profiling.list_profiles(limit)}), 200
+
+
+@system_bp.route('/profiles/<profile_id>', methods=['GET'])
+@token_required(profiling.PROFILE_HEADER, 'PROFILE_TOKEN')
+def get_profile_endpoint(profile_id):
+    """Metadatos de un perfil, incluidas las funciones con más tiempo acumulado."""
+    metadata = profiling.get_profile(profile_id)
+    if metadata is None:
+        return jsonify({"error": "Profile not found."}), 404
+    return jsonify(metadata), 200
+
+
+@system_bp.route('/profiles/<profile_id>/download', methods=['GET'])
+@token_required(profiling.PROFILE_HEADER, 'PROFILE_TOKEN')
+def download_profile_endpoint(profile_id):
+    """Archivo .prof de cProfile (abrir con pstats o snakeviz)."""
+    path = profiling.profile_path(profile_id)
+    if path is None:
+        return jsonify({"error": "Profile not found."}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f"{profile_id}.prof")
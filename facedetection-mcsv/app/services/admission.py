@@ -0,0 +1,180 @@
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import g, jsonify, request
+
+from .. import config
+from .metrics import QUEUE_WAIT
+
+# ==========================================================
+# Control de admisión para los endpoints de reconocimiento
+# ==========================================================
+# Cada proceso limita cuántos frames se procesan a la vez (max_concurrent) y
+# cuántos pueden esperar turno (max_queue). Con la cola llena se responde 429 al
+# instante; si un frame espera más que queue_timeout o que su propio plazo
+# (cabecera X-Request-Timeout, en segundos) se descarta con 503 antes de la
+# inferencia. Ambas respuestas llevan Retry-After. Una petición con varios frames
+# (/process_frames) ocupa un hueco por frame (`cost`, como mucho max_concurrent).
+
+DEADLINE_HEADER = 'X-Request-Timeout'
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._queued = 0
+
+        self._admitted = 0
+        self._rejected_full = 0
+        self._rejected_timeout = 0
+        self._expired = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._service_total = 0.0
+        self._completed = 0
+
+    def retry_after(self):
+        """Estimación (segundos enteros) de cuándo habrá hueco: cola / concurrencia x tiempo medio."""
+        avg_service = self._service_total / self._completed if self._completed else 1.0
+        waves = (self._queued + 1) / self.max_concurrent
+        return max(1, math.ceil(avg_service * waves))
+
+    def acquire(self, deadline=None, cost=1):
+        """
+        Reserva `cost` huecos de procesamiento. Devuelve los segundos esperados en cola;
+        lanza AdmissionRejected si la cola está llena o el plazo vence esperando.
+        """
+        cost = min(max(1, cost), self.max_concurrent)
+        start = time.monotonic()
+        with self._cond:
+            if self._in_flight + cost > self.max_concurrent and self._queued >= self.max_queue:
+                self._rejected_full += 1
+                raise AdmissionRejected(429, "queue full", self.retry_after())
+
+            limit = start + self.queue_timeout
+            if deadline is not None:
+                limit = min(limit, deadline)
+
+            self._queued += 1
+            try:
+                while self._in_flight + cost > self.max_concurrent:
+                    remaining = limit - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        if self._in_flight + cost > self.max_concurrent:
+                            self._rejected_timeout += 1
+                            raise AdmissionRejected(503, "timed out waiting in queue", self.retry_after())
+            finally:
+                self._queued -= 1
+
+            # El cliente ya habrá abandonado: no gastar inferencia en un frame obsoleto
+            if deadline is not None and time.monotonic() >= deadline:
+                self._expired += 1
+                # Este hilo pudo ser el despertado por release(): cede el hueco al siguiente
+                self._cond.notify()
+                raise AdmissionRejected(503, "request deadline exceeded", self.retry_after())
+
+            waited = time.monotonic() - start
+            self._in_flight += cost
+            self._admitted += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        QUEUE_WAIT.observe(waited)
+        return waited
+
+    def release(self, service_seconds, cost=1):
+        """Libera los huecos reservados con acquire() (el mismo `cost`)."""
+        with self._cond:
+            self._in_flight -= min(max(1, cost), self.max_concurrent)
+            self._completed += 1
+            self._service_total += service_seconds
+            # Con costes distintos, los huecos liberados pueden bastar a varios o solo a uno concreto
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queue_depth": self._queued,
+                "admitted": self._admitted,
+                "rejected_queue_full": self._rejected_full,
+                "rejected_queue_timeout": self._rejected_timeout,
+                "expired_deadline": self._expired,
+                "wait_seconds_total": self._wait_total,
+                "wait_seconds_avg": self._wait_total / self._admitted if self._admitted else 0.0,
+                "wait_seconds_max": self._wait_max,
+                "service_seconds_avg": self._service_total / self._completed if self._completed else 0.0,
+            }
+
+
+# Un único controlador por proceso para todos los endpoints que ejecutan el modelo
+recognition_admission = AdmissionController(
+    'recognition',
+    max_concurrent=config.ADMISSION_MAX_CONCURRENT,
+    max_queue=config.ADMISSION_MAX_QUEUE,
+    queue_timeout=config.ADMISSION_QUEUE_TIMEOUT,
+)
+
+
+def request_deadline():
+    """Plazo absoluto (reloj monotónico) a partir de la cabecera X-Request-Timeout, o None."""
+    value = request.headers.get(DEADLINE_HEADER)
+    if not value:
+        return None
+    try:
+        budget = float(value)
+    except ValueError:
+        return None
+    return time.monotonic() + budget if budget > 0 else None
+
+
+def deadline_exceeded():
+    deadline = g.get('request_deadline')
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def admission_controlled(controller=recognition_admission, cost=None):
+    """
+    Decorador de ruta: aplica el control de admisión antes de ejecutar la vista.
+    `cost` (opcional) es una función sin argumentos que devuelve los huecos que
+    ocupa la petición actual; por defecto uno.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            deadline = request_deadline()
+            slots = cost() if cost is not None else 1
+            try:
+                g.queue_wait = controller.acquire(deadline, slots)
+            except AdmissionRejected as e:
+                print(f"[WARN] {controller.name}: petición rechazada ({e.status}, {e.reason}).")
+                response = jsonify({"error": f"Server busy: {e.reason}", "retry_after": e.retry_after})
+                response.status_code = e.status
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response
+
+            g.request_deadline = deadline
+            start = time.monotonic()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                controller.release(time.monotonic() - start, slots)
+        return wrapper
+    return decorator
@@ -1,8 +1,10 @@
 import sqlite3
 import os
+import threading
 import numpy as np
 import pandas as pd
 from .. import config
+from .metrics import GALLERY_CACHE
 
 def load_known_faces_from_csv(course_name):
     """
@@ -63,4 +65,40 @@ def prepare_vectorized_db(known_face_db):
     norms = np.linalg.norm(matrix, axis=1, keepdims=True)
     matrix = matrix / norms
 
-    return matrix, labels
\ No newline at end of file
+    return matrix, labels
+
+# ==========================================================
+# Caché de galerías por curso
+# ==========================================================
+# Cada frame de /process_frame necesitaba releer el CSV del curso con pandas y
+# normalizar la matriz. Se guarda (matriz, etiquetas) por curso junto con el
+# mtime y el tamaño del CSV: si el archivo cambia (nuevo estudiante, embedding
+# regenerado) la siguiente consulta lo recarga.
+
+_gallery_cache = {}
+_gallery_lock = threading.Lock()
+
+
+def get_course_gallery(course_name):
+    """
+    Devuelve (known_matrix, known_labels) del curso, o (None, None) si no hay
+    embeddings. Equivale a prepare_vectorized_db(load_known_faces_from_csv(...)).
+    """
+    csv_path = os.path.join(config.CSV_OUTPUT_DIR, f"{course_name}.csv")
+    try:
+        stat = os.stat(csv_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        signature = None
+
+    with _gallery_lock:
+        cached = _gallery_cache.get(course_name)
+    if cached is not None and cached[0] == signature:
+        GALLERY_CACHE.inc(result='hit')
+        return cached[1], cached[2]
+
+    GALLERY_CACHE.inc(result='miss')
+    known_matrix, known_labels = prepare_vectorized_db(load_known_faces_from_csv(course_name))
+    with _gallery_lock:
+        _gallery_cache[course_name] = (signature, known_matrix, known_labels)
+    return known_matrix, known_labels
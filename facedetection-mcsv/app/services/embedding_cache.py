@@ -0,0 +1,225 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .. import config
+from .metrics import EMBEDDING_CACHE
+
+# ==========================================================
+# Caché de caras por contenido de la imagen
+# ==========================================================
+# Clave: sha256(huella del modelo + bytes de la imagen). Una misma foto subida otra
+# vez (búsquedas de /unknown-faces/match, insert-db/test-db repetidos) devuelve las
+# caras y embeddings guardados sin decodificar ni pasar por RetinaFace/ArcFace.
+#   - Memoria: LRU limitada a EMBEDDING_CACHE_MAX_MB, por proceso.
+#   - Disco (si EMBEDDING_CACHE_DIR está definido): un .npz por imagen, compartido
+#     entre workers; se purgan los menos usados por encima de EMBEDDING_CACHE_DISK_MAX_MB.
+#     Cada proceso lleva la cuenta aproximada de bytes (último recorrido del directorio
+#     más lo que ha escrito desde entonces) y solo vuelve a recorrerlo cuando esa cuenta
+#     supera el límite o cuando ha escrito un 10 % del límite: con varios workers el
+#     límite se rebasa, como mucho, en ese 10 % por worker.
+# Se guarda también el resultado "sin caras", que es igual de caro de obtener.
+
+LANDMARK_NAMES = ('left_eye', 'right_eye', 'nose', 'mouth_left', 'mouth_right')
+ENTRY_OVERHEAD_BYTES = 1024  # diccionarios de landmarks, objetos CustomFace, clave...
+
+
+def image_key(image_bytes, fingerprint):
+    digest = hashlib.sha256(fingerprint.encode())
+    digest.update(b'\0')
+    digest.update(image_bytes)
+    return digest.hexdigest()
+
+
+def _entry_bytes(faces):
+    return ENTRY_OVERHEAD_BYTES + sum(np.asarray(face.embedding).nbytes + 256 for face in faces)
+
+
+def _detached(faces):
+    """
+    Copias de las caras con su propio embedding. Los embeddings del modelo son vistas del
+    batch completo (micro-batching o matrícula): guardarlas en la LRU retendría el array
+    entero mientras _entry_bytes solo cuenta una fila por cara.
+    """
+    from ..models.custom_face_model import CustomFace
+
+    return [
+        CustomFace(
+            det_score=face.det_score,
+            embedding=np.array(face.embedding, dtype=np.float32, copy=True),
+            bbox=face.bbox,
+            landmarks=face.landmarks,
+            quality=face.quality,
+        )
+        for face in faces
+    ]
+
+
+def _serialize(faces, path):
+    from ..models.custom_face_model import EMBEDDING_SIZE
+
+    count = len(faces)
+    # Nombre único por proceso e hilo: dos hilos pueden guardar la misma imagen a la vez
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                embeddings=np.array([face.embedding for face in faces], dtype=np.float32).reshape(count, EMBEDDING_SIZE),
+                det_scores=np.array([face.det_score for face in faces], dtype=np.float32),
+                bboxes=np.array([face.bbox for face in faces], dtype=np.int64).reshape(count, 4),
+                landmarks=np.array([[face.landmarks[name] for name in LANDMARK_NAMES] for face in faces],
+                                   dtype=np.float32).reshape(count, 5, 2),
+                quality=np.array(json.dumps([face.quality for face in faces])),
+            )
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _deserialize(path):
+    from ..models.custom_face_model import CustomFace
+
+    with np.load(path, allow_pickle=False) as data:
+        qualities = json.loads(str(data['quality']))
+        return [
+            CustomFace(
+                det_score=float(score),
+                embedding=embedding,
+                bbox=[int(v) for v in bbox],
+                landmarks={name: [float(x), float(y)] for name, (x, y) in zip(LANDMARK_NAMES, points)},
+                quality=quality,
+            )
+            for score, embedding, bbox, points, quality in zip(
+                data['det_scores'], data['embeddings'], data['bboxes'], data['landmarks'], qualities
+            )
+        ]
+
+
+class EmbeddingCache:
+    def __init__(self, max_bytes, disk_dir=None, disk_max_bytes=0):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()  # clave -> (caras, bytes)
+        self._bytes = 0
+        self._disk_bytes = None  # bytes en disco según este proceso; None hasta el primer recorrido
+        self._disk_written = 0   # bytes escritos por este proceso desde el último recorrido
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.npz")
+
+    def get(self, key):
+        """Caras guardadas para la clave, o None si no está en ningún nivel."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                EMBEDDING_CACHE.inc(result='memory_hit')
+                return entry[0]
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                faces = _deserialize(path)
+                os.utime(path)  # orden LRU de la purga del disco
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[WARN] Entrada de caché de embeddings ilegible ({path}): {e}")
+            else:
+                self._remember(key, faces)
+                EMBEDDING_CACHE.inc(result='disk_hit')
+                return faces
+
+        EMBEDDING_CACHE.inc(result='miss')
+        return None
+
+    def put(self, key, faces):
+        if not self.enabled:
+            return
+        self._remember(key, faces)
+        if self.disk_dir:
+            try:
+                os.makedirs(self.disk_dir, exist_ok=True)
+                path = self._disk_path(key)
+                _serialize(faces, path)
+                self._account_disk(os.path.getsize(path))
+            except (OSError, ValueError) as e:
+                print(f"[WARN] No se pudo escribir la caché de embeddings en disco: {e}")
+
+    def _remember(self, key, faces):
+        size = _entry_bytes(faces)
+        if size > self.max_bytes:
+            return
+        faces = _detached(faces)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (faces, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def _account_disk(self, written):
+        """Suma los bytes escritos y purga solo si la cuenta supera el límite."""
+        with self._disk_lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += written
+                self._disk_written += written
+                if self._disk_bytes <= self.disk_max_bytes and self._disk_written <= 0.1 * self.disk_max_bytes:
+                    return
+            self._disk_bytes = self._trim_disk()
+            self._disk_written = 0
+
+    def _trim_disk(self):
+        """
+        Recorre el directorio (con _disk_lock tomado) y, si supera el límite, borra los .npz
+        usados hace más tiempo hasta quedar bajo el 90 %. Devuelve los bytes que quedan.
+        """
+        files = []
+        for path in glob.glob(os.path.join(self.disk_dir, '*.npz')):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        if total <= self.disk_max_bytes:
+            return total
+        for _, size, path in sorted(files):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= 0.9 * self.disk_max_bytes:
+                break
+        return total
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+embedding_cache = EmbeddingCache(
+    max_bytes=int(config.EMBEDDING_CACHE_MAX_MB * 2**20),
+    disk_dir=config.EMBEDDING_CACHE_DIR,
+    disk_max_bytes=int(config.EMBEDDING_CACHE_DISK_MAX_MB * 2**20),
+)
@@ -0,0 +1,46 @@
+import base64
+import numpy as np
+from flask import request
+
+# ==========================================================
+# Formato de intercambio de embeddings entre servicios
+# ==========================================================
+#   json   -> lista de floats (formato original, por defecto)
+#   b64f32 -> base64 de float32 little-endian (~3.5x menor que texto)
+#   b64f16 -> base64 de float16 little-endian (~7x menor, precisión suficiente para coseno)
+#   raw    -> cuerpo binario application/octet-stream con float32 little-endian
+# La decodificación vive en attendance-mcsv (app/services/embedding_codec.py).
+
+EMBEDDING_FORMATS = ('json', 'b64f32', 'b64f16', 'raw')
+RAW_MIMETYPE = 'application/octet-stream'
+
+_BASE64_DTYPES = {
+    'b64f32': '<f4',
+    'b64f16': '<f2',
+}
+
+
+def encode_embedding(embedding, fmt='json'):
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    if fmt == 'json':
+        return vector.tolist()
+    if fmt in _BASE64_DTYPES:
+        return base64.b64encode(vector.astype(_BASE64_DTYPES[fmt]).tobytes()).decode('ascii')
+    if fmt == 'raw':
+        return vector.astype('<f4').tobytes()
+    raise ValueError(f"Unsupported embedding format: {fmt}")
+
+
+def requested_embedding_format():
+    """
+    Formato de respuesta pedido por el cliente: parámetro 'embedding_format'
+    (query string o form) o cabecera 'Accept: application/octet-stream'.
+    Sin indicación se responde con la lista JSON original.
+    """
+    fmt = request.values.get('embedding_format')
+    if fmt:
+        return fmt if fmt in EMBEDDING_FORMATS else None
+    # En empate (p. ej. 'Accept: */*') gana JSON por estar primero
+    if request.accept_mimetypes.best_match(['application/json', RAW_MIMETYPE]) == RAW_MIMETYPE:
+        return 'raw'
+    return 'json'
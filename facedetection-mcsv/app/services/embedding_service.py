@@ -1,39 +1,150 @@
-import cv2
 import numpy as np
 import pandas as pd
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from .. import config
+from ..models.custom_face_model import EMBEDDING_SIZE, build_faces
+from .metrics import STAGE_SECONDS
+from .embedding_cache import embedding_cache, image_key
+from .image_decode import decode_upload
+
+
+def detect_faces_cached(image_bytes, face_model):
+    """
+    Caras (con embedding) de una imagen subida, consultando antes la caché por contenido.
+    Devuelve None si la imagen no se puede decodificar.
+    """
+    key = image_key(image_bytes, face_model.fingerprint)
+    faces = embedding_cache.get(key)
+    if faces is not None:
+        return faces
+
+    frame = decode_upload(image_bytes)
+    if frame is None:
+        return None
+    faces = face_model.get(frame)
+    embedding_cache.put(key, faces)
+    return faces
 
 # ==========================================================
 # Servicio 1: Genera y guarda el embedding promedio del estudiante
 # ==========================================================
+# Las fotos se decodifican y detectan en paralelo (ENROLLMENT_WORKERS hilos; TensorFlow y
+# OpenCV liberan el GIL) y todas las caras se pasan juntas por ArcFace en un solo batch.
+# Se embeben todas las caras aceptadas de cada foto, no solo la mejor, para que la entrada
+# de la caché sea la misma que usa /extract-embedding; en fotos de matrícula suele haber una.
+
+_enrollment_pool = None
+_enrollment_pool_lock = threading.Lock()
+
+
+def _enrollment_executor():
+    global _enrollment_pool
+    with _enrollment_pool_lock:
+        if _enrollment_pool is None:
+            _enrollment_pool = ThreadPoolExecutor(max_workers=max(1, config.ENROLLMENT_WORKERS),
+                                                  thread_name_prefix='enrollment')
+        return _enrollment_pool
+
+
+def _prepare_upload(image_bytes, face_model):
+    """
+    Etapa paralela de una imagen: caché o decode + detección + alineamiento + calidad.
+    Devuelve (informe, clave de caché, caras si estaban en caché, preparación pendiente de embedding).
+    """
+    report = {"bytes": len(image_bytes), "cached": False, "timings": {}}
+    start = time.perf_counter()
+    key = image_key(image_bytes, face_model.fingerprint)
+    faces = embedding_cache.get(key)
+    if faces is not None:
+        report["cached"] = True
+        report["timings"]["total"] = time.perf_counter() - start
+        return report, key, faces, None
+
+    decode_start = time.perf_counter()
+    frame = decode_upload(image_bytes)
+    report["timings"]["decode"] = time.perf_counter() - decode_start
+    if frame is None:
+        report["status"] = "decode_error"
+        report["timings"]["total"] = time.perf_counter() - start
+        return report, key, None, None
+
+    aligned_faces, detections, qualities = face_model.prepare(frame, timings=report["timings"])
+    report["timings"]["total"] = time.perf_counter() - start
+    # Copia: el buffer de alineamiento es del hilo y lo reutiliza la siguiente imagen
+    return report, key, None, (aligned_faces.copy(), detections, qualities)
+
+
+def _embed_pending(prepared, face_model):
+    """Embebe en un solo batch las caras de todas las imágenes no cacheadas y las guarda en caché."""
+    pending = [item for item in prepared if item[3] is not None]
+    batch = [aligned for _, _, _, (aligned, _, _) in pending if len(aligned)]
+    elapsed = 0.0
+    embeddings = np.empty((0, EMBEDDING_SIZE), dtype=np.float32)
+    if batch:
+        start = time.perf_counter()
+        embeddings = face_model.embed(np.concatenate(batch))
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage='embedding')
+
+    results = []
+    offset = 0
+    for report, key, faces, preparation in prepared:
+        if preparation is not None:
+            aligned, detections, qualities = preparation
+            faces = build_faces(detections, embeddings[offset:offset + len(aligned)], qualities)
+            offset += len(aligned)
+            embedding_cache.put(key, faces)
+        results.append((report, faces))
+    return results, elapsed, len(embeddings)
+
 
 def generate_student_embedding(image_files, student_id, face_model):
+    """
+    Calcula el embedding promedio del estudiante a partir de sus fotos y lo guarda en
+    students.csv. Devuelve (éxito, informe con el resultado y los tiempos de cada imagen).
+    """
+    started = time.perf_counter()
     if not image_files:
         print("Error: No image files provided for processing.")
-        return False
-
-    embeddings = []
-
-    for file in image_files:
-        np_img = np.frombuffer(file.read(), np.uint8)
-        frame = cv2.imdecode(np_img, cv2.IMREAD_COLOR)
-        if frame is None:
-            continue
+        return False, {"images": []}
 
-        faces = face_model.get(frame)
-        if not faces:
-            continue
+    uploads = [(file.filename, file.read()) for file in image_files]
+    prepared = list(_enrollment_executor().map(lambda upload: _prepare_upload(upload[1], face_model), uploads))
+    results, embedding_seconds, embedded_faces = _embed_pending(prepared, face_model)
 
-        best_face = max(faces, key=lambda face: face.det_score)
-        if best_face.det_score < config.DETECTION_THRESHOLD:
-            continue
+    embeddings = []
+    image_reports = []
+    for (filename, _), (report, faces) in zip(uploads, results):
+        report["filename"] = filename
+        if faces is not None:
+            report["faces"] = len(faces)
+            best_face = max(faces, key=lambda face: face.det_score) if faces else None
+            if best_face is None:
+                report["status"] = "no_face"
+            elif best_face.det_score < config.DETECTION_THRESHOLD:
+                report["status"] = "low_score"
+                report["det_score"] = float(best_face.det_score)
+            else:
+                report["status"] = "ok"
+                report["det_score"] = float(best_face.det_score)
+                embeddings.append(best_face.embedding)
+        image_reports.append(report)
 
-        embeddings.append(best_face.embedding)
+    summary = {
+        "images": image_reports,
+        "timings": {
+            "embedding_batch": embedding_seconds,
+            "embedded_faces": embedded_faces,
+            "total": time.perf_counter() - started,
+        },
+    }
 
     if not embeddings:
         print("Error: No high-quality embeddings could be extracted.")
-        return False
+        return False, summary
 
     # Calcular embedding promedio
     avg_embedding = np.mean(np.array(embeddings), axis=0)
@@ -55,7 +166,8 @@ def generate_student_embedding(image_files, student_id, face_model):
 
     df.to_csv(global_path, index=False)
     print(f"Success: Saved/Updated averaged embedding for student '{student_id}'")
-    return True
+    summary["timings"]["total"] = time.perf_counter() - started
+    return True, summary
 
 
 # ==========================================================
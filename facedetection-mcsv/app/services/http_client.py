@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .. import config
+
+# ==========================================================
+# Cliente HTTP compartido por servicio destino
+# ==========================================================
+
+class ServiceClient:
+    """
+    Sesión con pool de conexiones keep-alive hacia un servicio, con URL base,
+    timeout por defecto, política de reintentos y contadores de latencia.
+
+    Reintentos: los errores de conexión se reintentan para cualquier método
+    (la petición no llegó al servidor); los errores de lectura y las respuestas
+    502/503/504 solo para métodos idempotentes, para no duplicar un POST.
+    """
+
+    def __init__(self, name, base_url, timeout=None, retries=None, backoff=None, pool_size=None):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = config.HTTP_TIMEOUT if timeout is None else timeout
+
+        retries = config.HTTP_RETRIES if retries is None else retries
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=config.HTTP_BACKOFF if backoff is None else backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=config.HTTP_POOL_SIZE if pool_size is None else pool_size,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self._count = 0
+        self._errors = 0
+        self._total_seconds = 0.0
+        self._max_seconds = 0.0
+
+    def url(self, path):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.request(method, self.url(path), **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            self._record(time.perf_counter() - start, failed)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def _record(self, elapsed, failed):
+        with self._lock:
+            self._count += 1
+            self._errors += int(failed)
+            self._total_seconds += elapsed
+            self._max_seconds = max(self._max_seconds, elapsed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "base_url": self.base_url,
+                "requests": self._count,
+                "errors": self._errors,
+                "total_seconds": self._total_seconds,
+                "avg_seconds": self._total_seconds / self._count if self._count else 0.0,
+                "max_seconds": self._max_seconds,
+            }
+
+
+# ==========================================================
+# Registro de clientes por proceso
+# ==========================================================
+
+# Nombre lógico -> atributo de config con la URL base
+_TARGETS = {
+    'attendance': 'ATTENDANCE_SERVICE_URL',
+    'camera': 'CAMERA_CLIENT_URL',
+    'facedetection': 'FACEDETECTION_SERVICE_URL',
+}
+
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+def get_client(name):
+    """
+    Devuelve el cliente compartido para el servicio `name`, creándolo la primera vez.
+    Los sockets del pool no se comparten entre procesos: tras un fork se recrean.
+    """
+    global _clients_pid
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        client = _clients.get(name)
+        if client is None:
+            client = ServiceClient(name, getattr(config, _TARGETS[name]))
+            _clients[name] = client
+        return client
+
+
+def get_all_stats():
+    with _clients_lock:
+        clients = list(_clients.values())
+    return {client.name: client.stats() for client in clients}
@@ -0,0 +1,88 @@
+import time
+
+import cv2
+import numpy as np
+
+from .. import config
+from .metrics import DECODE_BYTES, DECODE_REDUCTION, STAGE_SECONDS
+
+# ==========================================================
+# Decodificación de imágenes subidas
+# ==========================================================
+# Todas las rutas decodifican con decode_image(). Si la imagen es un JPEG mucho
+# mayor de lo necesario, se usa la reducción 1/2, 1/4 u 1/8 del propio decodificador
+# JPEG (IMREAD_REDUCED_COLOR_*), que evita decodificar y luego reducir los píxeles
+# descartados. El tamaño se lee de la cabecera SOF sin decodificar la imagen.
+
+REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+# Marcadores SOFn (inicio de frame); C4, C8 y CC usan el mismo rango pero no lo son
+_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def jpeg_size(data):
+    """(ancho, alto) leídos del segmento SOF de un JPEG, o None si no es un JPEG válido."""
+    if data[:2] != b'\xff\xd8':
+        return None
+    i = 2
+    length = len(data)
+    while i + 4 <= length:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # bytes de relleno
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # marcadores sin longitud
+            i += 2
+            continue
+        if marker == 0xDA:  # inicio de los datos sin haber visto SOF
+            return None
+        if marker in _SOF_MARKERS:
+            if i + 9 > length:
+                return None
+            height = int.from_bytes(data[i + 5:i + 7], 'big')
+            width = int.from_bytes(data[i + 7:i + 9], 'big')
+            return width, height
+        i += 2 + int.from_bytes(data[i + 2:i + 4], 'big')
+    return None
+
+
+def reduction_factor(size, min_side):
+    """Mayor factor 2/4/8 que deja el lado menor en al menos min_side píxeles (1 si ninguno)."""
+    if size is None or not min_side:
+        return 1, cv2.IMREAD_COLOR
+    shortest = min(size)
+    for factor, flag in REDUCED_FLAGS:
+        if shortest // factor >= min_side:
+            return factor, flag
+    return 1, cv2.IMREAD_COLOR
+
+
+def decode_image(image_bytes, min_side=None):
+    """
+    Decodifica una imagen subida a BGR; None si no se puede. Con min_side, los JPEG cuyo
+    lado menor supera varias veces ese valor se decodifican ya reducidos. Registra el
+    tiempo (etapa 'decode'), los bytes y el factor de reducción en /metrics.
+    """
+    start = time.perf_counter()
+    factor, flag = reduction_factor(jpeg_size(image_bytes), min_side)
+    frame = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flag)
+    if frame is None and flag != cv2.IMREAD_COLOR:
+        # Algunos JPEG raros no admiten la decodificación reducida
+        factor = 1
+        frame = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    STAGE_SECONDS.observe(time.perf_counter() - start, stage='decode')
+    DECODE_BYTES.observe(len(image_bytes))
+    if frame is not None:
+        DECODE_REDUCTION.inc(factor=str(factor))
+    return frame
+
+
+def decode_upload(image_bytes):
+    """Decodificación de fotos de matrícula/búsqueda (/generate-embedding, /extract-embedding)."""
+    return decode_image(image_bytes, config.DECODE_UPLOAD_MIN_SIDE)
+
+
+def decode_frame(image_bytes):
+    """Decodificación de frames de cámara (/process_frame, /benchmark/process)."""
+    return decode_image(image_bytes, config.DECODE_FRAME_MIN_SIDE)
@@ -0,0 +1,266 @@
+import bisect
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# ==========================================================
+# Métricas en formato de texto de Prometheus (sin dependencias)
+# ==========================================================
+# Contadores e histogramas en memoria del proceso. Con varios workers de
+# gunicorn cada uno expone los suyos: /metrics devuelve los del worker que
+# atiende la petición (etiqueta 'pid' en facedetection_process_info).
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES_BUCKETS = (2**14, 2**16, 2**18, 2**19, 2**20, 2**21, 2**22, 2**23, 2**24, 2**25)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    body = ','.join(f'{k}="{str(v)}"' for k, v in pairs)
+    return '{' + body + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [conteos por bucket (+Inf al final), suma]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][idx] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._series.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = ('le', _format_value(float(bound)))
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []  # callables que devuelven líneas ya formateadas
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'facedetection_stage_seconds',
+    'Latencia por etapa del pipeline (decode, detection, alignment, quality, embedding, matching, crop_write, unknown_notify).',
+    labelnames=('stage',),
+))
+FACES_PER_FRAME = REGISTRY.register(Histogram(
+    'facedetection_faces_per_frame',
+    'Caras detectadas por frame procesado.',
+    buckets=COUNT_BUCKETS,
+))
+RECOGNIZED_FACES = REGISTRY.register(Counter(
+    'facedetection_recognized_faces_total',
+    'Caras comparadas con la galería, por resultado (known/unknown).',
+    labelnames=('result',),
+))
+REJECTED_FACES = REGISTRY.register(Counter(
+    'facedetection_rejected_faces_total',
+    'Caras descartadas antes del matching, por motivo.',
+    labelnames=('reason',),
+))
+TRACKED_FACES = REGISTRY.register(Counter(
+    'facedetection_tracked_faces_total',
+    'Caras de sesiones con seguimiento: identidad reutilizada de la pista (reused) o embebida (embedded).',
+    labelnames=('result',),
+))
+GALLERY_CACHE = REGISTRY.register(Counter(
+    'facedetection_gallery_cache_total',
+    'Consultas a la caché de galerías por curso (hit/miss).',
+    labelnames=('result',),
+))
+SCHEDULE_CACHE = REGISTRY.register(Counter(
+    'facedetection_schedule_cache_total',
+    'Resoluciones schedule_id -> course_id (hit/not_found) y recargas de la tabla (refresh).',
+    labelnames=('result',),
+))
+DECODE_BYTES = REGISTRY.register(Histogram(
+    'facedetection_decode_bytes',
+    'Tamaño en bytes de cada imagen recibida para decodificar.',
+    buckets=BYTES_BUCKETS,
+))
+DECODE_REDUCTION = REGISTRY.register(Counter(
+    'facedetection_decode_total',
+    'Imágenes decodificadas, por factor de reducción del decodificador JPEG (1 = resolución completa).',
+    labelnames=('factor',),
+))
+EMBEDDING_CACHE = REGISTRY.register(Counter(
+    'facedetection_embedding_cache_total',
+    'Consultas a la caché de embeddings de imágenes subidas (memory_hit/disk_hit/miss).',
+    labelnames=('result',),
+))
+STREAM_FRAMES = REGISTRY.register(Counter(
+    'facedetection_stream_frames_total',
+    'Frames de los streams ingeridos por cámara (read/sampled/processed/dropped_busy/dropped_admission/failed).',
+    labelnames=('camera', 'result'),
+))
+QUEUE_WAIT = REGISTRY.register(Histogram(
+    'facedetection_admission_wait_seconds',
+    'Tiempo de espera en la cola de admisión de los frames admitidos.',
+))
+
+
+# --- Colectores: estadísticas que ya mantienen otros módulos ---
+
+def _gauge(name, documentation, samples, kind='gauge'):
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} {kind}']
+    for labels, value in samples:
+        lines.append(f'{name}{labels} {_format_value(value)}')
+    return lines
+
+
+@REGISTRY.register_collector
+def _process_lines():
+    return _gauge('facedetection_process_info', 'Proceso (worker) que generó estas métricas.',
+                  [(f'{{pid="{os.getpid()}"}}', 1)])
+
+
+@REGISTRY.register_collector
+def _admission_lines():
+    from .admission import recognition_admission
+
+    stats = recognition_admission.stats()
+    return (
+        _gauge('facedetection_admission_queue_depth', 'Frames esperando turno.', [('', stats['queue_depth'])])
+        + _gauge('facedetection_admission_in_flight', 'Frames en inferencia.', [('', stats['in_flight'])])
+        + _gauge('facedetection_admission_admitted_total', 'Frames admitidos.', [('', stats['admitted'])], 'counter')
+        + _gauge('facedetection_admission_rejected_total', 'Frames rechazados por el control de admisión, por motivo.', [
+            ('{reason="queue_full"}', stats['rejected_queue_full']),
+            ('{reason="queue_timeout"}', stats['rejected_queue_timeout']),
+            ('{reason="deadline"}', stats['expired_deadline']),
+        ], 'counter')
+    )
+
+
+@REGISTRY.register_collector
+def _embedding_cache_lines():
+    from .embedding_cache import embedding_cache
+
+    stats = embedding_cache.stats()
+    return (
+        _gauge('facedetection_embedding_cache_entries', 'Imágenes en la caché de embeddings en memoria.', [('', stats['entries'])])
+        + _gauge('facedetection_embedding_cache_bytes', 'Tamaño estimado de la caché de embeddings en memoria.', [('', stats['bytes'])])
+    )
+
+
+@REGISTRY.register_collector
+def _schedule_cache_lines():
+    from .schedule_cache import schedule_cache
+
+    return _gauge('facedetection_schedule_cache_entries', 'Horarios en la caché schedule_id -> course_id.',
+                  [('', schedule_cache.stats()['entries'])])
+
+
+@REGISTRY.register_collector
+def _stream_lines():
+    # Sin importar el módulo si nadie lo usó: arrastra el pipeline de reconocimiento
+    module = sys.modules.get(f'{__package__}.stream_ingest')
+    active = module.stream_manager.active_count() if module is not None else 0
+    return _gauge('facedetection_streams_active', 'Workers de stream activos en este proceso.', [('', active)])
+
+
+@REGISTRY.register_collector
+def _http_client_lines():
+    from .http_client import get_all_stats
+
+    stats = get_all_stats()
+    def samples(field):
+        return [(f'{{target="{name}"}}', s[field]) for name, s in sorted(stats.items())]
+    return (
+        _gauge('facedetection_http_client_requests_total', 'Peticiones a otros servicios.', samples('requests'), 'counter')
+        + _gauge('facedetection_http_client_errors_total', 'Peticiones fallidas (error o 5xx).', samples('errors'), 'counter')
+        + _gauge('facedetection_http_client_seconds_total', 'Tiempo acumulado en peticiones.', samples('total_seconds'), 'counter')
+        + _gauge('facedetection_http_client_max_seconds', 'Petición más lenta.', samples('max_seconds'))
+    )
+
+
+def render_metrics():
+    return REGISTRY.render()
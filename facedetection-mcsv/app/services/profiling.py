@@ -0,0 +1,181 @@
+import cProfile
+import datetime
+import glob
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from functools import wraps
+
+from flask import g, make_response, request
+
+from .. import config
+from .tokens import token_matches
+
+# ==========================================================
+# Perfilado bajo demanda de peticiones
+# ==========================================================
+# Una petición se ejecuta bajo cProfile si trae la cabecera X-Profile con el valor
+# de PROFILE_TOKEN (sin token configurado la cabecera se ignora) o si cae en la muestra
+# aleatoria PROFILE_SAMPLE_RATE. Se guardan en PROFILE_DIR:
+#   <id>.prof  -> estadísticas de cProfile (snakeviz, pstats, ...)
+#   <id>.json  -> metadatos: endpoint, duración, frame recibido y funciones más costosas
+# Solo se perfila una petición a la vez por proceso (cProfile no admite dos
+# perfiles activos); el resto se atienden sin perfilar. /profiles exige la misma
+# cabecera con PROFILE_TOKEN y responde 403 si no está configurado (los perfiles
+# incluyen rutas de código y metadatos de las peticiones).
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ID_RE = re.compile(r'^[0-9]{8}T[0-9]{6}_[a-z0-9_]+_[0-9a-f]{8}$')
+TOP_FUNCTIONS = 25
+
+_profile_lock = threading.Lock()
+_local = threading.local()
+
+
+def is_profiling():
+    """True si el hilo actual está perfilando (el modelo evita entonces el micro-batching)."""
+    return getattr(_local, 'active', False)
+
+
+def annotate(**fields):
+    """Añade metadatos (forma del frame, caras, ...) al perfil de la petición en curso."""
+    if is_profiling():
+        g.profile_annotations.update(fields)
+
+
+def _trigger():
+    header = request.headers.get(PROFILE_HEADER)
+    if header is not None:
+        if token_matches(header, config.PROFILE_TOKEN):
+            return 'header'
+        print("[WARN] Cabecera X-Profile sin un PROFILE_TOKEN válido: la petición no se perfilará.")
+    if config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE:
+        return 'sample'
+    return None
+
+
+def _request_metadata():
+    image = request.files.get('image')
+    metadata = {
+        "endpoint": request.path,
+        "method": request.method,
+        "remote_addr": request.remote_addr,
+        "form": {k: v for k, v in request.form.items() if k in ('schedule_id', 'course_id', 'student_id')},
+        "content_length": request.content_length,
+    }
+    if image is not None:
+        metadata["image"] = {"filename": image.filename, "mimetype": image.mimetype}
+    return metadata
+
+
+def _top_functions(profiler):
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    return stream.getvalue()
+
+
+def _save(profile_id, profiler, metadata):
+    os.makedirs(config.PROFILE_DIR, exist_ok=True)
+    profiler.dump_stats(os.path.join(config.PROFILE_DIR, f"{profile_id}.prof"))
+    metadata["top_cumulative"] = _top_functions(profiler)
+    tmp_path = os.path.join(config.PROFILE_DIR, f".{profile_id}.json.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(metadata, f, indent=2, default=str)
+    os.replace(tmp_path, os.path.join(config.PROFILE_DIR, f"{profile_id}.json"))
+    _enforce_retention()
+
+
+def _enforce_retention():
+    """Conserva solo los PROFILE_MAX_FILES perfiles más recientes."""
+    metadata_files = sorted(glob.glob(os.path.join(config.PROFILE_DIR, '*.json')), reverse=True)
+    for path in metadata_files[config.PROFILE_MAX_FILES:]:
+        profile_id = os.path.splitext(os.path.basename(path))[0]
+        for ext in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(config.PROFILE_DIR, profile_id + ext))
+            except OSError:
+                pass
+
+
+def profiled(view):
+    """Decorador de ruta: ejecuta la vista bajo cProfile cuando la petición lo pide o cae en la muestra."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        trigger = _trigger()
+        if trigger is None or not _profile_lock.acquire(blocking=False):
+            return view(*args, **kwargs)
+
+        try:
+            endpoint = re.sub(r'[^a-z0-9]+', '_', request.path.lower()).strip('_') or 'root'
+            profile_id = f"{datetime.datetime.now().strftime('%Y%m%dT%H%M%S')}_{endpoint}_{uuid.uuid4().hex[:8]}"
+            metadata = {"id": profile_id, "trigger": trigger, **_request_metadata()}
+            g.profile_annotations = {}
+            profiler = cProfile.Profile()
+            response = None
+            start = time.perf_counter()
+            _local.active = True
+            profiler.enable()
+            try:
+                response = make_response(view(*args, **kwargs))
+            finally:
+                profiler.disable()
+                _local.active = False
+                metadata.update({
+                    "created_at": datetime.datetime.now().isoformat(timespec='seconds'),
+                    "duration_seconds": time.perf_counter() - start,
+                    "status": response.status_code if response is not None else 500,
+                    "annotations": g.pop('profile_annotations', {}),
+                })
+                try:
+                    _save(profile_id, profiler, metadata)
+                    print(f"[INFO] Perfil guardado: {profile_id} ({metadata['duration_seconds']:.3f} s, trigger={trigger})")
+                except Exception as e:
+                    print(f"[ERROR] No se pudo guardar el perfil {profile_id}: {e}")
+                    profile_id = None
+        finally:
+            _profile_lock.release()
+
+        if profile_id:
+            response.headers['X-Profile-Id'] = profile_id
+        return response
+    return wrapper
+
+
+# ==========================================================
+# Consulta de perfiles guardados
+# ==========================================================
+
+def list_profiles(limit=50):
+    profiles = []
+    for path in sorted(glob.glob(os.path.join(config.PROFILE_DIR, '*.json')), reverse=True)[:limit]:
+        try:
+            with open(path) as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            continue
+        metadata.pop('top_cumulative', None)
+        profiles.append(metadata)
+    return profiles
+
+
+def get_profile(profile_id):
+    """Metadatos completos del perfil, o None si el id no es válido o no existe."""
+    path = profile_path(profile_id, '.json')
+    if path is None:
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def profile_path(profile_id, ext='.prof'):
+    if not PROFILE_ID_RE.match(profile_id or ''):
+        return None
+    path = os.path.join(config.PROFILE_DIR, profile_id + ext)
+    return path if os.path.isfile(path) else None
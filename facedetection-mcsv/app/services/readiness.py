@@ -0,0 +1,92 @@
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify
+
+# ==========================================================
+# Estado de preparación del servicio (endpoint /ready)
+# ==========================================================
+# Cada componente pasa por pending -> loading -> ready | failed y guarda su
+# tiempo de carga. El servicio está listo cuando todos están 'ready'; mientras
+# tanto las rutas marcadas con @model_required responden 503 y /ready devuelve 503,
+# de modo que el balanceador no envía tráfico a un worker que sigue calentando.
+# Las rutas que no usan el modelo (horarios, streams, inicio de captura) siguen
+# atendiéndose durante el calentamiento.
+
+COMPONENTS = ('arcface', 'retinaface')
+
+
+class Readiness:
+    def __init__(self, components):
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._components = {
+            name: {"state": "pending", "seconds": None, "error": None, "detail": None}
+            for name in components
+        }
+
+    def run(self, name, fn, detail=None):
+        """Ejecuta fn() registrando el estado y la duración del componente; relanza el error."""
+        with self._lock:
+            self._components[name].update(state="loading", error=None)
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            with self._lock:
+                self._components[name].update(state="failed", seconds=time.perf_counter() - start, error=str(e))
+            raise
+        with self._lock:
+            self._components[name].update(
+                state="ready",
+                seconds=time.perf_counter() - start,
+                detail=detail(result) if callable(detail) else detail,
+            )
+        return result
+
+    def run_in_background(self, steps, name='model-loader'):
+        """
+        Ejecuta [(componente, fn[, detail]), ...] en orden en un hilo daemon;
+        se detiene en el primer fallo.
+        """
+        def worker():
+            for component, fn, *detail in steps:
+                try:
+                    self.run(component, fn, *detail)
+                except Exception as e:
+                    print(f"[ERROR] Falló la carga de '{component}': {e}")
+                    return
+        thread = threading.Thread(target=worker, name=name, daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self):
+        with self._lock:
+            return all(c["state"] == "ready" for c in self._components.values())
+
+    def snapshot(self):
+        with self._lock:
+            components = {name: dict(c) for name, c in self._components.items()}
+            uptime = time.time() - self._started
+        return {
+            "ready": all(c["state"] == "ready" for c in components.values()),
+            "uptime_seconds": uptime,
+            "components": components,
+        }
+
+
+readiness = Readiness(COMPONENTS)
+
+
+def model_required(view):
+    """Decorador de las rutas que usan el modelo: 503 con Retry-After hasta que esté listo."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not readiness.is_ready():
+            response = jsonify({"error": "Model is still loading.", "readiness": readiness.snapshot()})
+            response.status_code = 503
+            response.headers['Retry-After'] = '5'
+            return response
+        return view(*args, **kwargs)
+    return wrapper
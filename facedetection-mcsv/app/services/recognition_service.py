@@ -6,14 +6,20 @@ import requests
 from collections import defaultdict
 import os
 import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 base_dir = os.path.abspath(os.path.dirname(__file__))
 CAPTURES_DIR = os.path.join(base_dir, '..', '..', 'captures')
 os.makedirs(CAPTURES_DIR, exist_ok=True)
 print(f"[INFO] Directorio de capturas asegurado en: {CAPTURES_DIR}")
 
-CAMERA_CLIENT_URL = "http://localhost:6000/start_capture"
-ATTENDANCE_UNKNOWN_URL = "http://127.0.0.1:5000/unknown-faces"
+from .http_client import get_client
+from .embedding_codec import encode_embedding
+from .image_decode import decode_frame
+from .metrics import STAGE_SECONDS, FACES_PER_FRAME, RECOGNIZED_FACES, REJECTED_FACES, TRACKED_FACES
+from ..models.custom_face_model import build_faces
+from ..models.face_tracker import TrackingSessions
 
 def find_best_match(new_embedding, known_face_db, threshold):
     best_match_name = "Unknown"
@@ -45,16 +51,61 @@ def find_best_match_vectorized(new_embedding, known_matrix, known_labels, thresh
     # Buscar el índice con mayor similitud
     idx_max = np.argmax(similarities)
     best_sim = similarities[idx_max]
-    print("simila: ")
-    print(similarities)
-    print("best: ")
-    print(best_sim)
-    print(threshold)
     if best_sim < threshold:
         return "Unknown", best_sim
 
     return known_labels[idx_max], float(best_sim)
 
+_MATCH_BLOCK_ROWS = 8192  # filas de galería float16 convertidas a float32 por bloque
+
+def match_faces_batched(embeddings, known_matrix, known_labels, threshold):
+    """
+    Versión por lotes: compara las F caras de un frame con las N identidades en un
+    único producto (F, D) x (D, N). Devuelve [(identidad, similitud), ...] con la
+    misma semántica que find_best_match_vectorized para cada cara.
+    """
+    if len(embeddings) == 0:
+        return []
+    if known_matrix is None or known_labels is None or len(known_labels) == 0:
+        return [("Unknown", 0.0)] * len(embeddings)
+
+    queries = np.asarray(embeddings, dtype=np.float32)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    rows = np.arange(len(queries))
+
+    if known_matrix.dtype == np.float32:
+        similarities = queries @ known_matrix.T  # (F, N)
+        best_idx = np.argmax(similarities, axis=1)
+        best_sim = similarities[rows, best_idx]
+    else:
+        # Galería almacenada en float16: numpy no tiene GEMM en float16, así que se
+        # convierte por bloques a float32 y se conserva el máximo acumulado.
+        best_sim = np.full(len(queries), -np.inf, dtype=np.float32)
+        best_idx = np.zeros(len(queries), dtype=np.int64)
+        for start in range(0, len(known_matrix), _MATCH_BLOCK_ROWS):
+            block = known_matrix[start:start + _MATCH_BLOCK_ROWS].astype(np.float32)
+            similarities = queries @ block.T
+            idx = np.argmax(similarities, axis=1)
+            sim = similarities[rows, idx]
+            better = sim > best_sim
+            best_sim[better] = sim[better]
+            best_idx[better] = idx[better] + start
+
+    return [
+        (known_labels[idx], float(sim)) if sim >= threshold else ("Unknown", float(sim))
+        for idx, sim in zip(best_idx, best_sim)
+    ]
+
+def filter_faces(faces):
+    """Descarta las detecciones por debajo de DETECTION_THRESHOLD (contadas en /metrics)."""
+    accepted = []
+    for face in faces:
+        if face.det_score < config.DETECTION_THRESHOLD:
+            REJECTED_FACES.inc(reason='low_det_score')
+            continue
+        accepted.append(face)
+    return accepted
+
 def send_unknown_face_to_attendance(embedding, image_path, schedule_id):
     """
     Envía un rostro desconocido al microservicio de attendance para que quede
@@ -65,18 +116,17 @@ def send_unknown_face_to_attendance(embedding, image_path, schedule_id):
         return
 
     try:
-        embedding = np.asarray(embedding, dtype='float32').flatten()
-        embedding_str = ';'.join(map(str, embedding))
-
         payload = {
             "schedule_id": schedule_id,  # ← sin int()
-            "embedding": embedding_str,
+            "embedding": encode_embedding(embedding, 'b64f32'),
+            "embedding_format": "b64f32",
             "image_path": image_path,
             "detected_at": datetime.datetime.now().isoformat()
         }
 
-        print(f"[INFO] Enviando Unknown face a {ATTENDANCE_UNKNOWN_URL} ...")
-        resp = requests.post(ATTENDANCE_UNKNOWN_URL, json=payload, timeout=5)
+        attendance = get_client('attendance')
+        print(f"[INFO] Enviando Unknown face a {attendance.url('/unknown-faces')} ...")
+        resp = attendance.post('/unknown-faces', json=payload, timeout=5)
         if 200 <= resp.status_code < 300:
             print(f"[INFO] Unknown face registrado en attendance: {resp.json()}")
         else:
@@ -85,79 +135,264 @@ def send_unknown_face_to_attendance(embedding, image_path, schedule_id):
         print(f"[ERROR] No se pudo enviar Unknown face a attendance: {e}")
 
 
-def recognize_faces_in_frame_2(frame, face_model, known_matrix, known_labels, schedule_id=None):
-    faces = face_model.get(frame)
+def recognize_faces_in_frame_2(frame, face_model, known_matrix, known_labels, schedule_id=None, detection_options=None):
+    faces = face_model.get(frame, **(detection_options or {}))
+    FACES_PER_FRAME.observe(len(faces))
     if not faces:
         return []
 
+    faces = filter_faces(faces)
+    with STAGE_SECONDS.time(stage='matching'):
+        matches = match_faces_batched(
+            [face.embedding for face in faces], known_matrix, known_labels, config.SIMILARITY_THRESHOLD
+        )
+
     recognized_faces = []
-    for face in faces:
-        if face.det_score < config.DETECTION_THRESHOLD:
-            continue
+    for face, (identity, confidence) in zip(faces, matches):
+        RECOGNIZED_FACES.inc(result='unknown' if identity == "Unknown" else 'known')
+        _record_face(frame, face, identity, schedule_id)
+        recognized_faces.append({
+            "identity": identity,
+            "confidence": f"{confidence:.2f}" if identity != "Unknown" else "N/A"
+        })
 
-        # --- Inicio del temporizador ---
-        start_time = time.perf_counter()
 
-        identity, confidence = find_best_match_vectorized(
-            face.embedding, known_matrix, known_labels, config.SIMILARITY_THRESHOLD
-        )
+    return recognized_faces
 
-        # --- Fin del temporizador ---
-        end_time = time.perf_counter()
-        elapsed_time = end_time - start_time
-        print(f"[DEBUG] Tiempo ejecución find_best_match_vectorized: {elapsed_time:.6f} segundos")
 
-        # --- INICIO DE LÓGICA PARA GUARDAR IMAGEN ---
-        filepath = None
-        try:
-            # 1. Crear un nombre de archivo único
-            now_str = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            file_identity = identity.replace(" ", "_").replace("/", "_")
-            schedule_str = schedule_id or "NO_SCHEDULE"
-            
-            # 2. Crear subcarpeta para el schedule (ej: /captures/<schedule_id>)
-            schedule_capture_dir = os.path.join(CAPTURES_DIR, schedule_str)
-            os.makedirs(schedule_capture_dir, exist_ok=True)
-            
-            # 3. Definir el nombre del archivo (ej: Kevin_Chambi_20251101_203000_123456.jpg)
-            filename = f"{file_identity}_{now_str}.jpg"
-            filepath = os.path.join(schedule_capture_dir, filename)
-
-            # 4. Recortar la cara del frame original usando el bbox
-            [x1, y1, x2, y2] = [int(v) for v in face.bbox]
-            y1_crop, y2_crop = max(0, y1), min(frame.shape[0], y2)
-            x1_crop, x2_crop = max(0, x1), min(frame.shape[1], x2)
-            
-            cropped_face = frame[y1_crop:y2_crop, x1_crop:x2_crop]
+# ==========================================================
+# Reconocimiento con seguimiento entre frames (por cámara)
+# ==========================================================
+tracking_sessions = TrackingSessions()
+
 
-            # 5. Guardar la imagen si el recorte es válido
-            if cropped_face.size > 0:
-                cv2.imwrite(filepath, cropped_face)
-                print(f"[DEBUG] Rostro guardado en: {filepath}")
+def recognize_faces_tracked(frame, face_model, known_matrix, known_labels, tracker, schedule_id=None, detection_options=None):
+    """
+    recognize_faces_in_frame_2 con seguimiento entre frames (ver face_tracker.py): las caras
+    de pistas confirmadas reutilizan su identidad sin alinear ni embeber; solo pasan por
+    ArcFace las nuevas, las no confirmadas y las que toca reverificar. El recorte y el aviso
+    de desconocido se hacen una vez por pista e identidad. Devuelve (resultados, estadísticas).
+    """
+    with tracker.lock, face_model.tracking_request():
+        detections = face_model.detect_faces(frame, **(detection_options or {}))
+        tracks = tracker.associate(detections, frame.shape)
+        frame_index = tracker.frame_index
+        # Las detecciones de score bajo siguen asociadas a su pista pero no se embeben
+        scored = [face_info['score'] >= config.DETECTION_THRESHOLD for face_info in detections]
+        due = [ok and track.due(frame_index) for track, ok in zip(tracks, scored)]
+
+        aligned_faces, accepted, qualities = face_model.prepare_detections(
+            frame, [face_info for face_info, is_due in zip(detections, due) if is_due]
+        )
+        embeddings = face_model.embed_request(aligned_faces) if accepted else []
+        faces = build_faces(accepted, embeddings, qualities)
+        detection_of = {id(face): id(face_info) for face, face_info in zip(faces, accepted)}
+        with STAGE_SECONDS.time(stage='matching'):
+            matches = match_faces_batched(
+                [face.embedding for face in faces], known_matrix, known_labels, config.SIMILARITY_THRESHOLD
+            )
+        verified = {detection_of[id(face)]: (face, match) for face, match in zip(faces, matches)}
+
+        recognized_faces = []
+        reused = 0
+        for face_info, track, ok, is_due in zip(detections, tracks, scored, due):
+            if not ok:
+                REJECTED_FACES.inc(reason='low_det_score')
+                continue
+            if is_due:
+                if id(face_info) not in verified:
+                    continue  # descartada por alineamiento o calidad
+                face, (identity, confidence) = verified[id(face_info)]
+                track.verify(identity, confidence, frame_index)
+                if not track.reported:
+                    _record_face(frame, face, identity, schedule_id)
+                    track.reported = True
             else:
-                print(f"[DEBUG] No se pudo guardar el rostro (tamaño 0) para {identity}")
-                filepath = None
-                
-        except Exception as e:
-            print(f"[ERROR] No se pudo guardar la imagen del rostro: {e}")
+                identity, confidence = track.identity, track.confidence
+                reused += 1
+            RECOGNIZED_FACES.inc(result='unknown' if identity == "Unknown" else 'known')
+            recognized_faces.append({
+                "identity": identity,
+                "confidence": f"{confidence:.2f}" if identity != "Unknown" else "N/A",
+                "track_id": track.track_id,
+            })
+
+    FACES_PER_FRAME.observe(len(recognized_faces))
+    TRACKED_FACES.inc(reused, result='reused')
+    TRACKED_FACES.inc(len(faces), result='embedded')
+    return recognized_faces, {"reused": reused, "embedded": len(faces), "tracks": len(tracker.tracks)}
+
+
+def _save_face_crop(frame, face, identity, schedule_id):
+    """Guarda el recorte de la cara en captures/<schedule_id>/ y devuelve la ruta (None si falla)."""
+    filepath = None
+    crop_start = time.perf_counter()
+    try:
+        # 1. Crear un nombre de archivo único
+        now_str = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        file_identity = identity.replace(" ", "_").replace("/", "_")
+        schedule_str = schedule_id or "NO_SCHEDULE"
+
+        # 2. Crear subcarpeta para el schedule (ej: /captures/<schedule_id>)
+        schedule_capture_dir = os.path.join(CAPTURES_DIR, schedule_str)
+        os.makedirs(schedule_capture_dir, exist_ok=True)
+
+        # 3. Definir el nombre del archivo (ej: Kevin_Chambi_20251101_203000_123456.jpg)
+        filename = f"{file_identity}_{now_str}.jpg"
+        filepath = os.path.join(schedule_capture_dir, filename)
+
+        # 4. Recortar la cara del frame original usando el bbox
+        [x1, y1, x2, y2] = [int(v) for v in face.bbox]
+        y1_crop, y2_crop = max(0, y1), min(frame.shape[0], y2)
+        x1_crop, x2_crop = max(0, x1), min(frame.shape[1], x2)
+
+        cropped_face = frame[y1_crop:y2_crop, x1_crop:x2_crop]
+
+        # 5. Guardar la imagen si el recorte es válido
+        if cropped_face.size > 0:
+            cv2.imwrite(filepath, cropped_face)
+            print(f"[DEBUG] Rostro guardado en: {filepath}")
+        else:
+            print(f"[DEBUG] No se pudo guardar el rostro (tamaño 0) para {identity}")
             filepath = None
-        # --- FIN DE LÓGICA PARA GUARDAR IMAGEN ---
 
-        # --- NUEVO: si es Unknown, enviar a attendance ---
-        if identity == "Unknown" and filepath is not None:
+    except Exception as e:
+        print(f"[ERROR] No se pudo guardar la imagen del rostro: {e}")
+        filepath = None
+    STAGE_SECONDS.observe(time.perf_counter() - crop_start, stage='crop_write')
+    return filepath
+
+
+def _record_face(frame, face, identity, schedule_id):
+    """Guarda el recorte y, si la cara es desconocida, la registra en attendance."""
+    filepath = _save_face_crop(frame, face, identity, schedule_id)
+    if identity == "Unknown" and filepath is not None:
+        with STAGE_SECONDS.time(stage='unknown_notify'):
             send_unknown_face_to_attendance(
                 embedding=face.embedding,
                 image_path=filepath,
                 schedule_id=schedule_id
             )
 
-        recognized_faces.append({
-            "identity": identity,
-            "confidence": f"{confidence:.2f}" if identity != "Unknown" else "N/A"
-        })
+# ==========================================================
+# Reconocimiento de varios frames en una petición (ráfagas)
+# ==========================================================
+# Cada frame se decodifica, detecta, alinea y filtra en un hilo del pool
+# (FRAME_BATCH_WORKERS; TensorFlow y OpenCV liberan el GIL) y todas las caras de
+# la ráfaga pasan juntas por ArcFace. Además del resultado por frame se agrega por
+# identidad: como el mismo estudiante aparece en casi todos los frames, se guarda
+# un solo recorte por identidad (el de mayor confianza) y las caras desconocidas
+# que se parecen entre sí se agrupan y se envían una vez a attendance.
 
+_frame_pool = None
+_frame_pool_lock = threading.Lock()
+
+
+def _frame_executor():
+    global _frame_pool
+    with _frame_pool_lock:
+        if _frame_pool is None:
+            _frame_pool = ThreadPoolExecutor(max_workers=max(1, config.FRAME_BATCH_WORKERS),
+                                             thread_name_prefix='frame-batch')
+        return _frame_pool
+
+
+def _prepare_frame(image_bytes, face_model, detection_options):
+    """Etapa paralela de un frame: (frame o None si no se pudo decodificar, preparación del modelo)."""
+    frame = decode_frame(image_bytes)
+    if frame is None:
+        return None, None
+    aligned_faces, detections, qualities = face_model.prepare(frame, **detection_options)
+    # Copia: el buffer de alineamiento es del hilo y lo reutiliza el siguiente frame
+    return frame, (aligned_faces.copy(), detections, qualities)
+
+
+def _group_unknown_faces(sightings):
+    """
+    Agrupa caras desconocidas de distintos frames por similitud (>= SIMILARITY_THRESHOLD
+    con la primera cara del grupo, en orden de det_score). Devuelve listas de avistamientos.
+    """
+    groups = []
+    representatives = []
+    for sighting in sorted(sightings, key=lambda s: s[1].det_score, reverse=True):
+        embedding = np.asarray(sighting[1].embedding, dtype=np.float32)
+        embedding = embedding / max(np.linalg.norm(embedding), 1e-12)
+        for group, representative in zip(groups, representatives):
+            if float(np.dot(embedding, representative)) >= config.SIMILARITY_THRESHOLD:
+                group.append(sighting)
+                break
+        else:
+            groups.append([sighting])
+            representatives.append(embedding)
+    return groups
 
-    return recognized_faces
+
+def recognize_faces_in_frames(images, face_model, known_matrix, known_labels, schedule_id=None, detection_options=None):
+    """
+    Reconoce una ráfaga de frames (lista de bytes JPEG/PNG) de un mismo horario.
+    Devuelve (resultados por frame, identidades agregadas, grupos de desconocidos).
+    """
+    detection_options = detection_options or {}
+    with face_model.tracking_request():
+        prepared = list(_frame_executor().map(
+            lambda image_bytes: _prepare_frame(image_bytes, face_model, detection_options), images
+        ))
+        batch = [preparation[0] for _, preparation in prepared if preparation is not None and len(preparation[0])]
+        embeddings = face_model.embed_request(np.concatenate(batch)) if batch else None
+
+    frames = []
+    sightings = []  # (índice del frame, cara, identidad, confianza)
+    offset = 0
+    for index, (frame, preparation) in enumerate(prepared):
+        if preparation is None:
+            frames.append({"frame": index, "error": "Could not decode image."})
+            continue
+        aligned_faces, detections, qualities = preparation
+        faces = build_faces(detections, embeddings[offset:offset + len(aligned_faces)], qualities) if detections else []
+        offset += len(aligned_faces)
+        FACES_PER_FRAME.observe(len(faces))
+
+        faces = filter_faces(faces)
+        with STAGE_SECONDS.time(stage='matching'):
+            matches = match_faces_batched(
+                [face.embedding for face in faces], known_matrix, known_labels, config.SIMILARITY_THRESHOLD
+            )
+        recognized_faces = []
+        for face, (identity, confidence) in zip(faces, matches):
+            RECOGNIZED_FACES.inc(result='unknown' if identity == "Unknown" else 'known')
+            sightings.append((index, face, identity, confidence))
+            recognized_faces.append({
+                "identity": identity,
+                "confidence": f"{confidence:.2f}" if identity != "Unknown" else "N/A",
+                "bbox": [int(v) for v in face.bbox],
+            })
+        frames.append({"frame": index, "recognized_faces": recognized_faces})
+
+    decoded = [frame for frame, _ in prepared]
+    identities = {}
+    for index, face, identity, confidence in sightings:
+        if identity == "Unknown":
+            continue
+        entry = identities.setdefault(identity, {"identity": identity, "sightings": 0, "frames": [], "best": None})
+        entry["sightings"] += 1
+        if index not in entry["frames"]:
+            entry["frames"].append(index)
+        if entry["best"] is None or confidence > entry["best"][2]:
+            entry["best"] = (index, face, confidence)
+
+    aggregated = []
+    for entry in sorted(identities.values(), key=lambda e: e["best"][2], reverse=True):
+        index, face, confidence = entry.pop("best")
+        _save_face_crop(decoded[index], face, entry["identity"], schedule_id)
+        aggregated.append({**entry, "best_confidence": f"{confidence:.2f}"})
+
+    unknown = []
+    for group in _group_unknown_faces([s for s in sightings if s[2] == "Unknown"]):
+        index, face = group[0][0], group[0][1]
+        _record_face(decoded[index], face, "Unknown", schedule_id)
+        unknown.append({"sightings": len(group), "frames": sorted({s[0] for s in group})})
+
+    return frames, aggregated, unknown
 
 def capture_and_recognize_faces(scheduler_id):
     print(f"[INFO] Sending remote capture command to camera client for attendance")
@@ -168,7 +403,7 @@ def capture_and_recognize_faces(scheduler_id):
         "interval": 100  # segundos
     }
     try:
-        response = requests.post(CAMERA_CLIENT_URL, json=payload, timeout=10)
+        response = get_client('camera').post('/start_capture', json=payload, timeout=10)
         if response.status_code == 200:
             print(f"[INFO] Camera client acknowledged start: {response.json()}")
         else:
@@ -176,26 +411,27 @@ def capture_and_recognize_faces(scheduler_id):
     except requests.exceptions.RequestException as e:
         print(f"[ERROR] Failed to contact camera client: {e}")
 
-def benchmark_recognition_engine(frame, face_model, known_matrix, known_labels):
+def benchmark_recognition_engine(frame, face_model, known_matrix, known_labels, detection_options=None):
     """
     Separa el tiempo de 'Ver' (Detection+Embedding) del tiempo de 'Pensar' (Matching).
     """
     t_start_pipeline = time.perf_counter()
-    faces = face_model.get(frame) 
+    faces = face_model.get(frame, **(detection_options or {}))
     t_end_pipeline = time.perf_counter()
     pipeline_time = t_end_pipeline - t_start_pipeline
 
+    FACES_PER_FRAME.observe(len(faces))
     if not faces:
         return [], pipeline_time, 0.0
 
     t_start_matching = time.perf_counter()
-    recognized_names = []
-    for face in faces:
-        if face.det_score < config.DETECTION_THRESHOLD:
-            continue
-        identity, confidence = find_best_match_vectorized(
-            face.embedding, known_matrix, known_labels, config.SIMILARITY_THRESHOLD
+    faces = filter_faces(faces)
+    with STAGE_SECONDS.time(stage='matching'):
+        matches = match_faces_batched(
+            [face.embedding for face in faces], known_matrix, known_labels, config.SIMILARITY_THRESHOLD
         )
+    recognized_names = []
+    for identity, confidence in matches:
         recognized_names.append({
             "identity": identity,
             "confidence": float(confidence)
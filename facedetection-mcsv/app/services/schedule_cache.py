@@ -0,0 +1,121 @@
+import sqlite3
+import threading
+import time
+from urllib.request import pathname2url
+
+from .. import config
+from .metrics import SCHEDULE_CACHE
+
+# ==========================================================
+# Caché schedule_id -> course_id
+# ==========================================================
+# /process_frame abría una conexión nueva a la base de attendance-mcsv en cada frame
+# solo para resolver el curso del horario. La tabla de horarios es pequeña y cambia
+# poco, así que se guarda completa en memoria:
+#   - Se recarga entera (una conexión de solo lectura reutilizada) al vencer
+#     SCHEDULE_CACHE_TTL, o ante un schedule_id desconocido como mucho una vez cada
+#     SCHEDULE_CACHE_MISS_REFRESH segundos (horarios recién creados).
+#   - attendance-mcsv puede empujar altas/bajas a POST /schedules/sync, de modo que
+#     los cambios se ven sin esperar al TTL.
+# Si la recarga falla y ya hay datos, se siguen sirviendo los anteriores.
+
+
+class ScheduleCache:
+    def __init__(self, db_path, ttl, miss_refresh):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.miss_refresh = miss_refresh
+        self._courses = {}
+        self._loaded_at = None     # time.monotonic() de la última recarga completa
+        self._refreshed_at = None  # último intento de recarga (correcto o no)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        # mode=ro: no crea un database.db vacío si la ruta no existe
+        uri = f"file:{pathname2url(self.db_path)}?mode=ro"
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    def _query_all(self):
+        """Todas las filas (id, course_id); reconecta una vez si la conexión falló."""
+        for attempt in range(2):
+            try:
+                if self._conn is None:
+                    self._conn = self._connect()
+                return self._conn.execute("SELECT id, course_id FROM schedules").fetchall()
+            except sqlite3.Error:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                if attempt:
+                    raise
+
+    def _refresh(self, due):
+        """Recarga la tabla si due(ahora) sigue siendo cierto tras esperar a otras recargas."""
+        with self._refresh_lock:
+            if not due(time.monotonic()):
+                return  # otro hilo acaba de recargar
+            self._refreshed_at = time.monotonic()
+            try:
+                rows = self._query_all()
+            except sqlite3.Error as e:
+                if self._loaded_at is None:
+                    raise
+                print(f"[WARN] No se pudieron recargar los horarios, se usan los anteriores: {e}")
+                return
+            SCHEDULE_CACHE.inc(result='refresh')
+            with self._lock:
+                self._courses = dict(rows)
+                self._loaded_at = time.monotonic()
+            print(f"[INFO] Caché de horarios recargada: {len(rows)} horarios.")
+
+    def _expired(self, now):
+        return self._loaded_at is None or now - self._loaded_at > self.ttl
+
+    def _miss_refresh_due(self, now):
+        return self._refreshed_at is None or now - self._refreshed_at >= self.miss_refresh
+
+    def course_for(self, schedule_id):
+        """
+        course_id del horario, o None si no existe. Lanza sqlite3.Error solo si la
+        base no se puede leer y todavía no hay datos cargados.
+        """
+        if self._expired(time.monotonic()):
+            self._refresh(self._expired)
+        with self._lock:
+            course_id = self._courses.get(schedule_id)
+        if course_id is not None:
+            SCHEDULE_CACHE.inc(result='hit')
+            return course_id
+
+        if self._miss_refresh_due(time.monotonic()):
+            self._refresh(self._miss_refresh_due)
+            with self._lock:
+                course_id = self._courses.get(schedule_id)
+        SCHEDULE_CACHE.inc(result='hit' if course_id is not None else 'not_found')
+        return course_id
+
+    def update(self, schedules=(), deleted=()):
+        """Aplica cambios empujados por attendance-mcsv: [(id, course_id)] y ids borrados."""
+        with self._lock:
+            self._courses.update(schedules)
+            for schedule_id in deleted:
+                self._courses.pop(schedule_id, None)
+
+    def invalidate(self):
+        """Fuerza la recarga completa en la siguiente consulta."""
+        with self._lock:
+            self._loaded_at = None
+
+    def stats(self):
+        with self._lock:
+            age = None if self._loaded_at is None else time.monotonic() - self._loaded_at
+            return {"entries": len(self._courses), "age_seconds": age, "ttl_seconds": self.ttl}
+
+
+schedule_cache = ScheduleCache(
+    db_path=config.DB_PATH,
+    ttl=config.SCHEDULE_CACHE_TTL,
+    miss_refresh=config.SCHEDULE_CACHE_MISS_REFRESH,
+)
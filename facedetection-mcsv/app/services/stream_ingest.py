@@ -0,0 +1,341 @@
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+import cv2
+import requests
+
+from .. import config
+from . import database_service
+from .admission import AdmissionRejected, recognition_admission
+from .http_client import get_client
+from .metrics import STREAM_FRAMES
+from ..models.face_tracker import FaceTracker
+from .recognition_service import recognize_faces_in_frame_2, recognize_faces_tracked
+from .schedule_cache import schedule_cache
+
+# ==========================================================
+# Ingesta de streams de cámara en el propio servicio
+# ==========================================================
+# Alternativa a client_server.py: en lugar de recibir cada frame codificado en JPEG
+# por HTTP, un worker por cámara lee la fuente con cv2.VideoCapture (RTSP, MJPEG por
+# HTTP, un dispositivo local o un vídeo de STREAM_FILE_DIR como sustituto de pruebas)
+# y pasa los frames muestreados directamente al pipeline de reconocimiento.
+#
+# Cada cámara usa dos hilos:
+#   lector      hace grab() de todos los frames (así el buffer de la fuente no se
+#               acumula y el frame muestreado es el actual) y solo decodifica con
+#               retrieve() uno cada 1/sample_fps segundos. Los vídeos se leen al
+#               ritmo de su FPS, como una cámara.
+#   procesador  toma el último frame muestreado; si aún procesaba el anterior, el
+#               nuevo sustituye al pendiente (descarte 'busy'). Comparte el control
+#               de admisión con /process_frame: si no hay hueco antes del siguiente
+#               muestreo, el frame se descarta ('admission').
+# Los estudiantes reconocidos se envían a attendance una vez por sesión de stream,
+# como hace client_server.py. Los workers son por proceso: con varios workers de
+# gunicorn, GET /streams solo muestra los del proceso que responde.
+
+STREAM_SCHEMES = ('rtsp', 'rtsps', 'http', 'https')
+
+
+def resolve_source(source):
+    """
+    Valida la fuente pedida: URL rtsp/http(s), índice de dispositivo ('0') o ruta de un
+    vídeo dentro de STREAM_FILE_DIR. Devuelve (fuente para VideoCapture, es_archivo);
+    lanza ValueError si no se admite.
+    """
+    source = str(source or '').strip()
+    if not source:
+        raise ValueError("'source' is required.")
+    if urlsplit(source).scheme.lower() in STREAM_SCHEMES:
+        return source, False
+    if re.fullmatch(r'\d+', source):
+        return int(source), False
+
+    base_dir = os.path.realpath(config.STREAM_FILE_DIR)
+    path = os.path.realpath(os.path.join(base_dir, source))
+    if os.path.commonpath([base_dir, path]) != base_dir or not os.path.isfile(path):
+        raise ValueError(f"'source' must be an rtsp/http URL, a device index or a video file under {config.STREAM_FILE_DIR}.")
+    return path, True
+
+
+def redact_source(source):
+    """Fuente sin la contraseña de la URL, para logs y GET /streams."""
+    if not isinstance(source, str):
+        return source
+    parts = urlsplit(source)
+    if parts.password is None:
+        return source
+    netloc = f"{parts.username}:***@{parts.hostname}" + (f":{parts.port}" if parts.port else '')
+    return urlunsplit(parts._replace(netloc=netloc))
+
+
+class StreamBusy(Exception):
+    """La cámara ya tiene un worker activo o el proceso alcanzó STREAM_MAX_WORKERS."""
+
+
+class StreamWorker:
+    def __init__(self, camera_id, source, schedule_id, face_model, sample_fps=None, duration=None,
+                 detection_options=None, loop=False):
+        self.camera_id = camera_id
+        self.source, self.is_file = resolve_source(source)
+        self.schedule_id = schedule_id
+        self.face_model = face_model
+        self.sample_fps = sample_fps or config.STREAM_SAMPLE_FPS
+        self.duration = duration
+        self.detection_options = detection_options or {}
+        self.loop = loop
+
+        self.state = 'starting'  # running, reconnecting, finished, stopped o failed
+        self.last_error = None
+        self.started_at = time.time()
+        self.counts = {"read": 0, "sampled": 0, "processed": 0, "dropped_busy": 0,
+                       "dropped_admission": 0, "failed": 0, "faces": 0, "reconnects": 0}
+        self.marked = set()  # estudiantes ya enviados a attendance en esta sesión
+        self.last_results = []
+        self.tracker = FaceTracker() if config.TRACKING_ENABLED else None
+
+        self._stop = threading.Event()
+        self._cond = threading.Condition()
+        self._pending = None  # último frame muestreado sin procesar
+        self._reader = threading.Thread(target=self._read_loop, name=f'stream-reader-{camera_id}', daemon=True)
+        self._processor = threading.Thread(target=self._process_loop, name=f'stream-proc-{camera_id}', daemon=True)
+
+    @property
+    def alive(self):
+        return self._reader.is_alive() or self._processor.is_alive()
+
+    def start(self):
+        print(f"[INFO] Stream '{self.camera_id}': leyendo {redact_source(self.source)} a {self.sample_fps} fps "
+              f"(schedule {self.schedule_id}).")
+        self._reader.start()
+        self._processor.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._reader.join(timeout)
+        self._processor.join(timeout)
+        if self.state not in ('finished', 'failed'):
+            self.state = 'stopped'
+
+    def _count(self, key, amount=1):
+        self.counts[key] += amount
+        if key not in ('faces', 'reconnects'):
+            STREAM_FRAMES.inc(amount, camera=self.camera_id, result=key)
+
+    # --- Lector ---
+
+    def _open(self):
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            capture.release()
+            return None
+        if not self.is_file:
+            capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # lo admiten pocos backends; el grab() continuo hace el resto
+        return capture
+
+    def _read_loop(self):
+        interval = 1.0 / self.sample_fps
+        session_end = time.monotonic() + self.duration if self.duration else None
+        try:
+            while not self._stop.is_set():
+                capture = self._open()
+                if capture is None:
+                    self.last_error = f"Could not open source {redact_source(self.source)}."
+                    if self.is_file:
+                        self.state = 'failed'
+                        return
+                    self._reconnect_wait()
+                    continue
+
+                self.state = 'running'
+                opened = time.monotonic()
+                next_sample = 0.0
+                try:
+                    while not self._stop.is_set():
+                        if session_end is not None and time.monotonic() >= session_end:
+                            self.state = 'finished'
+                            return
+                        if not capture.grab():
+                            break
+                        self._count('read')
+                        if self.is_file:
+                            # Reloj del vídeo, reproducido a velocidad real
+                            clock = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                            delay = opened + clock - time.monotonic()
+                            if delay > 0 and self._stop.wait(delay):
+                                break
+                        else:
+                            clock = time.monotonic() - opened
+                        if clock < next_sample:
+                            continue
+                        next_sample = clock + interval
+                        ok, frame = capture.retrieve()
+                        if ok:
+                            self._offer(frame)
+                finally:
+                    capture.release()
+
+                if self._stop.is_set():
+                    return
+                if self.is_file:
+                    if self.loop:
+                        continue
+                    self.state = 'finished'
+                    return
+                self.last_error = "Stream ended or connection lost."
+                self._reconnect_wait()
+        except Exception as e:
+            print(f"[ERROR] Stream '{self.camera_id}': fallo del lector: {e}")
+            self.last_error = str(e)
+            self.state = 'failed'
+        finally:
+            with self._cond:
+                self._cond.notify_all()
+
+    def _reconnect_wait(self):
+        self.state = 'reconnecting'
+        self.counts['reconnects'] += 1
+        print(f"[WARN] Stream '{self.camera_id}': {self.last_error} Reintentando en {config.STREAM_RECONNECT_SECONDS} s.")
+        self._stop.wait(config.STREAM_RECONNECT_SECONDS)
+
+    def _offer(self, frame):
+        self._count('sampled')
+        with self._cond:
+            if self._pending is not None:
+                self._count('dropped_busy')
+            self._pending = frame
+            self._cond.notify()
+
+    # --- Procesador ---
+
+    def _take(self):
+        with self._cond:
+            while self._pending is None:
+                if self._stop.is_set() or not self._reader.is_alive():
+                    return None
+                self._cond.wait(0.5)
+            frame, self._pending = self._pending, None
+            return frame
+
+    def _process_loop(self):
+        while True:
+            frame = self._take()
+            if frame is None:
+                return
+            try:
+                self._process(frame)
+            except Exception as e:
+                print(f"[ERROR] Stream '{self.camera_id}': fallo al procesar un frame: {e}")
+                self.last_error = str(e)
+                self._count('failed')
+
+    def _gallery(self):
+        course_id = schedule_cache.course_for(self.schedule_id)
+        if course_id is None:
+            return None, None
+        return database_service.get_course_gallery(course_id)
+
+    def _process(self, frame):
+        known_matrix, known_labels = self._gallery()
+        # Un frame que no obtiene hueco antes del siguiente muestreo ya está obsoleto
+        try:
+            recognition_admission.acquire(time.monotonic() + 1.0 / self.sample_fps)
+        except AdmissionRejected:
+            self._count('dropped_admission')
+            return
+        start = time.perf_counter()
+        try:
+            if self.tracker is not None:
+                results, _ = recognize_faces_tracked(
+                    frame, self.face_model, known_matrix, known_labels, self.tracker, self.schedule_id, self.detection_options
+                )
+            else:
+                results = recognize_faces_in_frame_2(
+                    frame, self.face_model, known_matrix, known_labels, self.schedule_id, self.detection_options
+                )
+        finally:
+            recognition_admission.release(time.perf_counter() - start)
+        self._count('processed')
+        self._count('faces', len(results))
+        self.last_results = results
+        self._mark_attendance(results)
+
+    def _mark_attendance(self, results):
+        attendance = get_client('attendance')
+        for face in results:
+            student_id = face.get('identity')
+            if not student_id or student_id == 'Unknown' or student_id in self.marked:
+                continue
+            try:
+                response = attendance.post('/attendance/', json={'student_id': student_id, 'schedule_id': self.schedule_id}, timeout=5)
+            except requests.exceptions.RequestException as e:
+                print(f"[WARN] Stream '{self.camera_id}': no se pudo enviar la asistencia de {student_id}: {e}")
+                continue
+            # 409: ya registrada hoy; cualquier otro error se reintenta en el siguiente avistamiento
+            if response.status_code in (200, 201, 409):
+                self.marked.add(student_id)
+            else:
+                print(f"[WARN] Stream '{self.camera_id}': attendance devolvió {response.status_code} para {student_id}.")
+
+    def snapshot(self):
+        return {
+            "camera_id": self.camera_id,
+            "source": redact_source(self.source),
+            "schedule_id": self.schedule_id,
+            "sample_fps": self.sample_fps,
+            "duration": self.duration,
+            "state": self.state,
+            "last_error": self.last_error,
+            "uptime_seconds": time.time() - self.started_at,
+            "counts": dict(self.counts),
+            "students_marked": sorted(self.marked),
+            "tracks": len(self.tracker.tracks) if self.tracker is not None else None,
+            "last_results": self.last_results,
+        }
+
+
+class StreamManager:
+    """Workers de stream de este proceso, por camera_id."""
+
+    def __init__(self, max_streams):
+        self.max_streams = max_streams
+        self._workers = {}
+        self._lock = threading.Lock()
+
+    def start(self, camera_id, **kwargs):
+        """Arranca un worker; lanza StreamBusy (cámara activa o límite alcanzado) o ValueError (fuente no válida)."""
+        with self._lock:
+            current = self._workers.get(camera_id)
+            if current is not None and current.alive:
+                raise StreamBusy(f"Camera '{camera_id}' is already streaming.")
+            active = sum(1 for worker in self._workers.values() if worker.alive)
+            if active >= self.max_streams:
+                raise StreamBusy(f"At most {self.max_streams} streams per process (STREAM_MAX_WORKERS).")
+            worker = StreamWorker(camera_id, **kwargs)
+            self._workers[camera_id] = worker
+        worker.start()
+        return worker
+
+    def stop(self, camera_id):
+        with self._lock:
+            worker = self._workers.pop(camera_id, None)
+        if worker is not None:
+            worker.stop()
+        return worker
+
+    def list(self):
+        with self._lock:
+            workers = list(self._workers.values())
+        return [worker.snapshot() for worker in workers]
+
+    def active_count(self):
+        with self._lock:
+            return sum(1 for worker in self._workers.values() if worker.alive)
+
+
+stream_manager = StreamManager(max_streams=config.STREAM_MAX_WORKERS)
@@ -0,0 +1,32 @@
+import hmac
+from functools import wraps
+
+from flask import jsonify, request
+
+from .. import config
+
+# ==========================================================
+# Tokens compartidos para rutas internas
+# ==========================================================
+# Las rutas que escriben estado interno o exponen datos de diagnóstico exigen una
+# cabecera con el valor de un ajuste de config.py. Si el ajuste no está definido la
+# ruta queda cerrada (403): no hay valor por defecto que un cliente pueda adivinar.
+
+
+def token_matches(value, expected):
+    """True si `expected` está definido y `value` coincide (comparación en tiempo constante)."""
+    if not expected or value is None:
+        return False
+    return hmac.compare_digest(value.encode(), expected.encode())
+
+
+def token_required(header, setting):
+    """Decorador de ruta: 403 salvo que la cabecera `header` traiga config.<setting>."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not token_matches(request.headers.get(header), getattr(config, setting)):
+                return jsonify({"error": f"Header {header} with a valid {setting} is required."}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
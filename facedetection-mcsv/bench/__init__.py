@@ -0,0 +1,3 @@
+# facedetection-mcsv/bench
+# Benchmarks del servicio de análisis facial. Se ejecutan desde facedetection-mcsv:
+#   python -m bench.<modulo> --help
@@ -0,0 +1,54 @@
+"""Utilidades compartidas por los benchmarks: percentiles, metadatos del entorno y salida JSON."""
+import datetime
+import json
+import os
+import platform
+import subprocess
+
+import numpy as np
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATASETS_DIR = os.path.abspath(os.path.join(PROJECT_ROOT, '..', 'datasets'))
+CLASSROOMS_DIR = os.path.join(DATASETS_DIR, 'synthetic_classrooms')
+
+
+def percentiles(values, points=(50, 95, 99)):
+    """{'p50': .., 'p95': .., 'p99': .., 'mean': .., 'n': ..} de una lista de segundos."""
+    if not values:
+        return {"n": 0}
+    arr = np.asarray(values, dtype=np.float64)
+    summary = {f"p{p}": float(np.percentile(arr, p)) for p in points}
+    summary["mean"] = float(arr.mean())
+    summary["n"] = int(arr.size)
+    return summary
+
+
+def git_commit():
+    """Commit actual del repositorio (con sufijo '-dirty' si hay cambios sin confirmar), o None."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=PROJECT_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        "git_commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec='seconds'),
+        "hostname": platform.node(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_json(path, payload):
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2)
+    print(f"Resultados guardados en {path}")
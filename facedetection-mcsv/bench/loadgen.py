@@ -0,0 +1,309 @@
+"""
+Generador de carga concurrente contra el servicio de facedetection.
+
+Reenvía en bucle los frames de datasets/synthetic_classrooms y datasets/test a
+/process_frame (o a /benchmark/process) durante --duration segundos:
+
+- bucle cerrado (por defecto): --concurrency clientes, cada uno envía el siguiente
+  frame en cuanto recibe la respuesta anterior;
+- bucle abierto (--rate R): llegadas de Poisson a R frames/segundo repartidas entre
+  --concurrency conexiones. La latencia se mide desde el instante programado de
+  llegada, de modo que la espera en el propio cliente también cuenta.
+
+Informa throughput, percentiles de latencia, tasas de rechazo (429/503), errores y
+timeouts, y la profundidad de cola del servidor muestreada de /metrics (con varios
+workers de gunicorn cada muestra corresponde al worker que la atiende). Ejemplos
+(desde facedetection-mcsv):
+
+    python -m bench.loadgen --schedule-id <uuid> --concurrency 16 --duration 120
+    python -m bench.loadgen --endpoint /benchmark/process --course-id bench --rate 4 --duration 60 --output load.json
+"""
+import argparse
+import glob
+import os
+import queue
+import re
+import threading
+import time
+
+import numpy as np
+import requests
+
+from .common import CLASSROOMS_DIR, DATASETS_DIR, environment, percentiles, write_json
+
+DEFAULT_FRAME_DIRS = (CLASSROOMS_DIR, os.path.join(DATASETS_DIR, 'test'))
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png')
+QUEUE_GAUGES = ('facedetection_admission_queue_depth', 'facedetection_admission_in_flight')
+
+
+def load_frames(paths):
+    """[(nombre, bytes, mimetype)] de los archivos o directorios indicados."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in IMAGE_PATTERNS:
+                files.extend(glob.glob(os.path.join(path, pattern)))
+        elif os.path.exists(path):
+            files.append(path)
+    frames = []
+    for path in sorted(files):
+        with open(path, 'rb') as f:
+            mimetype = 'image/png' if path.lower().endswith('.png') else 'image/jpeg'
+            frames.append((os.path.basename(path), f.read(), mimetype))
+    return frames
+
+
+class LoadResults:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.outcomes = {}
+        self.by_frame = {}
+
+    def record(self, frame_name, outcome, latency):
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            if outcome == 'ok':
+                self.latencies.append(latency)
+                self.by_frame.setdefault(frame_name, []).append(latency)
+
+
+def send_frame(session, url, frame, form, headers, timeout):
+    """
+    Devuelve (resultado, Retry-After): ok, rejected (429/503), http_<código>,
+    timeout o connection_error.
+    """
+    name, body, mimetype = frame
+    try:
+        resp = session.post(url, files={'image': (name, body, mimetype)}, data=form, headers=headers, timeout=timeout)
+    except requests.Timeout:
+        return 'timeout', None
+    except requests.RequestException:
+        return 'connection_error', None
+    if resp.status_code == 200:
+        return 'ok', None
+    if resp.status_code in (429, 503):
+        try:
+            return 'rejected', float(resp.headers.get('Retry-After', 1))
+        except ValueError:
+            return 'rejected', 1.0
+    return f'http_{resp.status_code}', None
+
+
+class QueueSampler(threading.Thread):
+    """Muestrea periódicamente las métricas de admisión del servidor (/metrics)."""
+
+    def __init__(self, base_url, interval):
+        super().__init__(daemon=True)
+        self.url = f"{base_url}/metrics"
+        self.interval = interval
+        self.samples = {gauge: [] for gauge in QUEUE_GAUGES}
+        self._stop_event = threading.Event()  # no _stop: threading.Thread ya define ese método
+
+    def run(self):
+        session = requests.Session()
+        while True:
+            stopping = self._stop_event.wait(self.interval)
+            self._sample(session)  # al parar, una última muestra con el estado final
+            if stopping:
+                break
+
+    def _sample(self, session):
+        try:
+            text = session.get(self.url, timeout=self.interval).text
+        except requests.RequestException:
+            return
+        for gauge in QUEUE_GAUGES:
+            match = re.search(rf'^{gauge} (\S+)$', text, re.MULTILINE)
+            if match:
+                self.samples[gauge].append(float(match.group(1)))
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def summary(self):
+        return {
+            gauge: {"max": max(values), "mean": float(np.mean(values)), "samples": len(values)} if values else {"samples": 0}
+            for gauge, values in self.samples.items()
+        }
+
+
+def run_closed_loop(url, frames, form, headers, args, results):
+    stop_at = time.perf_counter() + args.duration
+    counter = iter(range(10**12))
+    counter_lock = threading.Lock()
+
+    def client():
+        session = requests.Session()
+        while time.perf_counter() < stop_at:
+            with counter_lock:
+                frame = frames[next(counter) % len(frames)]
+            start = time.perf_counter()
+            outcome, retry_after = send_frame(session, url, frame, form, headers, args.timeout)
+            results.record(frame[0], outcome, time.perf_counter() - start)
+            # Como client_server.py: un cliente rechazado espera Retry-After antes de reintentar
+            if retry_after and args.honor_retry_after:
+                time.sleep(max(0.0, min(retry_after, stop_at - time.perf_counter())))
+
+    threads = [threading.Thread(target=client) for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def run_open_loop(url, frames, form, headers, args, results):
+    """Llegadas de Poisson a --rate; la latencia incluye la espera por una conexión libre."""
+    pending = queue.Queue()
+    rng = np.random.default_rng(args.seed)
+
+    def client():
+        session = requests.Session()
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            frame, scheduled_at = item
+            outcome, _ = send_frame(session, url, frame, form, headers, args.timeout)
+            results.record(frame[0], outcome, time.perf_counter() - scheduled_at)
+
+    threads = [threading.Thread(target=client) for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+
+    start = time.perf_counter()
+    next_arrival = start
+    sent = 0
+    while next_arrival < start + args.duration:
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pending.put((frames[sent % len(frames)], next_arrival))
+        sent += 1
+        next_arrival += rng.exponential(1.0 / args.rate)
+
+    for _ in threads:
+        pending.put(None)
+    for t in threads:
+        t.join()
+    return sent
+
+
+def run_load(args, frames):
+    """Ejecuta una prueba de carga y devuelve el resumen (usado también por otros benchmarks)."""
+    base_url = args.url.rstrip('/')
+    url = f"{base_url}{args.endpoint}"
+    form = {}
+    if args.schedule_id:
+        form['schedule_id'] = args.schedule_id
+    if args.course_id:
+        form['course_id'] = args.course_id
+    headers = {'X-Request-Timeout': str(args.timeout)} if args.send_deadline else {}
+
+    results = LoadResults()
+    sampler = QueueSampler(base_url, args.metrics_interval) if args.metrics_interval > 0 else None
+    if sampler:
+        sampler.start()
+
+    started = time.perf_counter()
+    if args.rate:
+        offered = run_open_loop(url, frames, form, headers, args, results)
+    else:
+        run_closed_loop(url, frames, form, headers, args, results)
+        offered = sum(results.outcomes.values())
+    wall = time.perf_counter() - started
+
+    if sampler:
+        sampler.stop()
+
+    total = sum(results.outcomes.values())
+    ok = results.outcomes.get('ok', 0)
+    return {
+        "mode": "open" if args.rate else "closed",
+        "concurrency": args.concurrency,
+        "rate": args.rate,
+        "wall_seconds": wall,
+        "requests": total,
+        "offered_per_second": offered / wall if wall > 0 else 0.0,
+        "throughput_per_second": ok / wall if wall > 0 else 0.0,
+        "outcomes": results.outcomes,
+        "error_rate": (total - ok) / total if total else 0.0,
+        "timeout_rate": results.outcomes.get('timeout', 0) / total if total else 0.0,
+        "rejected_rate": results.outcomes.get('rejected', 0) / total if total else 0.0,
+        "latency": percentiles(results.latencies),
+        "latency_by_frame": {name: percentiles(values) for name, values in sorted(results.by_frame.items())},
+        "server_queue": sampler.summary() if sampler else None,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Prueba de carga concurrente de /process_frame.")
+    parser.add_argument('--url', default=os.environ.get('FACEDETECTION_SERVICE_URL', 'http://127.0.0.1:4000'))
+    parser.add_argument('--endpoint', default='/process_frame', choices=['/process_frame', '/benchmark/process'])
+    parser.add_argument('--schedule-id', help="schedule_id enviado a /process_frame (galería del curso)")
+    parser.add_argument('--course-id', help="course_id para /benchmark/process")
+    parser.add_argument('--frames', nargs='*', default=list(DEFAULT_FRAME_DIRS), help="Archivos o directorios de imágenes")
+    parser.add_argument('--concurrency', type=int, default=8, help="Clientes (bucle cerrado) o conexiones (bucle abierto)")
+    parser.add_argument('--rate', type=float, help="Frames/segundo ofrecidos (bucle abierto, llegadas de Poisson)")
+    parser.add_argument('--duration', type=float, default=60.0)
+    parser.add_argument('--timeout', type=float, default=10.0, help="Timeout de cliente por petición (s)")
+    parser.add_argument('--no-deadline', dest='send_deadline', action='store_false',
+                        help="No enviar X-Request-Timeout (el servidor no descartará frames obsoletos)")
+    parser.add_argument('--ignore-retry-after', dest='honor_retry_after', action='store_false',
+                        help="En bucle cerrado, reintentar de inmediato tras un 429/503")
+    parser.add_argument('--metrics-interval', type=float, default=1.0, help="Muestreo de /metrics en s (0 = desactivado)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Ruta del JSON con los resultados")
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.endpoint == '/benchmark/process' and not args.course_id:
+        parser.error("--course-id es obligatorio con /benchmark/process")
+
+    frames = load_frames(args.frames)
+    if not frames:
+        parser.error(f"No se encontraron imágenes en {args.frames}")
+
+    print(f"[INFO] {len(frames)} frames -> {args.url}{args.endpoint} | "
+          f"{'bucle abierto a %.2f frames/s' % args.rate if args.rate else 'bucle cerrado'} | "
+          f"concurrencia {args.concurrency} | {args.duration:.0f} s")
+    summary = run_load(args, frames)
+
+    lat = summary['latency']
+    print("\n" + "=" * 72)
+    print(f"Peticiones:       {summary['requests']} ({summary['offered_per_second']:.2f}/s ofrecidas)")
+    print(f"Throughput:       {summary['throughput_per_second']:.2f} frames/s correctos")
+    if lat.get('n'):
+        print(f"Latencia (s):     p50 {lat['p50']:.3f} | p95 {lat['p95']:.3f} | p99 {lat['p99']:.3f}")
+    print(f"Resultados:       {summary['outcomes']}")
+    print(f"Errores:          {summary['error_rate']:.1%} (timeouts {summary['timeout_rate']:.1%}, rechazos {summary['rejected_rate']:.1%})")
+    if summary['server_queue']:
+        for gauge, stats in summary['server_queue'].items():
+            if stats.get('samples'):
+                print(f"{gauge}: max {stats['max']:.0f} | media {stats['mean']:.2f}")
+    print("=" * 72)
+
+    if args.output:
+        write_json(args.output, {
+            "benchmark": "loadgen",
+            **environment(),
+            "target": f"{args.url}{args.endpoint}",
+            "frames": [name for name, _, _ in frames],
+            "settings": {
+                "concurrency": args.concurrency,
+                "rate": args.rate,
+                "duration": args.duration,
+                "timeout": args.timeout,
+                "send_deadline": args.send_deadline,
+                "honor_retry_after": args.honor_retry_after,
+            },
+            "summary": summary,
+        })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Escalado del matching con el tamaño de la galería (sin modelo ni imágenes).
+
+Genera galerías aleatorias de embeddings normalizados (por defecto 10^2..10^5
+identidades) y un frame de --faces consultas, y mide por frame la latencia y la
+memoria de cada estrategia:
+
+    loop_f32      find_best_match_vectorized cara a cara (lo que se usaba en /process_frame)
+    batched_f32   match_faces_batched: un único producto (F, D) x (D, N)
+    batched_f16   galería almacenada en float16 (mitad de memoria), convertida a float32 por bloques
+    faiss_flat    faiss.IndexFlatIP exacto (si faiss está instalado)
+    faiss_hnsw    faiss.IndexHNSWFlat aproximado (si faiss está instalado), con su recall@1
+
+Ejemplo (desde facedetection-mcsv):
+
+    python -m bench.matching --sizes 100 1000 10000 100000 --faces 50 --output matching.json
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from .common import environment, percentiles, write_json
+
+try:
+    import faiss
+except ImportError:  # faiss es opcional: solo amplía la comparación
+    faiss = None
+
+DIM = 512
+
+
+def unit_rows(rng, rows, dim=DIM):
+    matrix = rng.standard_normal((rows, dim)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix
+
+
+def make_queries(rng, gallery, faces, noise=0.5):
+    """Caras consulta cercanas a identidades de la galería, para que haya aciertos reales."""
+    targets = rng.integers(0, len(gallery), size=faces)
+    queries = gallery[targets] + noise * unit_rows(rng, faces)  # coseno ~0.9 con su identidad
+    return queries.astype(np.float32), targets
+
+
+def measure(fn, repeats):
+    """Latencias de `repeats` llamadas y pico de memoria temporal (numpy se registra en tracemalloc)."""
+    fn()  # calentamiento
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return latencies, peak, result
+
+
+def strategies(gallery, labels, threshold, hnsw_m):
+    from app.services.recognition_service import find_best_match_vectorized, match_faces_batched
+
+    gallery_f16 = gallery.astype(np.float16)
+    found = {
+        "loop_f32": (
+            gallery.nbytes,
+            lambda q: [find_best_match_vectorized(e, gallery, labels, threshold) for e in q],
+        ),
+        "batched_f32": (
+            gallery.nbytes,
+            lambda q: match_faces_batched(q, gallery, labels, threshold),
+        ),
+        "batched_f16": (
+            gallery_f16.nbytes,
+            lambda q: match_faces_batched(q, gallery_f16, labels, threshold),
+        ),
+    }
+
+    if faiss is not None:
+        def faiss_search(index):
+            def search(q):
+                q = q / np.linalg.norm(q, axis=1, keepdims=True)
+                sims, idx = index.search(np.ascontiguousarray(q, dtype=np.float32), 1)
+                return [(labels[i], float(s)) if s >= threshold else ("Unknown", float(s))
+                        for i, s in zip(idx[:, 0], sims[:, 0])]
+            return search
+
+        flat = faiss.IndexFlatIP(DIM)
+        flat.add(gallery)
+        found["faiss_flat"] = (gallery.nbytes, faiss_search(flat))
+
+        hnsw = faiss.IndexHNSWFlat(DIM, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        hnsw.add(gallery)
+        # Vectores + grafo (~2·M enlaces int32 por nodo en la capa base)
+        found["faiss_hnsw"] = (gallery.nbytes + len(gallery) * hnsw_m * 2 * 4, faiss_search(hnsw))
+
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia y memoria del matching según el tamaño de la galería.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--faces', type=int, default=50, help="Caras por frame (consultas por llamada)")
+    parser.add_argument('--repeats', type=int, default=20, help="Frames medidos por estrategia y tamaño")
+    parser.add_argument('--threshold', type=float, help="Umbral de similitud (por defecto config.SIMILARITY_THRESHOLD)")
+    parser.add_argument('--hnsw-m', type=int, default=32, help="Vecinos por nodo del índice HNSW de faiss")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Ruta del JSON con los resultados")
+    args = parser.parse_args()
+
+    from app import config
+    threshold = config.SIMILARITY_THRESHOLD if args.threshold is None else args.threshold
+    rng = np.random.default_rng(args.seed)
+
+    if faiss is None:
+        print("[INFO] faiss no está instalado: se omiten faiss_flat y faiss_hnsw.")
+
+    results = []
+    print(f"\n{'N':<7} | {'ESTRATEGIA':<12} | {'p50 (ms)':<9} | {'p95 (ms)':<9} | {'p99 (ms)':<9} | {'GALERÍA (MB)':<12} | {'PICO (MB)':<9} | {'RECALL@1'}")
+    print("=" * 100)
+    for size in args.sizes:
+        gallery = unit_rows(rng, size)
+        labels = [f"id_{i:06d}" for i in range(size)]
+        queries, targets = make_queries(rng, gallery, args.faces)
+        expected = [labels[t] for t in targets]
+        reference = None
+
+        for name, (gallery_bytes, fn) in strategies(gallery, labels, threshold, args.hnsw_m).items():
+            latencies, peak, matches = measure(lambda: fn(queries), args.repeats)
+            if reference is None:
+                reference = matches
+            # Recall respecto a la etiqueta verdadera (las consultas derivan de una identidad conocida)
+            recall = float(np.mean([m[0] == e for m, e in zip(matches, expected)]))
+            agreement = float(np.mean([m[0] == r[0] for m, r in zip(matches, reference)]))
+            summary = percentiles(latencies)
+            results.append({
+                "gallery_size": size,
+                "strategy": name,
+                "faces": args.faces,
+                "latency": summary,
+                "gallery_bytes": int(gallery_bytes),
+                "peak_temp_bytes": int(peak),
+                "recall_at_1": recall,
+                "agreement_with_loop_f32": agreement,
+            })
+            print(f"{size:<7} | {name:<12} | {summary['p50'] * 1e3:<9.3f} | {summary['p95'] * 1e3:<9.3f} | "
+                  f"{summary['p99'] * 1e3:<9.3f} | {gallery_bytes / 2**20:<12.2f} | {peak / 2**20:<9.2f} | {recall:.3f}")
+        print("-" * 100)
+
+    if args.output:
+        write_json(args.output, {
+            "benchmark": "matching",
+            **environment(),
+            "faiss": getattr(faiss, '__version__', None) if faiss is not None else None,
+            "settings": {
+                "faces": args.faces,
+                "repeats": args.repeats,
+                "threshold": threshold,
+                "hnsw_m": args.hnsw_m,
+                "dim": DIM,
+            },
+            "results": results,
+        })
+
+
+if __name__ == '__main__':
+    main()
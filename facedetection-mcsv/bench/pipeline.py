@@ -0,0 +1,157 @@
+"""
+Benchmark del pipeline completo sin HTTP ni base de datos.
+
+Carga RetinaFace + ArcFace en el propio proceso y procesa las aulas sintéticas
+(datasets/synthetic_classrooms/classroom_NNN_faces.jpg): --warmup pasadas sin
+medir y --iterations medidas por imagen. Informa p50/p95/p99 por etapa (decode,
+detection, alignment, quality, embedding, matching, total) y caras/segundo, y guarda un
+JSON con el commit de git para comparar ejecuciones. Ejemplo (desde facedetection-mcsv):
+
+    python -m bench.pipeline --iterations 10 --output pipeline.json
+    python -m bench.pipeline --images classroom_050_faces.jpg --gallery-size 200
+    python -m bench.pipeline --max-side 1280        # detección sobre el frame reducido
+
+La galería de matching es aleatoria (--gallery-size identidades normalizadas) o la
+de un curso real con --course-id (CSV en embeddings_csvs/).
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from .common import CLASSROOMS_DIR, environment, percentiles, write_json
+
+STAGES = ('decode', 'detection', 'alignment', 'quality', 'embedding', 'matching', 'total')
+
+
+def random_gallery(size, dim=512, seed=0):
+    if size <= 0:
+        return None, None
+    rng = np.random.default_rng(seed)
+    matrix = rng.standard_normal((size, dim)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix, [f"id_{i:06d}" for i in range(size)]
+
+
+def run_frame(model, image_bytes, known_matrix, known_labels, detection_options=None):
+    """Procesa un frame como /benchmark/process y devuelve (tiempos por etapa, caras)."""
+    from app import config
+    from app.services.recognition_service import match_faces_batched
+
+    timings = {}
+    start = time.perf_counter()
+    frame = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    timings['decode'] = time.perf_counter() - start
+
+    faces = model.get(frame, timings=timings, **(detection_options or {}))
+
+    t_match = time.perf_counter()
+    accepted = [face.embedding for face in faces if face.det_score >= config.DETECTION_THRESHOLD]
+    match_faces_batched(accepted, known_matrix, known_labels, config.SIMILARITY_THRESHOLD)
+    timings['matching'] = time.perf_counter() - t_match
+    timings['total'] = time.perf_counter() - start
+    return timings, len(faces)
+
+
+def benchmark_image(model, path, known_matrix, known_labels, warmup, iterations, detection_options=None):
+    with open(path, 'rb') as f:
+        image_bytes = f.read()
+
+    for _ in range(warmup):
+        run_frame(model, image_bytes, known_matrix, known_labels, detection_options)
+
+    samples = {stage: [] for stage in STAGES}
+    face_count = 0
+    for _ in range(iterations):
+        timings, face_count = run_frame(model, image_bytes, known_matrix, known_labels, detection_options)
+        for stage in STAGES:
+            samples[stage].append(timings.get(stage, 0.0))
+
+    total_seconds = sum(samples['total'])
+    return {
+        "image": os.path.basename(path),
+        "faces": face_count,
+        "iterations": iterations,
+        "faces_per_second": face_count * iterations / total_seconds if total_seconds > 0 else 0.0,
+        "frames_per_second": iterations / total_seconds if total_seconds > 0 else 0.0,
+        "stages": {stage: percentiles(values) for stage, values in samples.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia por etapa del pipeline de facedetection (en proceso).")
+    parser.add_argument('--images', nargs='*', help="Nombres o rutas de imágenes (por defecto todas las aulas sintéticas)")
+    parser.add_argument('--warmup', type=int, default=2, help="Pasadas sin medir por imagen")
+    parser.add_argument('--iterations', type=int, default=10, help="Pasadas medidas por imagen")
+    parser.add_argument('--gallery-size', type=int, default=200, help="Identidades aleatorias para el matching")
+    parser.add_argument('--course-id', help="Usar la galería real de este curso en lugar de una aleatoria")
+    parser.add_argument('--threads', type=int, help="Hilos de inferencia (torch/TensorFlow)")
+    parser.add_argument('--max-side', type=int, help="Lado mayor para la detección (ver DETECTION_MAX_SIDE)")
+    parser.add_argument('--min-face-px', type=float, help="Cara mínima esperada en px (ver DETECTION_MIN_FACE_PX)")
+    parser.add_argument('--no-batcher', action='store_true', help="Desactiva el micro-batching entre peticiones")
+    parser.add_argument('--output', help="Ruta del JSON con los resultados")
+    args = parser.parse_args()
+
+    if args.images:
+        paths = [p if os.path.exists(p) else os.path.join(CLASSROOMS_DIR, p) for p in args.images]
+    else:
+        paths = sorted(glob.glob(os.path.join(CLASSROOMS_DIR, 'classroom_*_faces.jpg')))
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing or not paths:
+        parser.error(f"Imágenes no encontradas: {missing or CLASSROOMS_DIR}")
+
+    from app.models import custom_face_model
+
+    if args.threads:
+        custom_face_model.configure_inference_threads(args.threads)
+    model = custom_face_model.load_model()
+    if args.no_batcher:
+        model.batcher = None
+
+    if args.course_id:
+        from app.services import database_service
+        known_matrix, known_labels = database_service.get_course_gallery(args.course_id)
+    else:
+        known_matrix, known_labels = random_gallery(args.gallery_size)
+    gallery_size = len(known_labels) if known_labels else 0
+    detection_options = {k: v for k, v in (('max_side', args.max_side), ('min_face_px', args.min_face_px)) if v is not None}
+
+    results = []
+    print(f"\n{'IMAGEN':<26} | {'CARAS':<5} | {'DET p50':<8} | {'EMB p50':<8} | {'TOTAL p50':<9} | {'TOTAL p95':<9} | {'TOTAL p99':<9} | {'CARAS/s'}")
+    print("=" * 112)
+    for path in paths:
+        r = benchmark_image(model, path, known_matrix, known_labels, args.warmup, args.iterations, detection_options)
+        results.append(r)
+        st = r['stages']
+        print(f"{r['image']:<26} | {r['faces']:<5} | {st['detection']['p50']:<8.4f} | {st['embedding']['p50']:<8.4f} | "
+              f"{st['total']['p50']:<9.4f} | {st['total']['p95']:<9.4f} | {st['total']['p99']:<9.4f} | {r['faces_per_second']:.1f}")
+    print("=" * 112)
+
+    if args.output:
+        from app import config
+        write_json(args.output, {
+            "benchmark": "pipeline",
+            **environment(),
+            "torch_threads": torch.get_num_threads(),
+            "device": str(model.device),
+            "settings": {
+                "warmup": args.warmup,
+                "iterations": args.iterations,
+                "gallery_size": gallery_size,
+                "course_id": args.course_id,
+                "embedding_batcher": model.batcher is not None,
+                "embedding_max_batch": config.EMBEDDING_MAX_BATCH,
+                "detection_threshold": config.DETECTION_THRESHOLD,
+                "detection_max_side": detection_options.get('max_side', config.DETECTION_MAX_SIDE),
+                "detection_min_face_px": detection_options.get('min_face_px', config.DETECTION_MIN_FACE_PX),
+            },
+            "results": results,
+        })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Detección teselada frente a una sola pasada en las aulas sintéticas.
+
+Para cada aula (classroom_NNN_faces.jpg, con NNN caras reales) mide la latencia de
+la etapa de detección y el recall por conteo (min(detectadas, NNN) / NNN) de:
+
+    single            RetinaFace sobre el frame completo (comportamiento por defecto)
+    single_<lado>     una pasada sobre el frame reducido a --max-side (si se indica)
+    tiled_<tesela>    detect_tiled con cada --tile-sizes (teselas en paralelo + NMS)
+
+Las caras detectadas de más que NNN se informan como 'extra' (falsos positivos o
+duplicados que el NMS no unió). Es la misma imagen de 200 caras que usa
+`flask bench-exp-c` en attendance-mcsv, que admite --detection-mode para comparar
+el efecto sobre la identificación. Ejemplo (desde facedetection-mcsv):
+
+    python -m bench.tiling --tile-sizes 512 640 960 --max-side 1280 --output tiling.json
+"""
+import argparse
+import glob
+import os
+import re
+import time
+
+import cv2
+
+from .common import CLASSROOMS_DIR, environment, percentiles, write_json
+
+FACES_RE = re.compile(r'classroom_(\d+)_faces')
+
+
+def expected_faces(path):
+    match = FACES_RE.search(os.path.basename(path))
+    return int(match.group(1)) if match else None
+
+
+def detectors(model, args):
+    from app.models.custom_face_model import detection_scale
+
+    found = {"single": lambda frame: model.detect(frame)}
+    if args.max_side:
+        found[f"single_{args.max_side}"] = lambda frame: model.detect(
+            frame, detection_scale(frame.shape, max_side=args.max_side, min_face_px=0)
+        )
+    for tile_size in args.tile_sizes:
+        found[f"tiled_{tile_size}"] = lambda frame, tile_size=tile_size: model.detect_tiled(
+            frame, tile_size=tile_size, overlap=args.overlap
+        )
+    return found
+
+
+def benchmark(detect, frame, expected, warmup, iterations):
+    for _ in range(warmup):
+        detect(frame)
+    latencies = []
+    detected = 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        detected = len(detect(frame))
+        latencies.append(time.perf_counter() - start)
+    return {
+        "detected": detected,
+        "recall": min(detected, expected) / expected if expected else None,
+        "extra": max(0, detected - expected) if expected else None,
+        "latency": percentiles(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall y latencia de la detección teselada frente a una sola pasada.")
+    parser.add_argument('--images', nargs='*', help="Nombres o rutas (por defecto todas las aulas sintéticas)")
+    parser.add_argument('--tile-sizes', type=int, nargs='+', default=[640], help="Lados de tesela a comparar (px)")
+    parser.add_argument('--overlap', type=int, help="Solape entre teselas (por defecto DETECTION_TILE_OVERLAP)")
+    parser.add_argument('--workers', type=int, help="Hilos de detección por teselas (por defecto DETECTION_TILE_WORKERS)")
+    parser.add_argument('--max-side', type=int, help="Añade una pasada única sobre el frame reducido a este lado")
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--output', help="Ruta del JSON con los resultados")
+    args = parser.parse_args()
+
+    if args.images:
+        paths = [p if os.path.exists(p) else os.path.join(CLASSROOMS_DIR, p) for p in args.images]
+    else:
+        paths = sorted(glob.glob(os.path.join(CLASSROOMS_DIR, 'classroom_*_faces.jpg')))
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing or not paths:
+        parser.error(f"Imágenes no encontradas: {missing or CLASSROOMS_DIR}")
+
+    from app import config
+    from app.models import custom_face_model
+
+    if args.workers:
+        config.DETECTION_TILE_WORKERS = args.workers
+    if args.overlap is None:
+        args.overlap = config.DETECTION_TILE_OVERLAP
+    model = custom_face_model.load_model()
+
+    results = []
+    print(f"\n{'IMAGEN':<26} | {'MODO':<12} | {'CARAS':<5} | {'DETECT.':<7} | {'RECALL':<6} | {'EXTRA':<5} | {'p50 (s)':<8} | {'p95 (s)'}")
+    print("=" * 100)
+    for path in paths:
+        frame = cv2.imread(path)
+        expected = expected_faces(path)
+        for mode, detect in detectors(model, args).items():
+            r = benchmark(detect, frame, expected, args.warmup, args.iterations)
+            results.append({"image": os.path.basename(path), "mode": mode, "expected": expected, **r})
+            recall = f"{r['recall']:.3f}" if r['recall'] is not None else "-"
+            extra = r['extra'] if r['extra'] is not None else "-"
+            print(f"{os.path.basename(path):<26} | {mode:<12} | {expected or '-':<5} | {r['detected']:<7} | {recall:<6} | "
+                  f"{extra:<5} | {r['latency']['p50']:<8.3f} | {r['latency']['p95']:.3f}")
+        print("-" * 100)
+
+    if args.output:
+        write_json(args.output, {
+            "benchmark": "tiling",
+            **environment(),
+            "settings": {
+                "tile_sizes": args.tile_sizes,
+                "overlap": args.overlap,
+                "workers": config.DETECTION_TILE_WORKERS,
+                "max_side": args.max_side,
+                "nms_iou": config.DETECTION_NMS_IOU,
+                "warmup": args.warmup,
+                "iterations": args.iterations,
+            },
+            "results": results,
+        })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Escalado de frames/segundo según el número de workers de gunicorn.
+
+Para cada valor de --workers arranca `gunicorn run:app` (con gunicorn.conf.py y
+WEB_CONCURRENCY=N), espera a que responda, calienta los workers y envía el mismo
+frame a /benchmark/process desde `2 x N` clientes concurrentes durante --duration
+segundos. Ejemplo (desde facedetection-mcsv):
+
+    python -m bench.worker_scaling --workers 1 2 4 8 --duration 60 --output scaling.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import requests
+
+from .loadgen import run_load
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_IMAGE = os.path.join(
+    PROJECT_ROOT, '..', 'datasets', 'synthetic_classrooms', 'classroom_050_faces.jpg'
+)
+
+
+def _wait_until_up(base_url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/ready", timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    return False
+
+
+def _drive(base_url, image_bytes, course_id, concurrency, duration):
+    """Cada cliente envía frames en bucle cerrado hasta agotar `duration` (ver bench.loadgen)."""
+    args = argparse.Namespace(
+        url=base_url, endpoint='/benchmark/process', schedule_id=None, course_id=course_id,
+        concurrency=concurrency, rate=None, duration=duration, timeout=300, send_deadline=False,
+        honor_retry_after=True, metrics_interval=0,
+    )
+    summary = run_load(args, [('frame.jpg', image_bytes, 'image/jpeg')])
+    ok = summary['outcomes'].get('ok', 0)
+    return {
+        "frames": ok,
+        "errors": summary['requests'] - ok,
+        "wall_seconds": summary['wall_seconds'],
+        "fps": summary['throughput_per_second'],
+        "latency_p50": summary['latency'].get('p50', 0.0),
+        "latency_p95": summary['latency'].get('p95', 0.0),
+    }
+
+
+def run_for_workers(num_workers, args, image_bytes):
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = dict(os.environ, WEB_CONCURRENCY=str(num_workers), GUNICORN_BIND=f"127.0.0.1:{args.port}")
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'run:app'],
+        cwd=PROJECT_ROOT, env=env,
+    )
+    try:
+        if not _wait_until_up(base_url, args.startup_timeout):
+            raise RuntimeError(f"gunicorn with {num_workers} workers did not start in {args.startup_timeout}s")
+        concurrency = args.clients_per_worker * num_workers
+        _drive(base_url, image_bytes, args.course_id, concurrency, args.warmup)
+        result = _drive(base_url, image_bytes, args.course_id, concurrency, args.duration)
+        result.update({"workers": num_workers, "clients": concurrency})
+        return result
+    finally:
+        proc.terminate()
+        proc.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frames/segundo de facedetection según el número de workers.")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--image', default=DEFAULT_IMAGE)
+    parser.add_argument('--course-id', default='bench', help="Curso para /benchmark/process (sin CSV = galería vacía)")
+    parser.add_argument('--duration', type=float, default=60.0, help="Segundos de medición por configuración")
+    parser.add_argument('--warmup', type=float, default=15.0, help="Segundos de calentamiento (no medidos)")
+    parser.add_argument('--clients-per-worker', type=int, default=2)
+    parser.add_argument('--port', type=int, default=4100)
+    parser.add_argument('--startup-timeout', type=float, default=300.0)
+    parser.add_argument('--output', help="Ruta del JSON con los resultados")
+    args = parser.parse_args()
+
+    with open(args.image, 'rb') as f:
+        image_bytes = f.read()
+
+    results = []
+    print(f"{'WORKERS':<8} | {'CLIENTES':<8} | {'FPS':<8} | {'SPEEDUP':<8} | {'EFIC.':<6} | {'p50 (s)':<8} | {'p95 (s)':<8} | {'ERRORES'}")
+    print("=" * 84)
+    for num_workers in args.workers:
+        r = run_for_workers(num_workers, args, image_bytes)
+        # Speedup y eficiencia respecto a la primera configuración medida
+        base = results[0] if results else r
+        r["speedup"] = r['fps'] / base['fps'] if base['fps'] else 0.0
+        r["efficiency"] = r["speedup"] * base['workers'] / r['workers']
+        results.append(r)
+        print(f"{r['workers']:<8} | {r['clients']:<8} | {r['fps']:<8.2f} | {r['speedup']:<8.2f} | {r['efficiency']:<6.2f} | "
+              f"{r['latency_p50']:<8.3f} | {r['latency_p95']:<8.3f} | {r['errors']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                "host": platform.node(), "cpu_count": os.cpu_count(), "processor": platform.processor(),
+                "image": os.path.basename(args.image), "duration": args.duration, "results": results,
+            }, f, indent=2)
+        print(f"Resultados guardados en {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,10 +3,18 @@ import requests
 import time
 import threading
 from flask import Flask, request, jsonify
+from app.services.http_client import get_client
 
 # --- Configuración de Endpoints ---
-PROCESS_URL = "http://127.0.0.1:4000/process_frame" # Servidor de procesamiento (Puerto 4000)
-ATTENDANCE_URL = "http://127.0.0.1:5000/attendance/" # Servidor de toma de asistencia (Puerto 5000)
+# URLs base en config.py (FACEDETECTION_SERVICE_URL / ATTENDANCE_SERVICE_URL)
+PROCESS_PATH = "/process_frame" # Servidor de procesamiento (Puerto 4000)
+ATTENDANCE_PATH = "/attendance/" # Servidor de toma de asistencia (Puerto 5000)
+# Cara más pequeña esperada en esta cámara (px en el frame enviado); el servidor reduce el frame
+# antes de detectar en proporción. None = política por defecto del servidor (config.py).
+MIN_FACE_PX = None
+# Identificador de esta cámara: el servidor sigue las caras entre sus frames y solo vuelve
+# a calcular el embedding de las nuevas o pendientes de verificar. None = sin seguimiento.
+CAMERA_ID = "camera-1"
 CAMERA_INDEX = 1#"http://10.7.135.135:8080/video"#0 # "http://192.168.1.46:8080/video" # Indice de la camara a usar
 
 # --- Recursos Globales Compartidos ---
@@ -49,21 +57,48 @@ def run_camera():
     cv2.destroyAllWindows()
 
 # --- 2. Helper: Enviar Frame para Procesar (Puerto 4000) ---
+PROCESS_TIMEOUT = 10    # segundos; también se envía como plazo para que el servidor descarte frames obsoletos
+BUSY_RETRIES = 2        # reintentos cuando el servidor responde 429/503 (ocupado)
+MAX_RETRY_AFTER = 10    # espera máxima por reintento, aunque el servidor pida más
+
+def _retry_after_seconds(response):
+    try:
+        return min(MAX_RETRY_AFTER, max(0, int(response.headers.get('Retry-After', 1))))
+    except ValueError:
+        return 1
+
 def process_frame_on_server(frame, schedule_id):
     try:
         _, img_encoded = cv2.imencode('.jpg', frame)
         files = {'image': ('frame.jpg', img_encoded.tobytes(), 'image/jpeg')}
         payload = {'schedule_id': schedule_id}
-        print(f"[JOB] Enviando frame a {PROCESS_URL} (Schedule: {schedule_id})...")
-        response = requests.post(PROCESS_URL, files=files, data=payload, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            return data.get('recognized_faces', [])
+        if MIN_FACE_PX:
+            payload['min_face_px'] = MIN_FACE_PX
+        if CAMERA_ID:
+            payload['camera_id'] = CAMERA_ID
+        headers = {'X-Request-Timeout': str(PROCESS_TIMEOUT)}
+        processing = get_client('facedetection')
+        for attempt in range(BUSY_RETRIES + 1):
+            print(f"[JOB] Enviando frame a {processing.url(PROCESS_PATH)} (Schedule: {schedule_id})...")
+            response = processing.post(PROCESS_PATH, files=files, data=payload, headers=headers, timeout=PROCESS_TIMEOUT)
+            if response.status_code == 200:
+                data = response.json()
+                return data.get('recognized_faces', [])
+            if response.status_code in (429, 503) and attempt < BUSY_RETRIES:
+                wait = _retry_after_seconds(response)
+                print(f"[JOB] Servidor ocupado ({response.status_code}); reintentando el frame en {wait} s "
+                      f"(intento {attempt + 1}/{BUSY_RETRIES}).")
+                time.sleep(wait)
+                continue
+            break
+        if response.status_code in (429, 503):
+            print(f"[JOB] Frame descartado: servidor ocupado tras {BUSY_RETRIES} reintentos "
+                  f"({response.status_code}, Retry-After={response.headers.get('Retry-After')}).")
         else:
-            print(f"[JOB] Error del servidor {PROCESS_URL}: {response.status_code}")
-            return None
+            print(f"[JOB] Error del servidor {processing.url(PROCESS_PATH)}: {response.status_code}")
+        return None
     except requests.exceptions.RequestException as e:
-        print(f"[JOB] Error de conexión con el servidor {PROCESS_URL}: {e}")
+        print(f"[JOB] Error de conexión con el servidor de procesamiento: {e}")
         return None
 
 # --- 3. Helper: Enviar Asistencia (Puerto 5000) ---
@@ -72,6 +107,7 @@ def process_recognitions(recognized_faces, scheduler_id):
         return
 
     print(f"[JOB] Procesando {len(recognized_faces)} caras para el curso {scheduler_id}.")
+    attendance = get_client('attendance')
     for face in recognized_faces:
         student_id = face.get('identity')
         if student_id and student_id != 'Unknown':
@@ -80,8 +116,8 @@ def process_recognitions(recognized_faces, scheduler_id):
                 'schedule_id': scheduler_id
             }
             try:
-                print(f"[JOB] Enviando asistencia para {student_id} a {ATTENDANCE_URL}...")
-                requests.post(ATTENDANCE_URL, json=payload, timeout=5)
+                print(f"[JOB] Enviando asistencia para {student_id} a {attendance.url(ATTENDANCE_PATH)}...")
+                attendance.post(ATTENDANCE_PATH, json=payload, timeout=5)
             except requests.exceptions.RequestException as e:
                 print(f"[JOB] Error de conexión con servidor de asistencia: {e}")
         else:
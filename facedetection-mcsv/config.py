@@ -10,5 +10,128 @@ CSV_OUTPUT_DIR = os.path.join(PROJECT_ROOT, 'embeddings_csvs')
 SIMILARITY_THRESHOLD = 0.50
 DETECTION_THRESHOLD = 0.7
 
+# --- Serving ---
+# gunicorn.conf.py activa PRELOAD_MODEL: el master carga ArcFace una sola vez (los workers
+# comparten los pesos copy-on-write) y cada worker hace su warm-up tras el fork.
+PRELOAD_MODEL = os.environ.get('FACEDETECTION_PRELOAD_MODEL') == '1'
+
+# Pesos de ArcFace: junto al .pth se genera '<modelo>.inference.pt', que los arranques
+# siguientes cargan mapeado en memoria. MODEL_BACKGROUND_LOAD carga y calienta el modelo
+# en segundo plano (el servidor acepta peticiones y /ready informa del progreso).
+MODEL_WRITE_ARTIFACT = os.environ.get('MODEL_WRITE_ARTIFACT', '1') == '1'
+MODEL_BACKGROUND_LOAD = os.environ.get('MODEL_BACKGROUND_LOAD', '1') == '1'
+
+# Escala de detección: RetinaFace procesa una copia reducida del frame y las cajas y
+# landmarks se devuelven en coordenadas del original (la alineación usa el frame completo).
+#   DETECTION_MAX_SIDE     lado mayor máximo en píxeles (0 = comportamiento de RetinaFace)
+#   DETECTION_MIN_FACE_PX  cara más pequeña esperada en el frame original; se reduce hasta que
+#                          mida DETECTOR_MIN_FACE_PX. Tiene prioridad sobre DETECTION_MAX_SIDE y
+#                          cada cámara puede enviar su propio valor en el campo 'min_face_px'.
+DETECTION_MAX_SIDE = int(os.environ.get('DETECTION_MAX_SIDE', 0))
+DETECTION_MIN_FACE_PX = float(os.environ.get('DETECTION_MIN_FACE_PX', 0))
+DETECTOR_MIN_FACE_PX = float(os.environ.get('DETECTOR_MIN_FACE_PX', 24))  # cara mínima fiable para RetinaFace
+
+# Modo de detección: 'single' (una pasada sobre el frame) o 'tiled' (teselas solapadas
+# detectadas en paralelo + una pasada global reducida para caras grandes, unidas con NMS).
+# El modo teselado recupera las caras pequeñas de las filas del fondo en aulas grandes.
+DETECTION_MODE = os.environ.get('DETECTION_MODE', 'single')
+DETECTION_TILE_SIZE = int(os.environ.get('DETECTION_TILE_SIZE', 640))        # px del frame original
+DETECTION_TILE_OVERLAP = int(os.environ.get('DETECTION_TILE_OVERLAP', 128))  # >= cara más grande a recuperar por tesela
+DETECTION_TILE_WORKERS = int(os.environ.get('DETECTION_TILE_WORKERS', 4))
+DETECTION_NMS_IOU = float(os.environ.get('DETECTION_NMS_IOU', 0.4))
+
+# Filtro de calidad antes del embedding (app/models/face_quality.py); 0 desactiva cada umbral.
+# Las caras rechazadas se cuentan en facedetection_rejected_faces_total{reason=...}.
+QUALITY_MIN_EYE_DISTANCE = float(os.environ.get('QUALITY_MIN_EYE_DISTANCE', 6))  # px en el frame original
+QUALITY_MIN_FACE_SIZE = float(os.environ.get('QUALITY_MIN_FACE_SIZE', 12))       # lado menor de la caja (px)
+QUALITY_MAX_YAW = float(os.environ.get('QUALITY_MAX_YAW', 50))                   # grados (estimación por landmarks)
+QUALITY_MAX_PITCH = float(os.environ.get('QUALITY_MAX_PITCH', 45))               # grados (estimación por landmarks)
+QUALITY_MIN_BLUR = float(os.environ.get('QUALITY_MIN_BLUR', 0))                  # varianza del Laplaciano; calibrar por cámara
+
+# Decodificación de imágenes subidas (app/services/image_decode.py): los JPEG se decodifican
+# a 1/2, 1/4 u 1/8 de resolución mientras el lado menor siga por encima de este mínimo
+# (RetinaFace lleva de todos modos el lado menor a 1024 px). 0 = resolución completa.
+DECODE_UPLOAD_MIN_SIDE = int(os.environ.get('DECODE_UPLOAD_MIN_SIDE', 1024))  # /generate-embedding, /extract-embedding
+DECODE_FRAME_MIN_SIDE = int(os.environ.get('DECODE_FRAME_MIN_SIDE', 0))       # frames de cámara (caras pequeñas)
+# Tamaño máximo de una petición (Flask responde 413 por encima)
+MAX_CONTENT_LENGTH = int(float(os.environ.get('MAX_CONTENT_LENGTH_MB', 64)) * 2**20)
+
+# Micro-batching de embeddings entre peticiones concurrentes: las caras alineadas que
+# llegan dentro de la ventana se pasan juntas por ArcFace. Solo aporta con varias
+# peticiones simultáneas por proceso (servidor de desarrollo o GUNICORN_THREADS > 1).
+EMBEDDING_BATCH_WINDOW_MS = float(os.environ.get('EMBEDDING_BATCH_WINDOW_MS', 10))  # 0 = desactivado
+EMBEDDING_MAX_BATCH = int(os.environ.get('EMBEDDING_MAX_BATCH', 64))
+
+# Caché de caras/embeddings de imágenes subidas (/extract-embedding, /generate-embedding),
+# indexada por sha256 de los bytes + huella del modelo. El nivel en disco (opcional) se
+# comparte entre workers y sobrevive a reinicios.
+EMBEDDING_CACHE_MAX_MB = float(os.environ.get('EMBEDDING_CACHE_MAX_MB', 64))  # 0 = desactivada
+EMBEDDING_CACHE_DIR = os.environ.get('EMBEDDING_CACHE_DIR')                    # sin definir = solo memoria
+EMBEDDING_CACHE_DISK_MAX_MB = float(os.environ.get('EMBEDDING_CACHE_DISK_MAX_MB', 512))
+
+# Caché schedule_id -> course_id de /process_frame (app/services/schedule_cache.py):
+# recarga completa de la tabla de horarios cada SCHEDULE_CACHE_TTL segundos y, ante un
+# schedule_id desconocido, como mucho una vez cada SCHEDULE_CACHE_MISS_REFRESH segundos.
+SCHEDULE_CACHE_TTL = float(os.environ.get('SCHEDULE_CACHE_TTL', 300))
+SCHEDULE_CACHE_MISS_REFRESH = float(os.environ.get('SCHEDULE_CACHE_MISS_REFRESH', 5))
+# POST /schedules/sync exige la cabecera X-Sync-Token con este valor (el mismo que en
+# attendance-mcsv); sin definir, la ruta responde 403 y solo quedan las recargas.
+SCHEDULE_SYNC_TOKEN = os.environ.get('SCHEDULE_SYNC_TOKEN')
+
+# /generate-embedding: imágenes decodificadas y detectadas en paralelo por petición
+ENROLLMENT_WORKERS = int(os.environ.get('ENROLLMENT_WORKERS', 4))
+
+# /process_frames: frames por petición (ráfaga) e hilos que los decodifican y detectan en paralelo
+FRAME_BATCH_MAX_FRAMES = int(os.environ.get('FRAME_BATCH_MAX_FRAMES', 8))
+FRAME_BATCH_WORKERS = int(os.environ.get('FRAME_BATCH_WORKERS', 4))
+
+# Ingesta de streams en el servicio (POST/GET/DELETE /streams, app/services/stream_ingest.py).
+# Desactivada por defecto: las fuentes las elige quien llama a la API. Los vídeos locales
+# (sustituto de una cámara en pruebas) solo se aceptan dentro de STREAM_FILE_DIR.
+STREAM_INGEST_ENABLED = os.environ.get('STREAM_INGEST_ENABLED') == '1'
+STREAM_SAMPLE_FPS = float(os.environ.get('STREAM_SAMPLE_FPS', 1))              # frames procesados por segundo y cámara
+STREAM_MAX_WORKERS = int(os.environ.get('STREAM_MAX_WORKERS', 4))              # cámaras simultáneas por proceso
+STREAM_RECONNECT_SECONDS = float(os.environ.get('STREAM_RECONNECT_SECONDS', 5))
+STREAM_FILE_DIR = os.environ.get('STREAM_FILE_DIR', os.path.join(os.path.dirname(PROJECT_ROOT), 'datasets'))
+
+# Seguimiento de caras entre frames de una cámara (app/models/face_tracker.py): se usa en
+# /process_frame cuando el cliente envía 'camera_id' y en los streams ingeridos.
+#   TRACK_IOU_THRESHOLD      IoU mínimo para asociar una detección a la pista anterior
+#   TRACK_MAX_CENTER_SHIFT   si no, desplazamiento máximo del centro (en tamaños de cara)
+#   TRACK_CONFIRM_HITS       verificaciones seguidas con la misma identidad para confirmar
+#   TRACK_REVERIFY_FRAMES    frames entre reverificaciones de una pista confirmada
+#   TRACK_MAX_MISSED         frames sin ver una pista antes de eliminarla
+#   TRACK_SESSION_TTL        segundos sin frames antes de descartar la sesión de una cámara
+TRACKING_ENABLED = os.environ.get('TRACKING_ENABLED', '1') == '1'
+TRACK_IOU_THRESHOLD = float(os.environ.get('TRACK_IOU_THRESHOLD', 0.3))
+TRACK_MAX_CENTER_SHIFT = float(os.environ.get('TRACK_MAX_CENTER_SHIFT', 0.5))
+TRACK_CONFIRM_HITS = int(os.environ.get('TRACK_CONFIRM_HITS', 2))
+TRACK_REVERIFY_FRAMES = int(os.environ.get('TRACK_REVERIFY_FRAMES', 10))
+TRACK_MAX_MISSED = int(os.environ.get('TRACK_MAX_MISSED', 3))
+TRACK_SESSION_TTL = float(os.environ.get('TRACK_SESSION_TTL', 300))
+
+# Control de admisión de /process_frame y /benchmark/process (por proceso/worker):
+# frames en inferencia simultánea, frames en espera y espera máxima antes de 503.
+ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', 2))
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', 8))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 8))  # segundos
+
+# Perfilado bajo demanda (app/services/profiling.py): cabecera X-Profile o muestra aleatoria
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(PROJECT_ROOT, 'profiles'))
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))  # 0.01 = 1% de las peticiones
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')  # X-Profile y /profiles exigen este valor; sin definir, cerrados
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 50))
+
 # --- Network Configuration  ---
 SERVICE_URL = 'http://localhost:4000/process_frame'
+
+# URLs base de los servicios con los que se comunica (configurables por entorno)
+FACEDETECTION_SERVICE_URL = os.environ.get('FACEDETECTION_SERVICE_URL', 'http://127.0.0.1:4000')
+ATTENDANCE_SERVICE_URL = os.environ.get('ATTENDANCE_SERVICE_URL', 'http://127.0.0.1:5000')
+CAMERA_CLIENT_URL = os.environ.get('CAMERA_CLIENT_URL', 'http://localhost:6000')
+
+# Clientes HTTP compartidos (pool keep-alive por servicio destino)
+HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', 10))  # segundos
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 2))
+HTTP_BACKOFF = float(os.environ.get('HTTP_BACKOFF', 0.3))  # 0.3s, 0.6s, ...
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
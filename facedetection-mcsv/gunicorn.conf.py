@@ -0,0 +1,49 @@
+# facedetection-mcsv/gunicorn.conf.py
+# Configuración de producción: gunicorn la carga automáticamente desde el directorio actual.
+#
+#   gunicorn run:app                       -> workers = cores // FACEDETECTION_THREADS_PER_WORKER
+#   WEB_CONCURRENCY=4 gunicorn run:app     -> 4 workers
+#
+# El modelo ArcFace se carga una sola vez en el master (preload_app) y los workers
+# comparten sus pesos copy-on-write tras el fork. Cada worker fija sus hilos de
+# torch/TensorFlow a cores // workers y construye su propio detector RetinaFace.
+import multiprocessing
+import os
+import sys
+
+# Debe fijarse antes de que gunicorn importe run:app en el master
+os.environ.setdefault('FACEDETECTION_PRELOAD_MODEL', '1')
+
+# config lee el entorno al importarse; el directorio del servicio aún no está en sys.path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import config  # noqa: E402
+
+_cores = multiprocessing.cpu_count()
+_threads_per_worker = int(os.environ.get('FACEDETECTION_THREADS_PER_WORKER', 4))
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:4000')
+workers = int(os.environ.get('WEB_CONCURRENCY', max(1, _cores // _threads_per_worker)))
+# Más hilos que frames en inferencia + en cola: con todos ellos ocupados aún quedan hilos
+# libres para que el frame siguiente llegue al control de admisión (app/services/admission.py)
+# y reciba el 429 inmediato, y para que /metrics, /ready y /admission-stats respondan bajo
+# carga. Con >1 gunicorn usa el worker 'gthread'.
+ADMISSION_SPARE_THREADS = 4
+threads = int(os.environ.get(
+    'GUNICORN_THREADS', config.ADMISSION_MAX_CONCURRENT + config.ADMISSION_MAX_QUEUE + ADMISSION_SPARE_THREADS
+))
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))  # un frame de 200 caras en CPU supera los 30 s por defecto
+graceful_timeout = 30
+
+
+def post_fork(server, worker):
+    from run import app
+    from app.models.custom_face_model import configure_inference_threads
+    from app.services.readiness import readiness
+
+    inference_threads = int(os.environ.get('FACEDETECTION_INFERENCE_THREADS', max(1, _cores // server.cfg.workers)))
+    configure_inference_threads(inference_threads)
+    # El warm-up va en segundo plano: el worker acepta conexiones enseguida y responde
+    # 503 en /ready (y en las rutas del modelo) hasta que el detector esté construido.
+    readiness.run_in_background([('retinaface', app.face_model.warmup)])
+    server.log.info("Worker %s started (%s inference threads), warming up in background", worker.pid, inference_threads)
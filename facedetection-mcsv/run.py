@@ -1,7 +1,11 @@
 # facedetection-mcsv/run.py
+# Desarrollo: python run.py  |  Producción: gunicorn run:app (ver gunicorn.conf.py)
+import os
 from app import create_app
 
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=4000, debug=True)
\ No newline at end of file
+    # Sin reloader: el reloader de Werkzeug arranca un segundo proceso que vuelve a cargar el modelo
+    debug = os.environ.get('FLASK_DEBUG', '1') == '1'
+    app.run(host='0.0.0.0', port=4000, debug=debug, use_reloader=False)
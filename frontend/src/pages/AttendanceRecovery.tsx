@@ -87,7 +87,8 @@ const AttendanceRecovery = () => {
     const index = normalizedPath.lastIndexOf(marker);
     if (index !== -1) {
       const relativePath = normalizedPath.substring(index);
-      return `http://localhost:5000/${relativePath}`;
+      // Variante reducida y cacheada por el servidor (la tarjeta es pequeña)
+      return `http://localhost:5000/${relativePath}?w=256`;
     }
     return serverPath;
   };